@@ -135,3 +135,47 @@ STATICFILES_DIRS = [
 ]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# File ban chup toa do cua hang, cac worker mmap dung chung
+# (tao lai bang: python manage.py tao_lai_ban_chup)
+STORE_SNAPSHOT_PATH = BASE_DIR / 'var' / 'cua_hang.snapshot'
+
+# Thu muc cache vector tile cua hang (/tiles/stores/{z}/{x}/{y}.pbf)
+# (tao truoc bang: python manage.py tao_truoc_tile)
+STORE_TILE_CACHE_DIR = BASE_DIR / 'var' / 'tiles'
+
+
+# Cache dung chung giua cac worker: luu phien ban du lieu cua hang
+# (tang moi khi cua hang thay doi) de bo nho dem ket qua GIS tu vo hieu
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'django_cache',
+    },
+    # Phien ban du lieu cua hang (result_cache.py): bo nho rieng chi co mot khoa nen
+    # khong bao gio bi cull (mat phien ban = moi ETag, ket qua dem va tile deu mat hieu luc)
+    'phien_ban': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'django_cache_phien_ban',
+        'TIMEOUT': None,
+    },
+    # JSON cua hang theo khung nhin (/api/cua-hang/): nhieu khoa, cull rieng khong anh
+    # huong cache khac; FileBasedCache liet ke ca thu muc moi lan set nen giu vua phai
+    'khung_nhin': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'django_cache_khung_nhin',
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+# Bo nho dem ket qua cac tool GIS doc database (nearest/within_radius mode=db, centroid)
+# COORD_PRECISION: so chu so thap phan giu lai cua toa do (4 ~ 11 m)
+GIS_RESULT_CACHE = {
+    'COORD_PRECISION': 4,
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,
+}
@@ -0,0 +1,143 @@
+"""
+Phan Trang Keyset Cho Danh Sach Quan Tri
+Cursor-based (keyset) pagination over an ordered QuerySet, no OFFSET
+"""
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+SO_DONG_MOI_TRANG = 50
+
+# Huong cua con tro: trang sau dong nay / trang truoc dong nay
+SAU, TRUOC = 's', 't'
+
+
+def ma_hoa_con_tro(huong, thu_tu, gia_tri):
+    """Ma hoa (huong, thu tu sap xep, gia tri cac cot sap xep cua mot dong) thanh chuoi"""
+    noi_dung = json.dumps([huong, ','.join(thu_tu), *gia_tri], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(noi_dung.encode()).decode()
+
+
+def giai_ma_con_tro(con_tro, mo_hinh, thu_tu):
+    """
+    Giai ma con tro thanh (huong, gia_tri)
+
+    GIAI THICH:
+    - Con tro phai duoc tao voi cung thu tu sap xep; gia tri duoc chuyen lai
+      dung kieu bang to_python() cua truong tuong ung (vd. chuoi ISO -> date)
+
+    TRA VE:
+        Tuple (huong, list gia tri); nem ValueError neu con tro khong hop le
+    """
+    try:
+        huong, thu_tu_con_tro, *gia_tri = json.loads(base64.urlsafe_b64decode(con_tro.encode()))
+        if huong not in (SAU, TRUOC) or thu_tu_con_tro != ','.join(thu_tu) or len(gia_tri) != len(thu_tu):
+            raise ValueError
+        return huong, [
+            mo_hinh._meta.get_field(cot.lstrip('-')).to_python(gt) for cot, gt in zip(thu_tu, gia_tri)
+        ]
+    except (ValueError, TypeError, UnicodeDecodeError, ValidationError):
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+
+
+def _dao_thu_tu(thu_tu):
+    return tuple(cot[1:] if cot.startswith('-') else f'-{cot}' for cot in thu_tu)
+
+
+def _dieu_kien_sau(thu_tu, gia_tri):
+    """
+    Dieu kien "dung sau dong co gia tri nay" theo thu tu sap xep
+
+    (a, b, id) sau (x, y, z) <=> a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+    (dau '<' voi cot giam dan); them a >= x de database gioi han vung quet tren index
+    """
+    dieu_kien = Q()
+    bang_nhau = {}
+    for cot, gt in zip(thu_tu, gia_tri):
+        ten = cot.lstrip('-')
+        phep = 'lt' if cot.startswith('-') else 'gt'
+        dieu_kien |= Q(**bang_nhau, **{f'{ten}__{phep}': gt})
+        bang_nhau[ten] = gt
+    cot_dau = thu_tu[0]
+    gioi_han_dau = Q(**{f'{cot_dau.lstrip("-")}__{"lte" if cot_dau.startswith("-") else "gte"}': gia_tri[0]})
+    return gioi_han_dau & dieu_kien
+
+
+def phan_trang_keyset(truy_van, thu_tu, con_tro=None, gioi_han=SO_DONG_MOI_TRANG):
+    """
+    Lay mot trang cua truy van theo kieu keyset
+
+    GIAI THICH:
+    - thu_tu la cac truong sap xep, truong cuoi phai duy nhat (thuong la id)
+      de thu tu hoan toan xac dinh
+    - Con tro luu gia tri cac truong sap xep cua dong dau/cuoi trang; trang
+      ke tiep loc "sau dong do" roi LIMIT => voi index tren dung cac truong
+      sap xep, trang thu N ton chi phi nhu trang dau (khong dung OFFSET)
+    - Trang truoc: loc "truoc dong dau" voi thu tu dao nguoc, roi dao lai
+    - Lay them 1 dong de biet con trang tiep theo hay khong; khong dem tong
+
+    THAM SO:
+        truy_van: QuerySet da loc (chua sap xep)
+        thu_tu: Tuple ten truong, tien to '-' la giam dan
+            (vd. ('-ngay_danh_gia', '-id'))
+        con_tro: Chuoi tu trang truoc (ma_hoa_con_tro) hoac None cho trang dau
+        gioi_han: So dong moi trang
+
+    TRA VE:
+        Tuple (danh_sach, con_tro_sau, con_tro_truoc); con tro la None neu
+        khong co trang do
+
+    VI DU:
+        >>> dong, sau, truoc = phan_trang_keyset(DanhGia.objects.all(), ('-ngay_danh_gia', '-id'))
+        >>> dong, sau, truoc = phan_trang_keyset(DanhGia.objects.all(), ('-ngay_danh_gia', '-id'), sau)
+    """
+    huong, gia_tri = giai_ma_con_tro(con_tro, truy_van.model, thu_tu) if con_tro else (SAU, None)
+
+    if huong == TRUOC:
+        thu_tu_doc = _dao_thu_tu(thu_tu)
+    else:
+        thu_tu_doc = thu_tu
+    if gia_tri is not None:
+        truy_van = truy_van.filter(_dieu_kien_sau(thu_tu_doc, gia_tri))
+
+    danh_sach = list(truy_van.order_by(*thu_tu_doc)[:gioi_han + 1])
+    con_them = len(danh_sach) > gioi_han
+    danh_sach = danh_sach[:gioi_han]
+    if huong == TRUOC:
+        danh_sach.reverse()
+    if not danh_sach:
+        return danh_sach, None, None
+
+    def vi_tri(dong):
+        return [getattr(dong, cot.lstrip('-')) for cot in thu_tu]
+
+    if huong == TRUOC:
+        con_tro_sau = ma_hoa_con_tro(SAU, thu_tu, vi_tri(danh_sach[-1]))
+        con_tro_truoc = ma_hoa_con_tro(TRUOC, thu_tu, vi_tri(danh_sach[0])) if con_them else None
+    else:
+        con_tro_sau = ma_hoa_con_tro(SAU, thu_tu, vi_tri(danh_sach[-1])) if con_them else None
+        con_tro_truoc = ma_hoa_con_tro(TRUOC, thu_tu, vi_tri(danh_sach[0])) if gia_tri is not None else None
+    return danh_sach, con_tro_sau, con_tro_truoc
+
+
+def lien_ket_trang(tham_so, con_tro):
+    """
+    Chuoi query cho lien ket trang: giu nguyen bo loc/sap xep, thay cursor
+
+    THAM SO:
+        tham_so: request.GET
+        con_tro: Con tro cua trang can den hoac None (trang dau)
+
+    TRA VE:
+        Chuoi dang '?loai=2&sap_xep=ten&cursor=...'
+    """
+    ban_sao = tham_so.copy()
+    ban_sao.pop('cursor', None)
+    if con_tro:
+        ban_sao['cursor'] = con_tro
+    return f'?{ban_sao.urlencode()}' if ban_sao else '?'
@@ -0,0 +1,236 @@
+"""
+Chay Nhieu Lenh Cong Cu GIS Trong Mot Request
+Batch execution of GIS tool invocations for /api/gis-tools/batch/
+"""
+
+from itertools import compress
+
+from .spatial_queries import lay_ten_cua_hang, tao_da_giac
+from .store_snapshot import lay_ban_chup
+from .store_stats import lay_thong_ke
+from .utils.gis_tools import CongCuGIS, DaGiacChuanBi
+
+
+# So lenh toi da trong mot lo
+SO_LENH_TOI_DA = 1000
+
+# So cua hang toi da tra ve cho moi lenh in_polygon
+SO_CUA_HANG_TRONG_DA_GIAC_TOI_DA = 500
+
+
+class _NguCanhLo:
+    """
+    Du lieu dung chung cho tat ca lenh trong mot lo
+
+    GIAI THICH:
+    - Ban chup toa do cua hang chi lay mot lan cho ca lo
+    - Cac ket qua can ten cua hang chi ghi lai id; ten_cua_hang duoc doc
+      bang mot truy van duy nhat sau khi chay xong ca lo
+    - Thong ke (centroid) doc mot lan cho moi loai
+    """
+
+    def __init__(self):
+        self._ban_chup = None
+        self._thong_ke = {}
+        self.can_ten = []
+
+    @property
+    def ban_chup(self):
+        if self._ban_chup is None:
+            self._ban_chup = lay_ban_chup()
+        return self._ban_chup
+
+    def thong_ke(self, loai_id):
+        if loai_id not in self._thong_ke:
+            self._thong_ke[loai_id] = lay_thong_ke(loai_id)
+        return self._thong_ke[loai_id]
+
+    def cua_hang(self, id_cua_hang, **them):
+        """Tao dict ket qua cho mot cua hang, ten se duoc dien sau"""
+        muc = {'store_id': id_cua_hang, 'store_name': None, **them}
+        self.can_ten.append(muc)
+        return muc
+
+    def dien_ten_cua_hang(self):
+        if self.can_ten:
+            ten_cua_hang = lay_ten_cua_hang({muc['store_id'] for muc in self.can_ten})
+            for muc in self.can_ten:
+                muc['store_name'] = ten_cua_hang.get(muc['store_id'])
+
+
+def _bon_toa_do(lenh):
+    """Doc tham so lat1, lon1, lat2, lon2 cua mot lenh distance/bearing"""
+    return (float(lenh['lat1']), float(lenh['lon1']), float(lenh['lat2']), float(lenh['lon2']))
+
+
+def _xu_ly_distance(cac_cap_diem):
+    """Tat ca lenh distance: mot lan goi tinh_khoang_cach_tung_cap"""
+    cac_khoang_cach = CongCuGIS.tinh_khoang_cach_tung_cap(cac_cap_diem)
+    return [{
+        'distance_km': round(float(khoang_cach), 3),
+        'distance_m': round(float(khoang_cach) * 1000, 1)
+    } for khoang_cach in cac_khoang_cach]
+
+
+def _xu_ly_bearing(cac_cap_diem):
+    """Tat ca lenh bearing: mot lan goi tinh_huong_di_tung_cap"""
+    cac_huong_di = CongCuGIS.tinh_huong_di_tung_cap(cac_cap_diem)
+    return [{
+        'bearing_degrees': round(float(huong_di), 1),
+        'direction': CongCuGIS.ten_huong_di(float(huong_di))
+    } for huong_di in cac_huong_di]
+
+
+def _xu_ly_nearest(lenh, ngu_canh):
+    gan_nhat, khoang_cach = ngu_canh.ban_chup.tim_gan_nhat(float(lenh['lat']), float(lenh['lon']))
+    if gan_nhat is None:
+        raise ValueError('Không có cửa hàng nào có tọa độ')
+    return ngu_canh.cua_hang(gan_nhat[2], distance_km=round(khoang_cach, 3))
+
+
+def _tam_va_ban_kinh(lenh):
+    """Doc tham so lat, lon, radius cua mot lenh buffer"""
+    return float(lenh['lat']), float(lenh['lon']), float(lenh.get('radius', 1.0))
+
+
+def _xu_ly_buffer(cac_tham_so):
+    """Tat ca lenh buffer: mot lan goi tao_nhieu_vung_dem_hinh_tron (bang cos/sin dung chung)"""
+    cac_vung_dem = CongCuGIS.tao_nhieu_vung_dem_hinh_tron(
+        cac_tham_so, [ban_kinh_km for _, _, ban_kinh_km in cac_tham_so]
+    )
+    return [{
+        'center': [vi_do, kinh_do],
+        'radius_km': ban_kinh_km,
+        'polygon': [list(diem) for diem in vung_dem]
+    } for (vi_do, kinh_do, ban_kinh_km), vung_dem in zip(cac_tham_so, cac_vung_dem)]
+
+
+def _xu_ly_centroid(lenh, ngu_canh):
+    loai_id = lenh.get('loai')
+    thong_ke = ngu_canh.thong_ke(int(loai_id) if loai_id else None)
+    if thong_ke is None:
+        raise ValueError('Không có cửa hàng nào có tọa độ')
+    return {
+        'centroid': [thong_ke.tong_vi_do / thong_ke.so_luong, thong_ke.tong_kinh_do / thong_ke.so_luong],
+        'bbox': [[thong_ke.vi_do_min, thong_ke.kinh_do_min], [thong_ke.vi_do_max, thong_ke.kinh_do_max]],
+        'num_stores': thong_ke.so_luong
+    }
+
+
+def _xu_ly_within_radius(lenh, ngu_canh):
+    vi_do, kinh_do = float(lenh['lat']), float(lenh['lon'])
+    ban_kinh_km = float(lenh.get('radius', 5.0))
+    ket_qua = CongCuGIS.tim_diem_trong_ban_kinh(vi_do, kinh_do, ngu_canh.ban_chup.tap, ban_kinh_km)
+    danh_sach_ket_qua = [ngu_canh.cua_hang(r['diem'][2], distance_km=round(r['khoang_cach'], 3))
+                         for r in ket_qua]
+    return {
+        'origin': [vi_do, kinh_do],
+        'radius_km': ban_kinh_km,
+        'count': len(danh_sach_ket_qua),
+        'stores': danh_sach_ket_qua
+    }
+
+
+def _xu_ly_in_polygon(lenh, ngu_canh):
+    toa_do_da_giac = lenh.get('polygon') or []
+    tao_da_giac(toa_do_da_giac)  # kiem tra hop le nhu /api/gis-tools/?tool=in_polygon
+    gioi_han = min(max(int(lenh.get('limit', SO_CUA_HANG_TRONG_DA_GIAC_TOI_DA)), 1),
+                   SO_CUA_HANG_TRONG_DA_GIAC_TOI_DA)
+    tap = ngu_canh.ban_chup.tap
+    cac_id = sorted(compress(tap.ids, DaGiacChuanBi(toa_do_da_giac).chua_nhieu(tap)))
+    danh_sach_ket_qua = [ngu_canh.cua_hang(id_cua_hang) for id_cua_hang in cac_id[:gioi_han]]
+    return {
+        'polygon': toa_do_da_giac,
+        'count': len(danh_sach_ket_qua),
+        'truncated': len(cac_id) > gioi_han,
+        'stores': danh_sach_ket_qua
+    }
+
+
+# Cong cu xu ly ca nhom mot lan (vector hoa): (doc tham so tung lenh, tinh ca nhom)
+# va cong cu xu ly tung lenh
+CAC_CONG_CU_THEO_NHOM = {
+    'distance': (_bon_toa_do, _xu_ly_distance),
+    'bearing': (_bon_toa_do, _xu_ly_bearing),
+    'buffer': (_tam_va_ban_kinh, _xu_ly_buffer),
+}
+CAC_CONG_CU_TUNG_LENH = {
+    'nearest': _xu_ly_nearest,
+    'centroid': _xu_ly_centroid,
+    'within_radius': _xu_ly_within_radius,
+    'in_polygon': _xu_ly_in_polygon,
+}
+
+
+def _loi(loi):
+    return {'success': False, 'error': str(loi)}
+
+
+def chay_lo_lenh(cac_lenh):
+    """
+    Chay mot lo lenh cong cu GIS, tra ve ket qua theo dung thu tu dau vao
+
+    GIAI THICH:
+    - Gom lenh theo tool; distance, bearing va buffer cua ca lo duoc tinh
+      vector hoa trong mot lan goi CongCuGIS
+    - Cac tool doc cua hang (nearest, within_radius, in_polygon) dung
+      chung mot ban chup va mot truy van lay ten cua hang cho ca lo
+    - Moi lenh co ket qua rieng: lenh loi (thieu/sai tham so) chi tra ve
+      loi cua chinh no, khong lam hong ca lo
+    - Chi tinh bang Python tren ban chup; mode=db khong ho tro trong lo
+
+    THAM SO:
+        cac_lenh: List dict, moi dict co 'tool' va cac tham so nhu query
+                  string cua /api/gis-tools/ (in_polygon co them 'polygon')
+
+    TRA VE:
+        List dict {'success', 'tool', 'result'} hoac {'success': False, 'error'}
+
+    VI DU:
+        >>> chay_lo_lenh([
+        ...     {'tool': 'distance', 'lat1': 16.05, 'lon1': 108.20, 'lat2': 16.06, 'lon2': 108.21},
+        ...     {'tool': 'nearest', 'lat': 16.05, 'lon': 108.20},
+        ... ])
+    """
+    ket_qua = [None] * len(cac_lenh)
+    theo_cong_cu = {}
+    for vi_tri, lenh in enumerate(cac_lenh):
+        if not isinstance(lenh, dict):
+            ket_qua[vi_tri] = _loi('Mỗi lệnh phải là một object JSON')
+        elif lenh.get('mode') == 'db':
+            ket_qua[vi_tri] = _loi('mode=db không được hỗ trợ trong batch')
+        elif lenh.get('tool') not in CAC_CONG_CU_THEO_NHOM and lenh.get('tool') not in CAC_CONG_CU_TUNG_LENH:
+            ket_qua[vi_tri] = _loi('Unknown tool. Available: ' +
+                                   ', '.join([*CAC_CONG_CU_THEO_NHOM, *CAC_CONG_CU_TUNG_LENH]))
+        else:
+            theo_cong_cu.setdefault(lenh['tool'], []).append(vi_tri)
+
+    ngu_canh = _NguCanhLo()
+
+    def ghi(vi_tri, cong_cu, gia_tri):
+        ket_qua[vi_tri] = {'success': True, 'tool': cong_cu, 'result': gia_tri}
+
+    for cong_cu, cac_vi_tri in theo_cong_cu.items():
+        if cong_cu in CAC_CONG_CU_THEO_NHOM:
+            doc_tham_so, xu_ly_nhom = CAC_CONG_CU_THEO_NHOM[cong_cu]
+            hop_le, cac_tham_so = [], []
+            for vi_tri in cac_vi_tri:
+                try:
+                    cac_tham_so.append(doc_tham_so(cac_lenh[vi_tri]))
+                    hop_le.append(vi_tri)
+                except Exception as e:
+                    ket_qua[vi_tri] = _loi(e)
+            if cac_tham_so:
+                for vi_tri, gia_tri in zip(hop_le, xu_ly_nhom(cac_tham_so)):
+                    ghi(vi_tri, cong_cu, gia_tri)
+            continue
+
+        xu_ly = CAC_CONG_CU_TUNG_LENH[cong_cu]
+        for vi_tri in cac_vi_tri:
+            try:
+                ghi(vi_tri, cong_cu, xu_ly(cac_lenh[vi_tri], ngu_canh))
+            except Exception as e:
+                ket_qua[vi_tri] = _loi(e)
+
+    ngu_canh.dien_ten_cua_hang()
+    return ket_qua
@@ -0,0 +1,118 @@
+"""
+Vung Phuc Vu Hop Nhat Cua Cac Cua Hang
+Coverage area: dissolved union of store buffers, cached per store-data version
+"""
+
+import json
+import struct
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.cache import cache
+
+from .result_cache import lay_phien_ban_du_lieu
+from .store_snapshot import lay_ban_chup
+from .utils.gis_tools import CongCuGIS
+
+try:
+    import numpy as np
+except ImportError:  # NumPy la tuy chon, xem utils/gis_tools.py
+    np = None
+
+
+# Thoi gian giu ket qua trong Django cache (giay); ket qua cu khong bao gio
+# duoc doc lai vi khoa chua phien ban du lieu, timeout chi de don dep
+THOI_GIAN_GIU_VUNG_PHU = 24 * 3600
+
+
+def _wkb_cac_vung_dem(cac_vung_dem):
+    """
+    WKB (little-endian) cua MultiPolygon gom cac vung dem
+
+    GIAI THICH:
+    - Tao tung Polygon GEOS tu Python ton mot lan goi ctypes cho moi toa
+      do (~0.3 ms moi vung dem); ghi thang WKB roi de GEOS doc mot lan
+      nhanh hon hang chuc lan
+    - Co NumPy: ca mang ban ghi (byte order, kieu, so vong, so diem, toa do)
+      duoc dien bang gan mang, khong vong lap Python
+    """
+    dau = struct.pack('<BII', 1, 6, len(cac_vung_dem))   # MultiPolygon, N thanh phan
+
+    if np is not None and isinstance(cac_vung_dem, np.ndarray):
+        so_diem = cac_vung_dem.shape[1] + 1   # vong khep kin
+        kieu_ban_ghi = np.dtype([('thu_tu_byte', 'u1'), ('kieu', '<u4'), ('so_vong', '<u4'),
+                                 ('so_diem', '<u4'), ('toa_do', '<f8', (so_diem, 2))])
+        ban_ghi = np.empty(len(cac_vung_dem), dtype=kieu_ban_ghi)
+        ban_ghi['thu_tu_byte'] = 1
+        ban_ghi['kieu'] = 3   # Polygon
+        ban_ghi['so_vong'] = 1
+        ban_ghi['so_diem'] = so_diem
+        # GEOS dung thu tu (x, y) = (kinh_do, vi_do)
+        ban_ghi['toa_do'][:, :-1] = cac_vung_dem[:, :, ::-1]
+        ban_ghi['toa_do'][:, -1] = cac_vung_dem[:, 0, ::-1]
+        return dau + ban_ghi.tobytes()
+
+    cac_phan = [dau]
+    for vung_dem in cac_vung_dem:
+        vong = [*vung_dem, vung_dem[0]]
+        cac_phan.append(struct.pack('<BIII', 1, 3, 1, len(vong)))
+        cac_phan.append(struct.pack(f'<{2 * len(vong)}d',
+                                    *(x for vi_do, kinh_do in vong for x in (kinh_do, vi_do))))
+    return b''.join(cac_phan)
+
+
+def tinh_vung_phu(tap, ban_kinh_km, so_diem=32):
+    """
+    Hop nhat vung dem hinh tron cua tat ca cua hang trong tap
+
+    GIAI THICH:
+    - Tao tat ca vung dem trong mot lan goi (tao_nhieu_vung_dem_hinh_tron)
+    - GEOS unary_union hop nhat theo cay (cascaded union: chia nhom theo
+      chi muc khong gian, hop tung cap nho roi hop dan len) nen chi phi
+      ~O(n log n), khong phai hop tung cai vao ket qua chung O(n²)
+
+    THAM SO:
+        tap: TapDiemCuaHang (hoac danh sach (vi_do, kinh_do, ...))
+        ban_kinh_km: Ban kinh vung dem moi cua hang
+        so_diem: So diem tren moi duong tron
+
+    TRA VE:
+        GEOSGeometry (Polygon/MultiPolygon, SRID 4326) hoac None neu tap rong
+    """
+    if not len(tap):
+        return None
+
+    cac_vung_dem = CongCuGIS.tao_nhieu_vung_dem_hinh_tron(tap, ban_kinh_km, so_diem)
+    tap_vung_dem = GEOSGeometry(memoryview(_wkb_cac_vung_dem(cac_vung_dem)), srid=4326)
+    return tap_vung_dem.unary_union
+
+
+def lay_vung_phu(ban_kinh_km, loai_id=None):
+    """
+    Vung phuc vu cua tat ca cua hang (hoac mot loai), co bo nho dem
+
+    GIAI THICH:
+    - Ket qua luu trong Django cache theo (phien ban du lieu, loai, ban
+      kinh): dung chung giua cac worker, tu vo hieu khi cua hang thay doi
+      (store_changes.py doi phien ban du lieu)
+
+    TRA VE:
+        Dict {'num_stores', 'geometry'} - geometry la GeoJSON (dict) hoac None
+
+    VI DU:
+        >>> vung_phu = lay_vung_phu(2.0, loai_id=1)
+        >>> vung_phu['geometry']['type']
+        'MultiPolygon'
+    """
+    khoa = f'gis:vung_phu:{lay_phien_ban_du_lieu()}:{loai_id}:{ban_kinh_km!r}'
+    ket_qua = cache.get(khoa)
+    if ket_qua is None:
+        tap = lay_ban_chup().tap
+        if loai_id is not None:
+            tap = tap.loc_theo_loai(loai_id)
+        vung_phu = tinh_vung_phu(tap, ban_kinh_km)
+        ket_qua = {
+            'num_stores': len(tap),
+            'geometry': json.loads(vung_phu.json) if vung_phu is not None else None,
+        }
+        cache.set(khoa, ket_qua, THOI_GIAN_GIU_VUNG_PHU)
+    return ket_qua
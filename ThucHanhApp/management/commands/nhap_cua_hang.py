@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ThucHanhApp.store_import import CAC_DINH_DANG, SO_DONG_MOI_LO, doan_dinh_dang, nhap_cua_hang
+
+
+class Command(BaseCommand):
+    help = 'Nhap cua hang hang loat tu tep CSV / GeoJSON / NDJSON (upsert theo ten cua hang)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('duong_dan', help='Tep CSV (ten_cua_hang, dia_chi, loai, vi_do, kinh_do) hoac GeoJSON')
+        parser.add_argument('--dinh-dang', choices=CAC_DINH_DANG, help='Mac dinh: doan theo duoi ten tep')
+        parser.add_argument('--lo', type=int, default=SO_DONG_MOI_LO, help='So dong moi lo ghi')
+        parser.add_argument('--tao-loai', action='store_true', help='Tao loai cua hang chua co thay vi bo qua dong')
+
+    def handle(self, *args, **options):
+        try:
+            dinh_dang = options['dinh_dang'] or doan_dinh_dang(options['duong_dan'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        bat_dau = time.monotonic()
+
+        def bao_tien_do(ket_qua):
+            toc_do = ket_qua['so_dong'] / max(time.monotonic() - bat_dau, 1e-9)
+            self.stdout.write(
+                f"{ket_qua['so_dong']} dong: {ket_qua['so_them']} them, {ket_qua['so_cap_nhat']} cap nhat, "
+                f"{ket_qua['so_loi']} loi ({toc_do:.0f} dong/s)"
+            )
+
+        try:
+            with open(options['duong_dan'], encoding='utf-8-sig', newline='') as tep:
+                ket_qua = nhap_cua_hang(tep, dinh_dang, tao_loai=options['tao_loai'],
+                                        so_dong_moi_lo=options['lo'], bao_tien_do=bao_tien_do)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for loi in ket_qua['cac_loi']:
+            self.stderr.write(loi)
+        self.stdout.write(self.style.SUCCESS(
+            f"Da nhap {ket_qua['so_dong']} dong trong {time.monotonic() - bat_dau:.1f}s: "
+            f"{ket_qua['so_them']} them, {ket_qua['so_cap_nhat']} cap nhat, {ket_qua['so_loi']} loi"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from ThucHanhApp.store_snapshot import lay_duong_dan_ban_chup, tao_lai_ban_chup
+
+
+class Command(BaseCommand):
+    help = 'Tao lai file ban chup toa do cua hang dung chung cho cac worker'
+
+    def handle(self, *args, **options):
+        phien_ban = tao_lai_ban_chup()
+        self.stdout.write(self.style.SUCCESS(
+            f'Da ghi ban chup phien ban {phien_ban} vao {lay_duong_dan_ban_chup()}'
+        ))
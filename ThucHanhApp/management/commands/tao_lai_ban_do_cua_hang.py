@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ThucHanhApp.store_read_model import tao_lai_ban_do_cua_hang
+
+
+class Command(BaseCommand):
+    help = 'Dung lai bang doc ban_do_cua_hang (toa do, ten loai, ten su kien moi cua hang) tu cac bang goc'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            so_dong = tao_lai_ban_do_cua_hang()
+        self.stdout.write(self.style.SUCCESS(f'Da dung lai {so_dong} dong ban do cua hang'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from ThucHanhApp.store_snapshot import lay_ban_chup
+from ThucHanhApp.store_tiles import ZOOM_TOI_DA, cac_tile_co_cua_hang, lay_thu_muc_tile, lay_tile, xoa_tat_ca_tile
+
+
+class Command(BaseCommand):
+    help = 'Tao truoc cac vector tile cua hang (chi tile co cua hang) vao cache tren dia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-zoom', type=int, default=0)
+        parser.add_argument('--max-zoom', type=int, default=14)
+        parser.add_argument('--xoa-cu', action='store_true', help='Xoa toan bo cache tile truoc khi tao')
+
+    def handle(self, *args, **options):
+        if options['xoa_cu']:
+            xoa_tat_ca_tile()
+
+        tap = lay_ban_chup().tap
+        tong = 0
+        for z in range(max(options['min_zoom'], 0), min(options['max_zoom'], ZOOM_TOI_DA) + 1):
+            cac_tile = cac_tile_co_cua_hang(tap, z)
+            for x, y in sorted(cac_tile):
+                lay_tile(z, x, y)
+            tong += len(cac_tile)
+            self.stdout.write(f'zoom {z}: {len(cac_tile)} tile')
+
+        self.stdout.write(self.style.SUCCESS(f'Da tao {tong} tile trong {lay_thu_muc_tile()}'))
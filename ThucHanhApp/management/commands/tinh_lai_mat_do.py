@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ThucHanhApp.store_density import tinh_lai_mat_do
+
+
+class Command(BaseCommand):
+    help = 'Tinh lai luoi mat do cua hang va diem danh gia (bang o_mat_do) tu cua_hang va danh_gia'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            so_o = tinh_lai_mat_do()
+        self.stdout.write(self.style.SUCCESS(f'Da tinh lai {so_o} o mat do'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ThucHanhApp.store_stats import lay_thong_ke, tinh_lai_tat_ca_thong_ke
+
+
+class Command(BaseCommand):
+    help = 'Tinh lai bang thong ke toa do cua hang (tam, khung bao) tu bang cua_hang'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tinh_lai_tat_ca_thong_ke()
+        thong_ke = lay_thong_ke()
+        self.stdout.write(self.style.SUCCESS(
+            f'Da tinh lai thong ke cho {thong_ke.so_luong if thong_ke else 0} cua hang'
+        ))
@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def tinh_thong_ke_ban_dau(apps, schema_editor):
+    """Tinh thong ke tu cac cua hang da co (mot hang tong + mot hang moi loai)"""
+    CuaHang = apps.get_model('ThucHanhApp', 'CuaHang')
+    ThongKeCuaHang = apps.get_model('ThucHanhApp', 'ThongKeCuaHang')
+
+    thong_ke = {None: ThongKeCuaHang(loai_id=None)}
+    for loai_id, geom in CuaHang.objects.filter(geom__isnull=False).values_list('loai_id', 'geom'):
+        for khoa in (None, loai_id):
+            if khoa not in thong_ke:
+                thong_ke[khoa] = ThongKeCuaHang(loai_id=khoa)
+            hang = thong_ke[khoa]
+            hang.so_luong += 1
+            hang.tong_vi_do += geom.y
+            hang.tong_kinh_do += geom.x
+            hang.vi_do_min = geom.y if hang.vi_do_min is None else min(hang.vi_do_min, geom.y)
+            hang.vi_do_max = geom.y if hang.vi_do_max is None else max(hang.vi_do_max, geom.y)
+            hang.kinh_do_min = geom.x if hang.kinh_do_min is None else min(hang.kinh_do_min, geom.x)
+            hang.kinh_do_max = geom.x if hang.kinh_do_max is None else max(hang.kinh_do_max, geom.x)
+    ThongKeCuaHang.objects.bulk_create(thong_ke.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ThucHanhApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThongKeCuaHang',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('so_luong', models.IntegerField(default=0)),
+                ('tong_vi_do', models.FloatField(default=0)),
+                ('tong_kinh_do', models.FloatField(default=0)),
+                ('vi_do_min', models.FloatField(blank=True, null=True)),
+                ('vi_do_max', models.FloatField(blank=True, null=True)),
+                ('kinh_do_min', models.FloatField(blank=True, null=True)),
+                ('kinh_do_max', models.FloatField(blank=True, null=True)),
+                ('loai', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thong_ke', to='ThucHanhApp.loaicuahang')),
+            ],
+            options={
+                'verbose_name': 'Thống kê cửa hàng',
+                'verbose_name_plural': 'Thống kê cửa hàng',
+                'db_table': 'thong_ke_cua_hang',
+            },
+        ),
+        migrations.RunPython(tinh_thong_ke_ban_dau, migrations.RunPython.noop),
+    ]
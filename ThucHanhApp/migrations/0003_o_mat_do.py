@@ -0,0 +1,67 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:08
+
+import math
+
+from django.db import migrations, models
+
+
+CAC_MUC = (4, 6, 8, 10, 12, 14, 16)
+
+
+def tinh_mat_do_ban_dau(apps, schema_editor):
+    """Tinh luoi mat do tu cac cua hang va danh gia da co (xem store_density.cac_o_cua_diem)"""
+    CuaHang = apps.get_model('ThucHanhApp', 'CuaHang')
+    DanhGia = apps.get_model('ThucHanhApp', 'DanhGia')
+    OMatDo = apps.get_model('ThucHanhApp', 'OMatDo')
+
+    danh_gia = {}
+    for cua_hang_id, diem in DanhGia.objects.values_list('cua_hang_id', 'diem'):
+        so, tong = danh_gia.get(cua_hang_id, (0, 0))
+        danh_gia[cua_hang_id] = (so + 1, tong + diem)
+
+    muc_toi_da = CAC_MUC[-1]
+    n = 2 ** muc_toi_da
+    cac_o = {}
+    for cua_hang_id, geom in CuaHang.objects.filter(geom__isnull=False).values_list('id', 'geom'):
+        vi_do = min(max(geom.y, -85.05112878), 85.05112878)
+        o_x = min(int((geom.x + 180.0) / 360.0 * n), n - 1)
+        o_y = min(int((1.0 - math.asinh(math.tan(math.radians(vi_do))) / math.pi) / 2.0 * n), n - 1)
+        so_danh_gia, tong_diem = danh_gia.get(cua_hang_id, (0, 0))
+        for muc in CAC_MUC:
+            khoa = (muc, o_x >> (muc_toi_da - muc), o_y >> (muc_toi_da - muc))
+            if khoa not in cac_o:
+                cac_o[khoa] = OMatDo(muc=khoa[0], o_x=khoa[1], o_y=khoa[2])
+            o = cac_o[khoa]
+            o.so_cua_hang += 1
+            o.so_danh_gia += so_danh_gia
+            o.tong_diem += tong_diem
+    OMatDo.objects.bulk_create(cac_o.values(), batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ThucHanhApp', '0002_thong_ke_cua_hang'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OMatDo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('muc', models.SmallIntegerField()),
+                ('o_x', models.IntegerField()),
+                ('o_y', models.IntegerField()),
+                ('so_cua_hang', models.IntegerField(default=0)),
+                ('so_danh_gia', models.IntegerField(default=0)),
+                ('tong_diem', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Ô mật độ',
+                'verbose_name_plural': 'Ô mật độ',
+                'db_table': 'o_mat_do',
+                'unique_together': {('muc', 'o_x', 'o_y')},
+            },
+        ),
+        migrations.RunPython(tinh_mat_do_ban_dau, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:10
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Dien bang doc tu cac cua hang da co (xem store_read_model.SQL_DONG_BO)
+SQL_DIEN_BAN_DAU = """
+    INSERT INTO ban_do_cua_hang
+        (cua_hang_id, ten_cua_hang, dia_chi, loai_id, ten_loai, geom, vi_do, kinh_do, su_kien)
+    SELECT ch.id, ch.ten_cua_hang, ch.dia_chi, ch.loai_id, l.ten_loai, ch.geom, ST_Y(ch.geom), ST_X(ch.geom),
+           COALESCE((SELECT array_agg(sk.ten_su_kien ORDER BY chsk.id)
+                     FROM cua_hang_su_kien chsk JOIN su_kien sk ON sk.id = chsk.su_kien_id
+                     WHERE chsk.cua_hang_id = ch.id), '{}')
+    FROM cua_hang ch JOIN loai_cua_hang l ON l.id = ch.loai_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ThucHanhApp', '0003_o_mat_do'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BanDoCuaHang',
+            fields=[
+                ('cua_hang', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ban_do', serialize=False, to='ThucHanhApp.cuahang')),
+                ('ten_cua_hang', models.CharField(max_length=200)),
+                ('dia_chi', models.TextField()),
+                ('ten_loai', models.CharField(max_length=100)),
+                ('geom', django.contrib.gis.db.models.fields.PointField(srid=4326)),
+                ('vi_do', models.FloatField()),
+                ('kinh_do', models.FloatField()),
+                ('su_kien', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=200), blank=True, default=list, size=None)),
+                ('loai', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ThucHanhApp.loaicuahang')),
+            ],
+            options={
+                'verbose_name': 'Bản đồ cửa hàng',
+                'verbose_name_plural': 'Bản đồ cửa hàng',
+                'db_table': 'ban_do_cua_hang',
+            },
+        ),
+        migrations.RunSQL(SQL_DIEN_BAN_DAU, migrations.RunSQL.noop),
+    ]
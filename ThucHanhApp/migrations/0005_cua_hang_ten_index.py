@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ThucHanhApp', '0004_ban_do_cua_hang'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cuahang',
+            name='ten_cua_hang',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
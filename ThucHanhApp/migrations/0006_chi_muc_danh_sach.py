@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-17 13:02
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY khong chay duoc trong transaction; tao index
+    # tren bang danh_gia lon khong khoa ghi
+    atomic = False
+
+    dependencies = [
+        ('ThucHanhApp', '0005_cua_hang_ten_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cuahang',
+            index=models.Index(fields=['loai', 'id'], name='cua_hang_loai_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='cuahang',
+            index=models.Index(fields=['loai', 'ten_cua_hang'], name='cua_hang_loai_ten_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='danhgia',
+            index=models.Index(fields=['ngay_danh_gia', 'id'], name='danh_gia_ngay_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='danhgia',
+            index=models.Index(fields=['cua_hang', 'ngay_danh_gia', 'id'], name='danh_gia_ch_ngay_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='danhgia',
+            index=models.Index(fields=['diem', 'ngay_danh_gia', 'id'], name='danh_gia_diem_ngay_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sukien',
+            index=models.Index(fields=['ngay_bat_dau', 'id'], name='su_kien_bat_dau_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='cuahangsukien',
+            index=models.Index(fields=['su_kien', 'id'], name='chsk_su_kien_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:20
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def gop_hang_tong_trung(apps, schema_editor):
+    """Hang tong (loai = NULL) bi tao trung thi tinh lai thanh mot hang tu cua_hang"""
+    CuaHang = apps.get_model('ThucHanhApp', 'CuaHang')
+    ThongKeCuaHang = apps.get_model('ThucHanhApp', 'ThongKeCuaHang')
+
+    if ThongKeCuaHang.objects.filter(loai__isnull=True).count() <= 1:
+        return
+    ThongKeCuaHang.objects.filter(loai__isnull=True).delete()
+    hang = ThongKeCuaHang(loai_id=None)
+    for geom in CuaHang.objects.filter(geom__isnull=False).values_list('geom', flat=True).iterator():
+        hang.so_luong += 1
+        hang.tong_vi_do += geom.y
+        hang.tong_kinh_do += geom.x
+        hang.vi_do_min = geom.y if hang.vi_do_min is None else min(hang.vi_do_min, geom.y)
+        hang.vi_do_max = geom.y if hang.vi_do_max is None else max(hang.vi_do_max, geom.y)
+        hang.kinh_do_min = geom.x if hang.kinh_do_min is None else min(hang.kinh_do_min, geom.x)
+        hang.kinh_do_max = geom.x if hang.kinh_do_max is None else max(hang.kinh_do_max, geom.x)
+    hang.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ThucHanhApp', '0006_chi_muc_danh_sach'),
+    ]
+
+    operations = [
+        migrations.RunPython(gop_hang_tong_trung, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='thongkecuahang',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('loai', models.Value(0)), condition=models.Q(('loai__isnull', True)), name='thong_ke_mot_hang_tong'),
+        ),
+    ]
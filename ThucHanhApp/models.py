@@ -1,5 +1,8 @@
 from django.contrib.gis.db import models
+from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
 
 
 # Create your models here.
@@ -17,7 +20,8 @@ class LoaiCuaHang(models.Model):
 
 
 class CuaHang(models.Model):
-    ten_cua_hang = models.CharField(max_length=200)
+    # Co index: nhap hang loat upsert theo ten (store_import.py)
+    ten_cua_hang = models.CharField(max_length=200, db_index=True)
     dia_chi = models.TextField()
     loai = models.ForeignKey(LoaiCuaHang, on_delete=models.CASCADE, related_name='cua_hangs')
     geom = models.PointField(srid=4326)
@@ -26,6 +30,11 @@ class CuaHang(models.Model):
         db_table = 'cua_hang'
         verbose_name = 'Cửa hàng'
         verbose_name_plural = 'Cửa hàng'
+        # Phan trang keyset danh sach quan tri khi loc theo loai (views.SAP_XEP_CUA_HANG)
+        indexes = [
+            models.Index(fields=['loai', 'id'], name='cua_hang_loai_id_idx'),
+            models.Index(fields=['loai', 'ten_cua_hang'], name='cua_hang_loai_ten_idx'),
+        ]
 
     def __str__(self):
         return self.ten_cua_hang
@@ -42,6 +51,12 @@ class DanhGia(models.Model):
         verbose_name = 'Đánh giá'
         verbose_name_plural = 'Đánh giá'
         ordering = ['-ngay_danh_gia']
+        # Phan trang keyset danh sach quan tri (views.SAP_XEP_DANH_GIA)
+        indexes = [
+            models.Index(fields=['ngay_danh_gia', 'id'], name='danh_gia_ngay_id_idx'),
+            models.Index(fields=['cua_hang', 'ngay_danh_gia', 'id'], name='danh_gia_ch_ngay_id_idx'),
+            models.Index(fields=['diem', 'ngay_danh_gia', 'id'], name='danh_gia_diem_ngay_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.cua_hang.ten_cua_hang} - {self.diem} sao"
@@ -58,6 +73,9 @@ class SuKien(models.Model):
         verbose_name = 'Sự kiện'
         verbose_name_plural = 'Sự kiện'
         ordering = ['-ngay_bat_dau']
+        indexes = [
+            models.Index(fields=['ngay_bat_dau', 'id'], name='su_kien_bat_dau_id_idx'),
+        ]
 
     def __str__(self):
         return self.ten_su_kien
@@ -72,6 +90,78 @@ class CuaHangSuKien(models.Model):
         verbose_name = 'Cửa hàng - Sự kiện'
         verbose_name_plural = 'Cửa hàng - Sự kiện'
         unique_together = ('cua_hang', 'su_kien')
+        indexes = [
+            models.Index(fields=['su_kien', 'id'], name='chsk_su_kien_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cua_hang.ten_cua_hang} - {self.su_kien.ten_su_kien}"
+
+
+class ThongKeCuaHang(models.Model):
+    # loai = None: thong ke cua tat ca cua hang
+    loai = models.OneToOneField(LoaiCuaHang, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='thong_ke')
+    so_luong = models.IntegerField(default=0)
+    tong_vi_do = models.FloatField(default=0)
+    tong_kinh_do = models.FloatField(default=0)
+    vi_do_min = models.FloatField(null=True, blank=True)
+    vi_do_max = models.FloatField(null=True, blank=True)
+    kinh_do_min = models.FloatField(null=True, blank=True)
+    kinh_do_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'thong_ke_cua_hang'
+        verbose_name = 'Thống kê cửa hàng'
+        verbose_name_plural = 'Thống kê cửa hàng'
+        # Unique index cua OneToOne cho phep nhieu NULL: rang buoc rieng de
+        # chi co mot hang tong (get_or_create dong thoi khong tao trung)
+        constraints = [
+            models.UniqueConstraint(
+                Coalesce('loai', Value(0)), condition=Q(loai__isnull=True), name='thong_ke_mot_hang_tong',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.loai or 'Tất cả'} - {self.so_luong} cửa hàng"
+
+
+class OMatDo(models.Model):
+    # O luoi mat do: tile Web Mercator (o_x, o_y) o muc zoom `muc`
+    muc = models.SmallIntegerField()
+    o_x = models.IntegerField()
+    o_y = models.IntegerField()
+    so_cua_hang = models.IntegerField(default=0)
+    so_danh_gia = models.IntegerField(default=0)
+    tong_diem = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'o_mat_do'
+        verbose_name = 'Ô mật độ'
+        verbose_name_plural = 'Ô mật độ'
+        unique_together = ('muc', 'o_x', 'o_y')
+
+    def __str__(self):
+        return f"{self.muc}/{self.o_x}/{self.o_y} - {self.so_cua_hang} cửa hàng"
+
+
+class BanDoCuaHang(models.Model):
+    # Bang doc phi chuan hoa: moi cua hang mot dong voi du lieu ban do can
+    cua_hang = models.OneToOneField(CuaHang, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='ban_do')
+    ten_cua_hang = models.CharField(max_length=200)
+    dia_chi = models.TextField()
+    loai = models.ForeignKey(LoaiCuaHang, on_delete=models.CASCADE, related_name='+')
+    ten_loai = models.CharField(max_length=100)
+    geom = models.PointField(srid=4326)
+    vi_do = models.FloatField()
+    kinh_do = models.FloatField()
+    su_kien = ArrayField(models.CharField(max_length=200), default=list, blank=True)
+
+    class Meta:
+        db_table = 'ban_do_cua_hang'
+        verbose_name = 'Bản đồ cửa hàng'
+        verbose_name_plural = 'Bản đồ cửa hàng'
 
     def __str__(self):
-        return f"{self.cua_hang.ten_cua_hang} - {self.su_kien.ten_su_kien}"
\ No newline at end of file
+        return self.ten_cua_hang
@@ -0,0 +1,141 @@
+"""
+Bo Nho Dem Ket Qua Cac Cong Cu GIS Doc Database
+LRU/TTL result cache for DB-backed GIS tools, invalidated by a store-data version
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Khoa luu phien ban du lieu cua hang trong Django cache (dung chung giua cac worker)
+KHOA_PHIEN_BAN = 'gis:phien_ban_du_lieu_cua_hang'
+
+# Alias CACHES rieng cho phien ban: khong chung voi khoa nao bi cull nhieu
+TEN_CACHE_PHIEN_BAN = 'phien_ban'
+
+CAU_HINH_MAC_DINH = {
+    'COORD_PRECISION': 4,
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,
+}
+
+
+def lay_cau_hinh():
+    """Cau hinh bo nho dem: settings.GIS_RESULT_CACHE bo sung gia tri mac dinh"""
+    return {**CAU_HINH_MAC_DINH, **getattr(settings, 'GIS_RESULT_CACHE', {})}
+
+
+def lay_phien_ban_du_lieu():
+    """
+    Phien ban du lieu cua hang hien tai
+
+    GIAI THICH:
+    - Luu trong Django cache nen moi worker doc cung mot gia tri; dung
+      alias rieng (TEN_CACHE_PHIEN_BAN) de khoa nay khong bi xoa khi cache
+      chung day va cull (moi lan mat phien ban la mot lan xoa het ket qua
+      dem, ETag va tile)
+    - Chua co (cache moi hoac da bi xoa) thi tao gia tri moi theo thoi
+      gian: khong bao gio quay lai mot phien ban cu da dung
+    """
+    cache = caches[TEN_CACHE_PHIEN_BAN]
+    phien_ban = cache.get(KHOA_PHIEN_BAN)
+    if phien_ban is None:
+        cache.add(KHOA_PHIEN_BAN, time.time_ns(), timeout=None)
+        phien_ban = cache.get(KHOA_PHIEN_BAN)
+    return phien_ban
+
+
+def tang_phien_ban_du_lieu():
+    """Doi phien ban du lieu cua hang: moi ket qua da dem truoc do khong con duoc dung"""
+    caches[TEN_CACHE_PHIEN_BAN].set(KHOA_PHIEN_BAN, time.time_ns(), timeout=None)
+
+
+def lam_tron_toa_do(vi_do, kinh_do):
+    """Lam tron toa do theo COORD_PRECISION de cac truy van lan can dung chung ket qua"""
+    do_chinh_xac = lay_cau_hinh()['COORD_PRECISION']
+    return round(vi_do, do_chinh_xac), round(kinh_do, do_chinh_xac)
+
+
+class BoNhoDemKetQua:
+    """
+    Bo nho dem LRU co thoi gian song (TTL) trong tung worker
+
+    GIAI THICH:
+    - Khoa = (ten tool, toa do da lam tron, tham so khac); gia tri la ket
+      qua da san sang tra ve JSON
+    - Moi lan doc kiem tra phien ban du lieu cua hang: phien ban doi (cua
+      hang duoc them/sua/xoa) thi xoa sach, khong bao gio tra ket qua cu
+    - Day muc it dung nhat ra khi vuot MAX_ENTRIES; muc qua TTL giay bi bo
+    - Dem so lan trung / truot de theo doi hieu qua
+
+    VI DU:
+        >>> ket_qua = bo_nho_dem.lay_hoac_tinh(('centroid', None), lambda: tinh_tam())
+        >>> bo_nho_dem.thong_ke()
+        {'hits': 10, 'misses': 2, 'size': 2, 'hit_rate': 0.833}
+    """
+
+    def __init__(self):
+        self._cac_muc = OrderedDict()
+        self._phien_ban = None
+        self._khoa = threading.Lock()
+        self.so_lan_trung = 0
+        self.so_lan_truot = 0
+
+    def lay_hoac_tinh(self, khoa, ham_tinh):
+        """
+        Tra ve ket qua da dem cho khoa, hoac goi ham_tinh() roi dem lai
+
+        THAM SO:
+            khoa: Tuple hashable mo ta truy van (toa do da lam tron)
+            ham_tinh: Ham khong tham so tinh ket qua khi chua co trong bo nho dem
+        """
+        cau_hinh = lay_cau_hinh()
+        phien_ban = lay_phien_ban_du_lieu()
+        bay_gio = time.monotonic()
+
+        with self._khoa:
+            if phien_ban != self._phien_ban:
+                self._cac_muc.clear()
+                self._phien_ban = phien_ban
+            muc = self._cac_muc.get(khoa)
+            if muc is not None and muc[0] > bay_gio:
+                self._cac_muc.move_to_end(khoa)
+                self.so_lan_trung += 1
+                return muc[1]
+            self.so_lan_truot += 1
+
+        gia_tri = ham_tinh()
+
+        with self._khoa:
+            # Chi luu neu du lieu khong doi trong luc tinh
+            if phien_ban == self._phien_ban:
+                self._cac_muc[khoa] = (bay_gio + cau_hinh['TTL'], gia_tri)
+                self._cac_muc.move_to_end(khoa)
+                while len(self._cac_muc) > cau_hinh['MAX_ENTRIES']:
+                    self._cac_muc.popitem(last=False)
+        return gia_tri
+
+    def xoa_het(self):
+        """Xoa moi muc va dat lai bo dem trung/truot"""
+        with self._khoa:
+            self._cac_muc.clear()
+            self.so_lan_trung = self.so_lan_truot = 0
+
+    def thong_ke(self):
+        """So lan trung, truot, so muc dang luu va ty le trung cua worker nay"""
+        with self._khoa:
+            tong = self.so_lan_trung + self.so_lan_truot
+            return {
+                'hits': self.so_lan_trung,
+                'misses': self.so_lan_truot,
+                'size': len(self._cac_muc),
+                'hit_rate': round(self.so_lan_trung / tong, 3) if tong else 0.0,
+            }
+
+
+# Bo nho dem dung chung cho moi request trong worker
+bo_nho_dem_ket_qua = BoNhoDemKetQua()
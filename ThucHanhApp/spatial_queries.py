@@ -0,0 +1,336 @@
+"""
+Truy Van Khong Gian Phia Co So Du Lieu (PostGIS)
+Database-side spatial queries for the GIS tools API
+"""
+
+import base64
+import math
+from itertools import chain
+
+from django.contrib.gis.db.models.functions import Distance, GeometryDistance
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.measure import D
+from django.db.models import Exists, F, FloatField, Func, OuterRef, Q
+
+from .models import BanDoCuaHang, CuaHang, CuaHangSuKien
+from .utils.gis_tools import CongCuGIS, TapDiemCuaHang
+
+
+# PostGIS ST_DistanceSphere dung ban kinh 6370986 m, nho hon
+# CongCuGIS.BAN_KINH_TRAI_DAT_KM mot chut - noi khung loc so bo de bu
+HE_SO_NOI_KHUNG = 1.0001
+
+
+def lay_tap_diem_cua_hang():
+    """
+    Doc toa do tat ca cua hang thanh TapDiemCuaHang gon nhe
+
+    GIAI THICH:
+    - Doc cot vi_do, kinh_do san co cua bang doc BanDoCuaHang nen khong
+      tao model instance hay doi tuong GEOS nao
+    - values_list + iterator doc theo tung khoi, do vao cac mang song song
+
+    TRA VE:
+        TapDiemCuaHang (phan tu thu i la (vi_do, kinh_do, id))
+    """
+    cac_dong = BanDoCuaHang.objects.values_list('cua_hang_id', 'vi_do', 'kinh_do', 'loai_id')
+    return TapDiemCuaHang.tu_danh_sach(cac_dong.iterator(chunk_size=5000))
+
+
+def lay_ten_cua_hang(cac_id):
+    """Tra ve dict {id: ten_cua_hang} cho cac id can hien thi (mot truy van)"""
+    return dict(CuaHang.objects.filter(id__in=list(cac_id)).values_list('id', 'ten_cua_hang'))
+
+
+def tao_khung_loc(vi_do, kinh_do, ban_kinh_km):
+    """
+    Tao Polygon khung bao (SRID 4326) chua tron vong tron ban kinh cho truoc
+
+    GIAI THICH:
+    - Dung CongCuGIS.tinh_khung_bao_ban_kinh de co khung chac chan
+    - Loc geom__bboverlaps voi khung nay se dung GiST index cua CuaHang.geom
+      (toan tu &&) thay vi quet toan bang
+
+    THAM SO:
+        vi_do, kinh_do: Toa do tam (do)
+        ban_kinh_km: Ban kinh theo kilometers
+
+    TRA VE:
+        Polygon hinh chu nhat SRID 4326
+    """
+    (vi_do_min, kinh_do_min), (vi_do_max, kinh_do_max) = CongCuGIS.tinh_khung_bao_ban_kinh(
+        vi_do, kinh_do, ban_kinh_km * HE_SO_NOI_KHUNG
+    )
+    khung = Polygon.from_bbox((kinh_do_min, vi_do_min, kinh_do_max, vi_do_max))
+    khung.srid = 4326
+    return khung
+
+
+# Toa do cua hang tra ve kem ket qua (ban do can de ve va di chuyen den)
+COT_TOA_DO = {
+    'vi_do': Func('geom', function='ST_Y', output_field=FloatField()),
+    'kinh_do': Func('geom', function='ST_X', output_field=FloatField()),
+}
+
+
+def tim_k_cua_hang_gan_nhat(vi_do, kinh_do, k=1, loai_id=None):
+    """
+    Tim k cua hang gan nhat bang KNN cua PostGIS
+
+    GIAI THICH:
+    - Buoc 1: ORDER BY geom <-> diem LIMIT k - toan tu KNN di theo GiST
+      index cua CuaHang.geom, chi doc k dong
+    - Toan tu <-> tren SRID 4326 so sanh theo do (mat phang), co the lech
+      thu tu so voi khoang cach mat cau; vi vay k ung vien chi cho biet ban
+      kinh lon nhat can xet (khoang cach mat cau xa nhat trong k ung vien)
+    - Buoc 2: lay cac cua hang trong khung bao ban kinh do (van dung index),
+      sap xep theo ST_DistanceSphere tinh trong database, lay k dong dau
+      => ket qua chinh xac theo khoang cach mat cau
+    - Chi lay cac cot can cho JSON (id, ten_cua_hang, loai_id, toa do,
+      khoang cach)
+
+    THAM SO:
+        vi_do, kinh_do: Toa do diem goc (do)
+        k: So cua hang can lay
+        loai_id: Chi lay cua hang thuoc loai nay (tuy chon)
+
+    TRA VE:
+        Danh sach dict {'id', 'ten_cua_hang', 'loai_id', 'vi_do', 'kinh_do',
+        'khoang_cach'} sap xep tu gan den xa; khoang_cach la doi tuong
+        django.contrib.gis.measure.Distance
+
+    VI DU:
+        >>> ket_qua = tim_k_cua_hang_gan_nhat(16.05, 108.20, k=5)
+        >>> print(ket_qua[0]['ten_cua_hang'], ket_qua[0]['khoang_cach'].km)
+    """
+    diem = Point(kinh_do, vi_do, srid=4326)
+    cua_hang_co_toa_do = CuaHang.objects.filter(geom__isnull=False)
+    if loai_id is not None:
+        cua_hang_co_toa_do = cua_hang_co_toa_do.filter(loai_id=loai_id)
+
+    # Buoc 1: k ung vien theo KNN tren GiST index
+    ung_vien = list(
+        cua_hang_co_toa_do
+        .annotate(khoang_cach=Distance('geom', diem, spheroid=False))
+        .order_by(GeometryDistance('geom', diem))
+        .values_list('khoang_cach', flat=True)[:k]
+    )
+    if not ung_vien:
+        return []
+
+    # Buoc 2: xep hang lai chinh xac trong ban kinh cua ung vien xa nhat
+    ban_kinh_km = max(kc.km for kc in ung_vien)
+    return list(
+        cua_hang_co_toa_do
+        .filter(geom__bboverlaps=tao_khung_loc(vi_do, kinh_do, ban_kinh_km))
+        .annotate(khoang_cach=Distance('geom', diem, spheroid=False))
+        .order_by('khoang_cach', 'id')
+        .values('id', 'ten_cua_hang', 'loai_id', 'khoang_cach', **COT_TOA_DO)[:k]
+    )
+
+
+def ma_hoa_con_tro(khoang_cach_m, id_cua_hang):
+    """Ma hoa vi tri (khoang cach, id) cua dong cuoi trang thanh con tro dang chuoi"""
+    return base64.urlsafe_b64encode(f'{khoang_cach_m!r}:{id_cua_hang}'.encode()).decode()
+
+
+def giai_ma_con_tro(con_tro):
+    """
+    Giai ma con tro thanh tuple (khoang_cach_m, id_cua_hang)
+
+    TRA VE:
+        Tuple (float, int); nem ValueError neu con tro khong hop le
+    """
+    try:
+        khoang_cach_m, id_cua_hang = base64.urlsafe_b64decode(con_tro.encode()).decode().split(':')
+        return float(khoang_cach_m), int(id_cua_hang)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+
+
+def tim_cua_hang_trong_ban_kinh(vi_do, kinh_do, ban_kinh_km, gioi_han,
+                                con_tro=None, loai_id=None, co_su_kien=None):
+    """
+    Tim cua hang trong ban kinh ngay trong PostGIS, co phan trang
+
+    GIAI THICH:
+    - Loc so bo bang khung bao (geom && khung) - di theo GiST index
+    - Khoang cach mat cau (ST_DistanceSphere) tinh trong database, chi giu
+      cac dong <= ban kinh
+    - Sap xep theo (khoang_cach, id) va phan trang kieu keyset: con tro luu
+      (khoang_cach, id) cua dong cuoi trang truoc, trang sau bat dau ngay sau
+      no => trang thu N ton chi phi nhu trang dau, khong dung OFFSET
+    - Loc tuy chon theo loai cua hang va theo viec cua hang co su kien
+    - Lay them 1 dong de biet con trang tiep theo hay khong
+
+    THAM SO:
+        vi_do, kinh_do: Toa do diem goc (do)
+        ban_kinh_km: Ban kinh tim kiem theo kilometers
+        gioi_han: So dong toi da moi trang
+        con_tro: Con tro tu trang truoc (chuoi tu ma_hoa_con_tro) hoac None
+        loai_id: Chi lay cua hang thuoc loai nay (tuy chon)
+        co_su_kien: True/False de loc cua hang co/khong co su kien (tuy chon)
+
+    TRA VE:
+        Tuple (danh_sach, con_tro_tiep_theo); danh_sach gom cac dict
+        {'id', 'ten_cua_hang', 'loai_id', 'vi_do', 'kinh_do', 'khoang_cach'},
+        con_tro_tiep_theo la None neu da het ket qua
+
+    VI DU:
+        >>> trang_1, con_tro = tim_cua_hang_trong_ban_kinh(16.05, 108.20, 5, 50)
+        >>> trang_2, con_tro = tim_cua_hang_trong_ban_kinh(16.05, 108.20, 5, 50, con_tro)
+    """
+    diem = Point(kinh_do, vi_do, srid=4326)
+    truy_van = (
+        CuaHang.objects
+        .filter(geom__isnull=False, geom__bboverlaps=tao_khung_loc(vi_do, kinh_do, ban_kinh_km))
+        .annotate(khoang_cach=Distance('geom', diem, spheroid=False))
+        .filter(khoang_cach__lte=D(km=ban_kinh_km))
+    )
+
+    if loai_id is not None:
+        truy_van = truy_van.filter(loai_id=loai_id)
+
+    if co_su_kien is not None:
+        co_lien_ket = Exists(CuaHangSuKien.objects.filter(cua_hang=OuterRef('pk')))
+        truy_van = truy_van.filter(co_lien_ket if co_su_kien else ~co_lien_ket)
+
+    if con_tro:
+        khoang_cach_m, id_cuoi = giai_ma_con_tro(con_tro)
+        truy_van = truy_van.filter(
+            Q(khoang_cach__gt=D(m=khoang_cach_m)) |
+            Q(khoang_cach=D(m=khoang_cach_m), id__gt=id_cuoi)
+        )
+
+    danh_sach = list(
+        truy_van.order_by('khoang_cach', 'id')
+        .values('id', 'ten_cua_hang', 'loai_id', 'khoang_cach', **COT_TOA_DO)[:gioi_han + 1]
+    )
+
+    con_tro_tiep_theo = None
+    if len(danh_sach) > gioi_han:
+        danh_sach = danh_sach[:gioi_han]
+        cuoi = danh_sach[-1]
+        con_tro_tiep_theo = ma_hoa_con_tro(cuoi['khoang_cach'].m, cuoi['id'])
+
+    return danh_sach, con_tro_tiep_theo
+
+
+def tao_da_giac(toa_do_da_giac):
+    """
+    Tao Polygon GEOS (SRID 4326) tu danh sach dinh (vi_do, kinh_do)
+
+    GIAI THICH:
+    - Tu dong dong vong neu dinh cuoi khac dinh dau
+    - Nem ValueError neu dinh khong phai cap so [vi_do, kinh_do], it hon
+      3 dinh hoac da giac tu cat (khong hop le)
+
+    THAM SO:
+        toa_do_da_giac: Danh sach [vi_do, kinh_do] tao thanh da giac
+
+    TRA VE:
+        Polygon SRID 4326
+    """
+    try:
+        vong = [(float(kinh_do), float(vi_do)) for vi_do, kinh_do in toa_do_da_giac]
+    except (TypeError, ValueError):
+        raise ValueError('Đa giác phải là danh sách các cặp số [lat, lon]')
+    if not all(map(math.isfinite, chain.from_iterable(vong))):
+        raise ValueError('Tọa độ đa giác phải là số hữu hạn')
+    if vong and vong[0] != vong[-1]:
+        vong.append(vong[0])
+    if len(vong) < 4:
+        raise ValueError('Đa giác cần ít nhất 3 đỉnh')
+
+    da_giac = Polygon(vong, srid=4326)
+    if not da_giac.valid:
+        raise ValueError(f'Đa giác không hợp lệ: {da_giac.valid_reason}')
+    return da_giac
+
+
+def tim_cua_hang_trong_da_giac(da_giac, gioi_han):
+    """
+    Tim cua hang nam trong da giac ngay trong PostGIS
+
+    GIAI THICH:
+    - geom && khung bao cua da giac: loc so bo theo GiST index
+    - ST_Within(geom, da_giac): kiem tra chinh xac trong database, chi
+      cho cac dong qua buoc loc
+    - Sap xep theo id, lay them 1 dong de biet ket qua co bi cat hay khong
+
+    THAM SO:
+        da_giac: Polygon SRID 4326 (xem tao_da_giac)
+        gioi_han: So cua hang toi da tra ve
+
+    TRA VE:
+        Tuple (danh_sach, bi_cat); danh_sach gom cac dict {'id', 'ten_cua_hang'},
+        bi_cat la True neu con cua hang nam ngoai gioi han
+
+    VI DU:
+        >>> vung = tao_da_giac([(16.00, 108.15), (16.00, 108.30), (16.10, 108.30)])
+        >>> ket_qua, bi_cat = tim_cua_hang_trong_da_giac(vung, 500)
+    """
+    danh_sach = list(
+        CuaHang.objects
+        .filter(geom__bboverlaps=da_giac, geom__within=da_giac)
+        .order_by('id')
+        .values('id', 'ten_cua_hang')[:gioi_han + 1]
+    )
+    return danh_sach[:gioi_han], len(danh_sach) > gioi_han
+
+
+def tao_khung_nhin(bbox):
+    """
+    Tao Polygon (SRID 4326) tu chuoi bbox "kinh_do_min,vi_do_min,kinh_do_max,vi_do_max"
+
+    GIAI THICH:
+    - Cung thu tu voi L.LatLngBounds.toBBoxString() cua Leaflet
+    - Nem ValueError neu thieu so, khung nguoc hoac ngoai pham vi toa do
+    """
+    try:
+        kinh_do_min, vi_do_min, kinh_do_max, vi_do_max = (float(x) for x in bbox.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError('bbox phải có dạng "lon_min,lat_min,lon_max,lat_max"')
+    if not (-180 <= kinh_do_min < kinh_do_max <= 180 and -90 <= vi_do_min < vi_do_max <= 90):
+        raise ValueError('bbox không hợp lệ')
+
+    khung = Polygon.from_bbox((kinh_do_min, vi_do_min, kinh_do_max, vi_do_max))
+    khung.srid = 4326
+    return khung
+
+
+def tim_cua_hang_trong_khung_nhin(khung, gioi_han, loai_id=None):
+    """
+    Lay cac cua hang trong khung nhin ban do, chi cac cot ban do can
+
+    GIAI THICH:
+    - Doc bang doc BanDoCuaHang (store_read_model.py): toa do, ten loai va
+      ten su kien da nam san tren moi dong nen chi mot truy van, khong join
+      loai_cua_hang hay cua_hang_su_kien
+    - geom && khung: di theo GiST index cua BanDoCuaHang.geom
+    - Sap xep theo id, lay them 1 dong de biet ket qua co bi cat hay khong
+
+    THAM SO:
+        khung: Polygon SRID 4326 (xem tao_khung_nhin)
+        gioi_han: So cua hang toi da tra ve
+        loai_id: Chi lay cua hang thuoc loai nay (tuy chon)
+
+    TRA VE:
+        Tuple (danh_sach, bi_cat); danh_sach gom cac dict {'id', 'ten_cua_hang',
+        'dia_chi', 'loai_id', 'ten_loai', 'vi_do', 'kinh_do', 'su_kien'}
+
+    VI DU:
+        >>> khung = tao_khung_nhin('108.15,16.00,108.30,16.10')
+        >>> ket_qua, bi_cat = tim_cua_hang_trong_khung_nhin(khung, 2000)
+    """
+    truy_van = BanDoCuaHang.objects.filter(geom__bboverlaps=khung)
+    if loai_id is not None:
+        truy_van = truy_van.filter(loai_id=loai_id)
+
+    danh_sach = list(
+        truy_van
+        .order_by('cua_hang_id')
+        .values('ten_cua_hang', 'dia_chi', 'loai_id', 'ten_loai', 'vi_do', 'kinh_do', 'su_kien',
+                id=F('cua_hang_id'))[:gioi_han + 1]
+    )
+    return danh_sach[:gioi_han], len(danh_sach) > gioi_han
@@ -15,7 +15,16 @@
 // ============================================================================
 
 var ban_do = null;                      // Leaflet map object
-var du_lieu_cua_hang = [];              // Danh sach tat ca cua hang
+var du_lieu_cua_hang = [];              // Danh sach cua hang trong khung nhin hien tai
+var url_api_cua_hang = '/api/cua-hang/'; // API GeoJSON cua hang theo khung nhin
+var url_api_cum_cua_hang = '/api/cua-hang/cum/'; // API GeoJSON cum cua hang (zoom nho)
+var yeu_cau_cua_hang = null;            // AbortController cua lan tai dang chay
+var lop_cum = null;                     // L.layerGroup chua cac marker cum
+var url_api_mat_do = '/api/mat-do/';    // API luoi mat do cua hang theo tile
+var url_api_cong_cu_gis = '/api/gis-tools/'; // API cong cu GIS (nearest/within_radius mode=db)
+var cua_hang_gan_nhat = null;           // Cua hang gan nguoi dung lay tu server (null: chua tai)
+var yeu_cau_gan_nhat = null;            // AbortController cua lan tai cua hang gan nhat
+var SO_CUA_HANG_GAN_NHAT = 20;          // So cua hang gan nhat hien trong sidebar
 var vi_tri_nguoi_dung = null;           // Vi tri hien tai cua nguoi dung
 var dau_hieu_nguoi_dung = null;         // Marker vi tri nguoi dung
 
@@ -81,7 +90,7 @@ function tinh_khoang_cach(vi_do_1, kinh_do_1, vi_do_2, kinh_do_2) {
  * - Yeu cau quyen truy cap vi tri tu nguoi dung
  * - Hien thi marker tren ban do khi tim thay vi tri
  * - Tu dong set lam diem xuat phat cho tim duong
- * - Tinh khoang cach den tat ca cac cua hang
+ * - Tai danh sach cua hang gan nhat tu server (KNN)
  * 
  * THAM SO:
  *   Khong co (su dung navigator.geolocation)
@@ -138,9 +147,9 @@ function tim_vi_tri_nguoi_dung() {
             // AUTO-SET STARTING POINT cho routing
             dat_diem_bat_dau(vi_tri_nguoi_dung.vi_do, vi_tri_nguoi_dung.kinh_do);
 
-            // Tinh khoang cach va hien thi danh sach
+            // Tinh khoang cach trong khung nhin va tai danh sach gan nhat
             tinh_khoang_cach_cac_cua_hang();
-            hien_thi_danh_sach_cua_hang('type-filter', 'store-list');
+            tai_cua_hang_gan_nguoi_dung();
         },
         function (loi) {
             console.error('Loi geolocation:', loi);
@@ -201,13 +210,15 @@ function khoi_tao_ban_do(id_container, vi_do, kinh_do, muc_zoom) {
 
 
 /**
- * Tinh khoang cach cho tat ca cac cua hang
+ * Tinh khoang cach cho cac cua hang trong khung nhin
  * 
  * GIAI THICH:
- * - Duyet qua tung cua hang trong danh sach
+ * - Duyet qua tung cua hang trong du_lieu_cua_hang (chi khung nhin hien
+ *   tai, rong khi zoom nho)
  * - Tinh khoang cach tu vi tri nguoi dung den cua hang
  * - Sap xep danh sach theo khoang cach (gan nhat truoc)
  * - Cap nhat thuoc tinh khoang_cach cho moi cua hang
+ * - Khong dung de tim "cua hang gan nhat": xem tai_cua_hang_gan_nguoi_dung
  * 
  * THAM SO:
  *   Khong co (su dung bien toan cuc vi_tri_nguoi_dung va du_lieu_cua_hang)
@@ -240,11 +251,307 @@ function tinh_khoang_cach_cac_cua_hang() {
 }
 
 
+/**
+ * Tai cac cua hang gan vi tri nguoi dung tu server
+ * 
+ * GIAI THICH:
+ * - Khong ban kinh: goi tool=nearest&mode=db (KNN trong PostGIS) lay
+ *   SO_CUA_HANG_GAN_NHAT cua hang gan nhat
+ * - Co ban kinh: goi tool=within_radius&mode=db voi ban kinh da chon
+ * - Loc loai (neu co) gui len server qua tham so loai
+ * - Ket qua khong phu thuoc khung nhin hay muc zoom cua ban do
+ * - Huy lan tai truoc neu chua xong (AbortController)
+ * 
+ * THAM SO:
+ *   Khong co (su dung bien toan cuc vi_tri_nguoi_dung, url_api_cong_cu_gis)
+ * 
+ * TRA VE:
+ *   void - Cap nhat cua_hang_gan_nhat va danh sach sidebar
+ * 
+ * VI DU:
+ *   >>> tai_cua_hang_gan_nguoi_dung();
+ */
+function tai_cua_hang_gan_nguoi_dung() {
+    if (!vi_tri_nguoi_dung) return;
+
+    var bo_loc_loai = document.getElementById('type-filter').value;
+    var bo_loc_ban_kinh = document.getElementById('radius-filter') ? document.getElementById('radius-filter').value : '';
+    var tham_so = new URLSearchParams({
+        mode: 'db',
+        lat: vi_tri_nguoi_dung.vi_do,
+        lon: vi_tri_nguoi_dung.kinh_do
+    });
+    if (bo_loc_ban_kinh) {
+        tham_so.set('tool', 'within_radius');
+        tham_so.set('radius', bo_loc_ban_kinh);
+    } else {
+        tham_so.set('tool', 'nearest');
+        tham_so.set('k', SO_CUA_HANG_GAN_NHAT);
+    }
+    if (bo_loc_loai) tham_so.set('loai', bo_loc_loai);
+
+    if (yeu_cau_gan_nhat) yeu_cau_gan_nhat.abort();
+    yeu_cau_gan_nhat = new AbortController();
+
+    document.getElementById('store-list').innerHTML = '<div class="loading">Đang tìm cửa hàng gần bạn...</div>';
+
+    fetch(url_api_cong_cu_gis + '?' + tham_so.toString(), { signal: yeu_cau_gan_nhat.signal })
+        .then(doc_json_phan_hoi)
+        .then(du_lieu => {
+            // nearest khong tim thay cua hang nao tra success=false
+            var danh_sach = du_lieu.success ? du_lieu.result.stores : [];
+            var bo_chon_loai = document.getElementById('type-filter');
+
+            cua_hang_gan_nhat = danh_sach.map(function (r) {
+                var lua_chon = bo_chon_loai.querySelector('option[value="' + r.loai_id + '"]');
+                return {
+                    id: r.store_id,
+                    ten: r.store_name,
+                    loai: lua_chon ? lua_chon.textContent : '',
+                    loai_id: r.loai_id,
+                    vi_do: r.lat,
+                    kinh_do: r.lon,
+                    khoang_cach: r.distance_km
+                };
+            });
+            hien_thi_danh_sach_cua_hang('type-filter', 'store-list');
+        })
+        .catch(loi => {
+            if (loi.name !== 'AbortError') console.error('Loi tai cua hang gan nhat:', loi);
+        });
+}
+
+
+/**
+ * Doc JSON cua phan hoi API, bao loi neu HTTP khong thanh cong
+ * 
+ * GIAI THICH:
+ * - Phan hoi loi (400, 500, ...) van co body JSON nhung khong co du lieu
+ *   mong doi: nem Error de nhanh .catch xu ly thay vi doc truong thieu
+ * 
+ * THAM SO:
+ *   @param {Response} response - Phan hoi cua fetch
+ * 
+ * TRA VE:
+ *   @returns {Promise<Object>} Du lieu JSON
+ * 
+ * VI DU:
+ *   >>> fetch(url).then(doc_json_phan_hoi).then(du_lieu => ...);
+ */
+function doc_json_phan_hoi(response) {
+    if (!response.ok) {
+        throw new Error('HTTP ' + response.status + ' ' + response.url);
+    }
+    return response.json();
+}
+
+
+/**
+ * Tai cac cua hang trong khung nhin hien tai cua ban do
+ * 
+ * GIAI THICH:
+ * - Goi API GeoJSON /api/cua-hang/ voi bbox va zoom hien tai (gan vao
+ *   su kien moveend cua ban do)
+ * - bbox duoc lam tron ra ngoai theo luoi o cua muc zoom: di chuyen nho
+ *   van cho cung URL, trinh duyet gui If-None-Match va nhan 304
+ * - Khung nhin duoc dua ve ban sao chinh cua the gioi (wrapLatLngBounds)
+ *   roi kep ca hai dau vao [-180, 180] x [-90, 90]: keo ban do sang ban
+ *   sao ben canh van gui bbox hop le
+ * - Huy lan tai truoc neu chua xong (AbortController)
+ * - Giu lai marker cua cua hang van con trong khung nhin, chi xoa/them
+ *   phan thay doi; tinh lai khoang cach va danh sach sidebar
+ * 
+ * THAM SO:
+ *   Khong co (su dung bien toan cuc ban_do, url_api_cua_hang)
+ * 
+ * TRA VE:
+ *   void - Cap nhat du_lieu_cua_hang va markers
+ * 
+ * VI DU:
+ *   >>> ban_do.on('moveend', tai_cua_hang_trong_khung_nhin);
+ */
+function tai_cua_hang_trong_khung_nhin() {
+    var muc_zoom = ban_do.getZoom();
+    var khung = ban_do.wrapLatLngBounds(ban_do.getBounds());
+    var o_luoi = 360 / Math.pow(2, muc_zoom);   // kich thuoc o luoi (do) o muc zoom nay
+    var kep = function (x, thap, cao) { return Math.min(cao, Math.max(thap, x)); };
+    var bbox = [
+        kep(Math.floor(khung.getWest() / o_luoi) * o_luoi, -180, 180),
+        kep(Math.floor(khung.getSouth() / o_luoi) * o_luoi, -90, 90),
+        kep(Math.ceil(khung.getEast() / o_luoi) * o_luoi, -180, 180),
+        kep(Math.ceil(khung.getNorth() / o_luoi) * o_luoi, -90, 90)
+    ].map(function (x) { return x.toFixed(6); }).join(',');
+
+    if (yeu_cau_cua_hang) yeu_cau_cua_hang.abort();
+    yeu_cau_cua_hang = new AbortController();
+
+    var tin_hieu = yeu_cau_cua_hang.signal;
+
+    fetch(url_api_cua_hang + '?bbox=' + bbox + '&zoom=' + muc_zoom, { signal: tin_hieu })
+        .then(doc_json_phan_hoi)
+        .then(du_lieu => {
+            // Marker cu theo id, dung lai cho cua hang van con trong khung nhin
+            var dau_hieu_cu = {};
+            du_lieu_cua_hang.forEach(function (cua_hang) {
+                if (cua_hang.dau_hieu) dau_hieu_cu[cua_hang.id] = cua_hang.dau_hieu;
+            });
+
+            du_lieu_cua_hang = du_lieu.features.map(function (dac_trung) {
+                var thuoc_tinh = dac_trung.properties;
+                var dau_hieu = dau_hieu_cu[dac_trung.id] || null;
+                delete dau_hieu_cu[dac_trung.id];
+                return {
+                    id: dac_trung.id,
+                    ten: thuoc_tinh.ten,
+                    dia_chi: thuoc_tinh.dia_chi,
+                    loai: thuoc_tinh.loai,
+                    loai_id: thuoc_tinh.loai_id,
+                    vi_do: dac_trung.geometry.coordinates[1],
+                    kinh_do: dac_trung.geometry.coordinates[0],
+                    co_su_kien: thuoc_tinh.su_kien.length > 0,
+                    danh_sach_su_kien: thuoc_tinh.su_kien,
+                    khoang_cach: null,
+                    dau_hieu: dau_hieu
+                };
+            });
+
+            // Xoa marker cua cua hang da ra khoi khung nhin
+            Object.keys(dau_hieu_cu).forEach(function (id) {
+                ban_do.removeLayer(dau_hieu_cu[id]);
+            });
+
+            them_dau_hieu_cua_hang();
+            tinh_khoang_cach_cac_cua_hang();
+
+            if (du_lieu.zoom_too_low) {
+                // Danh sach gan nguoi dung lay tu server, khong phu thuoc zoom
+                if (!vi_tri_nguoi_dung) {
+                    document.getElementById('store-list').innerHTML =
+                        '<div class="loading">Phóng to bản đồ để xem cửa hàng</div>';
+                }
+                return tai_cum_cua_hang(bbox, muc_zoom, tin_hieu);
+            }
+            if (lop_cum) lop_cum.clearLayers();
+            hien_thi_danh_sach_cua_hang('type-filter', 'store-list');
+        })
+        .catch(loi => {
+            if (loi.name !== 'AbortError') console.error('Loi tai cua hang:', loi);
+        });
+}
+
+
+/**
+ * Ve cac cum cua hang (zoom nho) tu API /api/cua-hang/cum/
+ * 
+ * GIAI THICH:
+ * - Goi khi zoom qua nho de hien tung cua hang: server tra ve moi o 64px
+ *   mot feature (cum hoac cua hang le) nen so marker chi vai tram
+ * - Cum: marker tron ghi so cua hang, bam vao de phong to 2 muc
+ * - Cua hang le: cham tron nho, bam vao de phong to den muc hien cua hang
+ * 
+ * THAM SO:
+ *   @param {string} bbox - Khung nhin da lam tron (giong lan goi /api/cua-hang/)
+ *   @param {number} muc_zoom - Muc zoom hien tai
+ *   @param {AbortSignal} tin_hieu - Tin hieu huy cua lan tai hien tai
+ * 
+ * TRA VE:
+ *   @returns {Promise} Hoan thanh khi da ve xong
+ * 
+ * VI DU:
+ *   >>> tai_cum_cua_hang('102,8,110,23', 6, new AbortController().signal);
+ */
+function tai_cum_cua_hang(bbox, muc_zoom, tin_hieu) {
+    return fetch(url_api_cum_cua_hang + '?bbox=' + bbox + '&zoom=' + muc_zoom, { signal: tin_hieu })
+        .then(doc_json_phan_hoi)
+        .then(du_lieu => {
+            if (!lop_cum) lop_cum = L.layerGroup().addTo(ban_do);
+            lop_cum.clearLayers();
+
+            du_lieu.features.forEach(function (dac_trung) {
+                var toa_do = [dac_trung.geometry.coordinates[1], dac_trung.geometry.coordinates[0]];
+                var thuoc_tinh = dac_trung.properties;
+                var dau_hieu;
+
+                if (thuoc_tinh.cluster) {
+                    var kich_thuoc = 24 + Math.min(24, Math.round(Math.log10(thuoc_tinh.point_count) * 8));
+                    dau_hieu = L.marker(toa_do, {
+                        icon: L.divIcon({
+                            html: '<div style="width:' + kich_thuoc + 'px;height:' + kich_thuoc + 'px;line-height:' +
+                                kich_thuoc + 'px;border-radius:50%;background:rgba(0,123,255,0.75);color:#fff;' +
+                                'text-align:center;font-weight:bold;font-size:12px;">' + thuoc_tinh.point_count + '</div>',
+                            className: '',
+                            iconSize: [kich_thuoc, kich_thuoc]
+                        })
+                    });
+                    dau_hieu.on('click', function () {
+                        ban_do.setView(toa_do, Math.min(muc_zoom + 2, 18));
+                    });
+                } else {
+                    dau_hieu = L.circleMarker(toa_do, { radius: 6, color: '#007bff', fillOpacity: 0.8 });
+                    dau_hieu.on('click', function () {
+                        ban_do.setView(toa_do, 15);
+                    });
+                }
+                lop_cum.addLayer(dau_hieu);
+            });
+        });
+}
+
+
+/**
+ * Tao lop mat do cua hang (heatmap theo o luoi) tu API /api/mat-do/
+ * 
+ * GIAI THICH:
+ * - L.GridLayer: moi tile 256px goi /api/mat-do/{z}/{x}/{y}/ va ve cac o
+ *   len canvas, khong tai tung cua hang
+ * - Do dam mau theo log so cua hang trong o; mau tu do (diem danh gia
+ *   trung binh thap) sang xanh (cao), xam neu o chua co danh gia
+ * - Trinh duyet gui If-None-Match nen tile khong doi chi nhan 304
+ * 
+ * THAM SO:
+ *   Khong co (su dung bien toan cuc url_api_mat_do)
+ * 
+ * TRA VE:
+ *   @returns {L.GridLayer} Lop mat do (chua them vao ban do)
+ * 
+ * VI DU:
+ *   >>> L.control.layers(null, { 'Mật độ cửa hàng': tao_lop_mat_do() }).addTo(ban_do);
+ */
+function tao_lop_mat_do() {
+    var lop = L.gridLayer({ maxNativeZoom: 16, opacity: 0.7 });
+
+    lop.createTile = function (toa_do_tile, xong) {
+        var tile = document.createElement('canvas');
+        var kich_thuoc = this.getTileSize();
+        tile.width = kich_thuoc.x;
+        tile.height = kich_thuoc.y;
+
+        fetch(url_api_mat_do + toa_do_tile.z + '/' + toa_do_tile.x + '/' + toa_do_tile.y + '/')
+            .then(doc_json_phan_hoi)
+            .then(du_lieu => {
+                var but = tile.getContext('2d');
+                var canh_o = kich_thuoc.x / du_lieu.size;
+                du_lieu.cells.forEach(function (o) {
+                    var do_dam = Math.min(1, 0.25 + Math.log10(o[2]) / 3);
+                    var mau = o[3] === null ? 'rgba(108,117,125,' :
+                        'hsla(' + Math.round((o[3] - 1) * 30) + ',85%,45%,';
+                    but.fillStyle = mau + do_dam.toFixed(2) + ')';
+                    but.fillRect(o[0] * canh_o, o[1] * canh_o, canh_o, canh_o);
+                });
+                xong(null, tile);
+            })
+            .catch(loi => xong(loi, tile));
+        return tile;
+    };
+    return lop;
+}
+
+
 /**
  * Them dau hieu cua hang vao ban do
  * 
  * GIAI THICH:
- * - Tao marker cho moi cua hang co toa do
+ * - Tao marker cho moi cua hang co toa do (bo qua cua hang da co marker)
  * - Marker mau cam cho cua hang co su kien
  * - Marker mau xanh cho cua hang binh thuong
  * - Them popup voi thong tin cua hang
@@ -261,7 +568,7 @@ function tinh_khoang_cach_cac_cua_hang() {
  */
 function them_dau_hieu_cua_hang() {
     du_lieu_cua_hang.forEach(function (cua_hang) {
-        if (cua_hang.vi_do && cua_hang.kinh_do) {
+        if (cua_hang.vi_do && cua_hang.kinh_do && !cua_hang.dau_hieu) {
             var mau_icon = cua_hang.co_su_kien ? 'orange' : 'blue';
             cua_hang.dau_hieu = L.marker([cua_hang.vi_do, cua_hang.kinh_do], {
                 icon: L.icon({
@@ -292,7 +599,9 @@ function them_dau_hieu_cua_hang() {
  * Hien thi danh sach cua hang trong sidebar
  * 
  * GIAI THICH:
- * - Loc cua hang theo loai va ban kinh (neu co)
+ * - Da biet vi tri nguoi dung: hien cua_hang_gan_nhat (server da loc
+ *   theo loai va ban kinh, sap xep theo khoang cach)
+ * - Chua biet vi tri: hien cua hang trong khung nhin, loc theo loai
  * - Tao HTML cho moi cua hang trong danh sach
  * - Hien thi khoang cach tu nguoi dung (neu da biet vi tri)
  * - Highlight cua hang co su kien
@@ -314,20 +623,24 @@ function hien_thi_danh_sach_cua_hang(id_bo_loc, id_danh_sach) {
     var noi_dung_danh_sach = document.getElementById(id_danh_sach);
     var html = '';
 
-    var cua_hang_da_loc = du_lieu_cua_hang.filter(function (cua_hang) {
+    var cua_hang_da_loc;
+
+    if (vi_tri_nguoi_dung && cua_hang_gan_nhat) {
+        // Su kien chi co trong du lieu khung nhin: lay theo id neu cua hang dang hien
+        var theo_id = {};
+        du_lieu_cua_hang.forEach(function (cua_hang) { theo_id[cua_hang.id] = cua_hang; });
+        cua_hang_da_loc = cua_hang_gan_nhat.map(function (cua_hang) {
+            var trong_khung = theo_id[cua_hang.id];
+            cua_hang.co_su_kien = trong_khung ? trong_khung.co_su_kien : false;
+            cua_hang.danh_sach_su_kien = trong_khung ? trong_khung.danh_sach_su_kien : [];
+            return cua_hang;
+        });
+    } else {
         // Loc theo loai
-        if (bo_loc_loai && cua_hang.loai_id != bo_loc_loai) return false;
-
-        // Loc theo ban kinh (neu co chon)
-        if (bo_loc_ban_kinh && vi_tri_nguoi_dung) {
-            var ban_kinh = parseFloat(bo_loc_ban_kinh);
-            if (cua_hang.khoang_cach === null || cua_hang.khoang_cach > ban_kinh) {
-                return false;
-            }
-        }
-
-        return true;
-    });
+        cua_hang_da_loc = du_lieu_cua_hang.filter(function (cua_hang) {
+            return !bo_loc_loai || cua_hang.loai_id == bo_loc_loai;
+        });
+    }
 
     // Cap nhat so luong cua hang tim thay
     if (vi_tri_nguoi_dung && bo_loc_ban_kinh) {
@@ -335,7 +648,7 @@ function hien_thi_danh_sach_cua_hang(id_bo_loc, id_danh_sach) {
             'Tìm thấy ' + cua_hang_da_loc.length + ' cửa hàng trong bán kính ' + bo_loc_ban_kinh + ' km';
     } else if (vi_tri_nguoi_dung) {
         document.getElementById('found-stores-count').textContent =
-            'Hiển thị tất cả ' + cua_hang_da_loc.length + ' cửa hàng';
+            'Hiển thị ' + cua_hang_da_loc.length + ' cửa hàng gần bạn nhất';
     }
 
     if (cua_hang_da_loc.length === 0) {
@@ -374,9 +687,10 @@ function hien_thi_danh_sach_cua_hang(id_bo_loc, id_danh_sach) {
  * Chon cua hang tu danh sach hoac ban do
  * 
  * GIAI THICH:
- * - Tim cua hang theo ID
+ * - Tim cua hang theo ID (trong khung nhin, hoac trong danh sach gan
+ *   nhat tu server neu cua hang chua nam trong khung nhin)
  * - Zoom ban do den vi tri cua hang
- * - Mo popup cua cua hang
+ * - Mo popup cua cua hang (neu da co marker)
  * - Tu dong set lam diem den cho tim duong
  * - Neu da co vi tri nguoi dung, tu dong tinh duong
  * 
@@ -391,10 +705,12 @@ function hien_thi_danh_sach_cua_hang(id_bo_loc, id_danh_sach) {
  *   // Zoom den cua hang ID=5 va tim duong tu vi tri hien tai
  */
 function chon_cua_hang(id_cua_hang) {
-    var cua_hang = du_lieu_cua_hang.find(function (ch) { return ch.id === id_cua_hang; });
-    if (cua_hang && cua_hang.dau_hieu) {
+    var tim_theo_id = function (ch) { return ch.id === id_cua_hang; };
+    var cua_hang = du_lieu_cua_hang.find(tim_theo_id) ||
+        (cua_hang_gan_nhat && cua_hang_gan_nhat.find(tim_theo_id));
+    if (cua_hang) {
         ban_do.setView([cua_hang.vi_do, cua_hang.kinh_do], 16);
-        cua_hang.dau_hieu.openPopup();
+        if (cua_hang.dau_hieu) cua_hang.dau_hieu.openPopup();
 
         // Dat lam diem den cho tim duong
         dat_diem_ket_thuc(cua_hang.vi_do, cua_hang.kinh_do);
@@ -646,7 +962,8 @@ function clearRoute() {
  * 
  * GIAI THICH:
  * - Wrapper function de goi tu onchange cua select filter
- * - Goi lai ham hien_thi_danh_sach_cua_hang
+ * - Da biet vi tri nguoi dung: tai lai danh sach gan nhat tu server
+ * - Chua biet vi tri: goi lai ham hien_thi_danh_sach_cua_hang
  * - Cap nhat danh sach theo bo loc moi
  * 
  * THAM SO:
@@ -659,5 +976,9 @@ function clearRoute() {
  *   <select onchange="filterStores()">...</select>
  */
 function filterStores() {
-    hien_thi_danh_sach_cua_hang('type-filter', 'store-list');
+    if (vi_tri_nguoi_dung) {
+        tai_cua_hang_gan_nguoi_dung();
+    } else {
+        hien_thi_danh_sach_cua_hang('type-filter', 'store-list');
+    }
 }
@@ -0,0 +1,141 @@
+"""
+Xu Ly Sau Khi Du Lieu Cua Hang Thay Doi
+Hooks run after stores are created, moved or deleted
+"""
+
+from django.db import transaction
+
+from .result_cache import tang_phien_ban_du_lieu
+from .store_density import cap_nhat_mat_do, cap_nhat_mat_do_danh_gia, tinh_lai_mat_do
+from .store_read_model import dong_bo_ban_do_cua_hang
+from .store_snapshot import tao_lai_ban_chup_sau_ghi
+from .store_stats import cap_nhat_thong_ke, tinh_lai_tat_ca_thong_ke
+from .store_tiles import xoa_tat_ca_tile, xoa_tile_quanh
+
+
+def trang_thai_cua_hang(cua_hang):
+    """
+    Trang thai cua cua hang dung cho thong ke dan xuat
+
+    TRA VE:
+        Tuple (loai_id, vi_do, kinh_do), hoac None neu cua hang khong co toa do
+    """
+    if cua_hang is None or cua_hang.geom is None:
+        return None
+    return cua_hang.loai_id, cua_hang.geom.y, cua_hang.geom.x
+
+
+def trang_thai_danh_gia(danh_gia):
+    """
+    Trang thai cua danh gia dung cho luoi mat do
+
+    TRA VE:
+        Tuple (vi_do, kinh_do, diem) theo vi tri cua hang, hoac None neu
+        cua hang khong co toa do
+    """
+    if danh_gia is None or danh_gia.cua_hang.geom is None:
+        return None
+    return danh_gia.cua_hang.geom.y, danh_gia.cua_hang.geom.x, danh_gia.diem
+
+
+def cua_hang_da_thay_doi(truoc=None, sau=None, danh_gia=(0, 0), cua_hang_id=None):
+    """
+    Cap nhat cac du lieu dan xuat sau khi cua hang duoc them, sua hoac xoa
+
+    GIAI THICH:
+    - Goi tu cac view quan tri ghi vao CuaHang (va khi xoa LoaiCuaHang,
+      vi cascade se xoa ca cua hang thuoc loai do), trong cung transaction
+      voi thao tac ghi
+    - Bang thong ke (store_stats.py) va luoi mat do (store_density.py)
+      cap nhat tang dan tu trang thai truoc/sau ngay trong transaction;
+      khong biet truoc/sau (ca hai la None) thi tinh lai toan bo
+    - Dong bang doc BanDoCuaHang (store_read_model.py) cua cua_hang_id duoc
+      dung lai trong transaction; cua hang bi xoa thi dong tu mat (cascade)
+    - Sau khi commit: tang phien ban du lieu cua hang de bo nho dem ket
+      qua GIS (result_cache.py) cua moi worker bo ket qua cu
+    - Roi xoa cac vector tile (store_tiles.py) chua vi tri cu va moi cua
+      cua hang (ke ca khi chi doi ten); khong biet truoc/sau thi xoa het.
+      Thu tu doi phien ban roi moi xoa tile la bat buoc (xem lay_tile)
+    - Cuoi cung ghi lai file ban chup toa do (store_snapshot.py), sau commit
+      de cac worker khac khong doc duoc du lieu chua commit; cac lan ghi
+      dong thoi gop chung mot lan tao, loi tao chi duoc ghi log (robust)
+      nen khong chan hai buoc tren; cac worker tu doi sang file moi o
+      request ke tiep
+
+    THAM SO:
+        truoc: trang_thai_cua_hang(...) truoc khi thay doi (None neu moi tao)
+        sau: trang_thai_cua_hang(...) sau khi thay doi (None neu da xoa)
+        danh_gia: tong_danh_gia_cua_hang(...) - danh gia di theo cua hang
+            trong luoi mat do (lay truoc khi xoa cua hang)
+        cua_hang_id: Id cua hang vua them/sua (dong bo bang doc)
+
+    VI DU:
+        >>> with transaction.atomic():
+        ...     truoc = trang_thai_cua_hang(cua_hang)
+        ...     cua_hang.geom = Point(108.21, 16.06, srid=4326)
+        ...     cua_hang.save()
+        ...     cua_hang_da_thay_doi(truoc, trang_thai_cua_hang(cua_hang),
+        ...                          tong_danh_gia_cua_hang(cua_hang.id), cua_hang.id)
+    """
+    if truoc is None and sau is None:
+        tinh_lai_tat_ca_thong_ke()
+        tinh_lai_mat_do()
+    else:
+        cap_nhat_thong_ke(truoc, sau)
+        cap_nhat_mat_do(truoc, sau, danh_gia)
+    if cua_hang_id is not None:
+        dong_bo_ban_do_cua_hang([cua_hang_id])
+    transaction.on_commit(tang_phien_ban_du_lieu)
+    if truoc is None and sau is None:
+        transaction.on_commit(xoa_tat_ca_tile)
+    else:
+        cac_vi_tri = [trang_thai[1:] for trang_thai in (truoc, sau) if trang_thai is not None]
+        transaction.on_commit(lambda: xoa_tile_quanh(cac_vi_tri))
+    # Dat sau cung va robust: loi tao ban chup (dia day, khoa, database) chi
+    # duoc ghi log, khong chan doi phien ban / xoa tile va khong thanh loi 500
+    transaction.on_commit(tao_lai_ban_chup_sau_ghi, robust=True)
+
+
+def thong_tin_cua_hang_da_thay_doi(cac_vi_tri=(), cac_cua_hang=None):
+    """
+    Danh dau du lieu hien thi cua cua hang da thay doi (khong doi toa do)
+
+    GIAI THICH:
+    - Goi khi doi ten loai, sua/xoa su kien hoac them/xoa lien ket cua
+      hang - su kien: thong ke va ban chup toa do khong doi, chi can doi
+      phien ban du lieu (sau khi commit) de ETag cua /api/cua-hang/ va
+      cac ket qua da dem khong con hop le
+    - Ten loai va ten su kien nam trong bang doc BanDoCuaHang: dong cua
+      cac_cua_hang duoc dung lai ngay trong transaction
+    - Co su kien hay khong nam trong vector tile: cac tile quanh cac_vi_tri
+      (vi tri cua hang doi co_su_kien) bi xoa sau khi doi phien ban
+
+    THAM SO:
+        cac_vi_tri: Cac (vi_do, kinh_do) cua cua hang co tile can xoa
+        cac_cua_hang: Id (danh sach hoac QuerySet mot cot id) cua cac cua
+            hang can dong bo bang doc; QuerySet phai con dung sau thao tac
+            ghi, xoa thi truyen danh sach lay truoc khi xoa
+    """
+    if cac_cua_hang is not None:
+        dong_bo_ban_do_cua_hang(cac_cua_hang)
+    transaction.on_commit(tang_phien_ban_du_lieu)
+    cac_vi_tri = list(cac_vi_tri)
+    if cac_vi_tri:
+        transaction.on_commit(lambda: xoa_tile_quanh(cac_vi_tri))
+
+
+def danh_gia_da_thay_doi(truoc=None, sau=None):
+    """
+    Cap nhat luoi mat do sau khi danh gia duoc them, sua hoac xoa
+
+    GIAI THICH:
+    - Goi trong cung transaction voi thao tac ghi DanhGia; chi so danh gia
+      va tong diem cua o luoi chua cua hang thay doi
+    - Diem danh gia khong nam trong ban chup, tile hay cac ket qua da dem
+      nen khong can doi phien ban du lieu
+
+    THAM SO:
+        truoc: trang_thai_danh_gia(...) truoc khi thay doi (None neu moi tao)
+        sau: trang_thai_danh_gia(...) sau khi thay doi (None neu da xoa)
+    """
+    cap_nhat_mat_do_danh_gia(truoc, sau)
@@ -0,0 +1,46 @@
+"""
+Chi Muc Gom Cum Cua Hang Trong Bo Nho Cua Worker
+In-memory store clustering index kept in sync with the shared snapshot
+"""
+
+import threading
+
+from .store_snapshot import lay_ban_chup
+from .utils.gis_tools import ChiMucCum
+
+
+_chi_muc_cum = None
+_phien_ban_cum = None
+_khoa_cum = threading.Lock()
+
+
+def lay_chi_muc_cum():
+    """
+    Chi muc gom cum (ChiMucCum) cua worker nay, dung voi ban chup hien tai
+
+    GIAI THICH:
+    - Xay dung lan dau tu ban chup toa do (store_snapshot.py)
+    - Khi ban chup doi phien ban (cua hang duoc them/sua/xoa), chi muc
+      duoc cap nhat tang dan theo phan thay doi thay vi xay lai
+    - Cac request dang doc van thay du lieu cu nhat quan trong luc cap nhat
+      (ChiMucCum thay du lieu bang mot lan gan)
+
+    TRA VE:
+        ChiMucCum
+
+    VI DU:
+        >>> cac_cum = lay_chi_muc_cum().tim_cum(15.9, 108.0, 16.2, 108.4, zoom=11)
+    """
+    global _chi_muc_cum, _phien_ban_cum
+
+    ban_chup = lay_ban_chup()
+    if _chi_muc_cum is not None and _phien_ban_cum == ban_chup.phien_ban:
+        return _chi_muc_cum
+
+    with _khoa_cum:
+        if _chi_muc_cum is None:
+            _chi_muc_cum = ChiMucCum(ban_chup.tap)
+        elif _phien_ban_cum != ban_chup.phien_ban:
+            _chi_muc_cum.cap_nhat(ban_chup.tap)
+        _phien_ban_cum = ban_chup.phien_ban
+        return _chi_muc_cum
@@ -0,0 +1,216 @@
+"""
+Luoi Mat Do Cua Hang Va Diem Danh Gia Tinh San
+Precomputed per-cell store counts and rating sums at several grid resolutions
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, F, FloatField, Func, Q, Sum
+
+from .models import CuaHang, DanhGia, OMatDo
+from .store_tiles import so_tile
+
+
+# Cac muc luoi duoc tinh san: o luoi muc m la tile Web Mercator zoom m
+CAC_MUC = (4, 6, 8, 10, 12, 14, 16)
+MUC_TOI_DA = CAC_MUC[-1]
+
+# Moi tile ban do zoom z duoc chia toi da 2^4 x 2^4 = 16 x 16 o
+BAC_O_MOI_TILE = 4
+
+
+def cac_o_cua_diem(vi_do, kinh_do):
+    """
+    Cac o (muc, o_x, o_y) chua mot diem, moi muc luoi mot o
+
+    GIAI THICH:
+    - Chi tinh toa do tile mot lan o muc lon nhat; o cua muc nho hon la
+      dich bit (floor(floor(a) / 2^k) = floor(a / 2^k)) nen cac muc luon
+      long nhau dung, khong lech do sai so lam tron
+    """
+    n = 2 ** MUC_TOI_DA
+    x, y = so_tile(vi_do, kinh_do, MUC_TOI_DA)
+    o_x, o_y = min(int(x), n - 1), min(int(y), n - 1)
+    return [(muc, o_x >> (MUC_TOI_DA - muc), o_y >> (MUC_TOI_DA - muc)) for muc in CAC_MUC]
+
+
+def cong_vao_o(vi_do, kinh_do, so_cua_hang=0, so_danh_gia=0, tong_diem=0):
+    """
+    Cong (hoac tru, gia tri am) vao cac o luoi chua diem (vi_do, kinh_do)
+
+    GIAI THICH:
+    - Mot cau UPDATE ... SET so_cua_hang = so_cua_hang + n cho tat ca cac
+      muc (bieu thuc F, nhu store_stats.them_diem) nen cac request dong
+      thoi khong ghi de nhau
+    - O chua co hang thi tao roi cong; o het cua hang va danh gia thi xoa
+      de bang chi giu o co du lieu
+    """
+    cac_o = cac_o_cua_diem(vi_do, kinh_do)
+    cac_truong = dict(
+        so_cua_hang=F('so_cua_hang') + so_cua_hang,
+        so_danh_gia=F('so_danh_gia') + so_danh_gia,
+        tong_diem=F('tong_diem') + tong_diem,
+    )
+    dieu_kien = reduce(or_, (Q(muc=muc, o_x=o_x, o_y=o_y) for muc, o_x, o_y in cac_o))
+
+    if OMatDo.objects.filter(dieu_kien).update(**cac_truong) < len(cac_o):
+        da_co = set(OMatDo.objects.filter(dieu_kien).values_list('muc', 'o_x', 'o_y'))
+        cac_o_moi = [o for o in cac_o if o not in da_co]
+        for muc, o_x, o_y in cac_o_moi:
+            OMatDo.objects.get_or_create(muc=muc, o_x=o_x, o_y=o_y)
+        OMatDo.objects.filter(
+            reduce(or_, (Q(muc=muc, o_x=o_x, o_y=o_y) for muc, o_x, o_y in cac_o_moi))
+        ).update(**cac_truong)
+
+    if so_cua_hang < 0 or so_danh_gia < 0:
+        OMatDo.objects.filter(dieu_kien, so_cua_hang__lte=0, so_danh_gia__lte=0).delete()
+
+
+def tong_danh_gia_cua_hang(cua_hang_id):
+    """
+    So danh gia va tong diem cua mot cua hang
+
+    GIAI THICH:
+    - Danh gia di theo cua hang: khi cua hang doi vi tri hoac bi xoa, phan
+      danh gia cua no cung phai chuyen/tru khoi cac o luoi. Khi xoa phai
+      goi truoc khi xoa vi cascade xoa luon danh gia
+
+    TRA VE:
+        Tuple (so_danh_gia, tong_diem)
+    """
+    gia_tri = DanhGia.objects.filter(cua_hang_id=cua_hang_id).aggregate(so=Count('id'), tong=Sum('diem'))
+    return gia_tri['so'], gia_tri['tong'] or 0
+
+
+def cap_nhat_mat_do(truoc, sau, danh_gia=(0, 0)):
+    """
+    Cap nhat luoi mat do khi mot cua hang thay doi
+
+    THAM SO:
+        truoc: (loai_id, vi_do, kinh_do) truoc khi thay doi, None neu moi tao
+        sau: (loai_id, vi_do, kinh_do) sau khi thay doi, None neu da xoa
+        danh_gia: (so_danh_gia, tong_diem) cua cua hang (tong_danh_gia_cua_hang)
+    """
+    truoc = truoc[1:] if truoc is not None else None
+    sau = sau[1:] if sau is not None else None
+    if truoc == sau:
+        return
+    so_danh_gia, tong_diem = danh_gia
+    if truoc is not None:
+        cong_vao_o(*truoc, so_cua_hang=-1, so_danh_gia=-so_danh_gia, tong_diem=-tong_diem)
+    if sau is not None:
+        cong_vao_o(*sau, so_cua_hang=1, so_danh_gia=so_danh_gia, tong_diem=tong_diem)
+
+
+def cap_nhat_mat_do_danh_gia(truoc, sau):
+    """
+    Cap nhat tong diem danh gia cua cac o luoi khi mot danh gia thay doi
+
+    THAM SO:
+        truoc: (vi_do, kinh_do, diem) truoc khi thay doi, None neu moi tao
+        sau: (vi_do, kinh_do, diem) sau khi thay doi, None neu da xoa
+    """
+    if truoc == sau:
+        return
+    if truoc is not None:
+        cong_vao_o(truoc[0], truoc[1], so_danh_gia=-1, tong_diem=-truoc[2])
+    if sau is not None:
+        cong_vao_o(sau[0], sau[1], so_danh_gia=1, tong_diem=sau[2])
+
+
+def tinh_lai_mat_do():
+    """
+    Tinh lai toan bo luoi mat do tu bang cua_hang va danh_gia
+
+    GIAI THICH:
+    - Dung khi thay doi khong the cap nhat tang dan (xoa loai cua hang
+      cascade xoa nhieu cua hang) hoac de xoa sai so tich luy
+    - Mot truy van: toa do (ST_Y/ST_X) va so/tong diem danh gia moi cua
+      hang; cong don vao cac o trong Python roi ghi lai bang bulk_create
+
+    TRA VE:
+        So o luoi co du lieu
+    """
+    cac_dong = (
+        CuaHang.objects.filter(geom__isnull=False)
+        .annotate(
+            vi_do=Func('geom', function='ST_Y', output_field=FloatField()),
+            kinh_do=Func('geom', function='ST_X', output_field=FloatField()),
+            so_danh_gia=Count('danh_gias'),
+            tong_diem=Sum('danh_gias__diem'),
+        )
+        .values_list('vi_do', 'kinh_do', 'so_danh_gia', 'tong_diem')
+    )
+
+    cac_o = {}
+    for vi_do, kinh_do, so_danh_gia, tong_diem in cac_dong.iterator(chunk_size=5000):
+        for o in cac_o_cua_diem(vi_do, kinh_do):
+            gia_tri = cac_o.setdefault(o, [0, 0, 0])
+            gia_tri[0] += 1
+            gia_tri[1] += so_danh_gia
+            gia_tri[2] += tong_diem or 0
+
+    OMatDo.objects.all().delete()
+    OMatDo.objects.bulk_create(
+        (OMatDo(muc=muc, o_x=o_x, o_y=o_y, so_cua_hang=so_cua_hang, so_danh_gia=so_danh_gia, tong_diem=tong_diem)
+         for (muc, o_x, o_y), (so_cua_hang, so_danh_gia, tong_diem) in cac_o.items()),
+        batch_size=5000,
+    )
+    return len(cac_o)
+
+
+def muc_cho_zoom(z):
+    """
+    Muc luoi dung cho tile ban do zoom z
+
+    GIAI THICH:
+    - Muc lon nhat cho khong qua 16 x 16 o moi tile (2^(muc - z) o moi
+      canh); tu zoom 13 chi con muc MUC_TOI_DA nen tile co it o hon
+    """
+    return max((muc for muc in CAC_MUC if muc <= z + BAC_O_MOI_TILE), default=CAC_MUC[0])
+
+
+def lay_o_mat_do(z, x, y):
+    """
+    Cac o luoi mat do nam trong tile ban do (z, x, y)
+
+    GIAI THICH:
+    - Chon muc luoi theo muc_cho_zoom; moi canh tile co 2^(muc - z) o:
+      zoom chan <= 12 co 16 x 16 o, zoom le <= 11 dung muc chan ngay duoi
+      nen co 8 x 8 o; tu zoom 13 chi con muc 16 nen o to dan (13: 8 x 8,
+      14: 4 x 4, 15: 2 x 2, 16: 1 x 1)
+    - Moi tile la mot truy van khoang (muc, o_x, o_y) tren chi muc duy nhat
+      cua bang, khong dem lai cua hang
+
+    THAM SO:
+        z, x, y: Tile ban do (0 <= z <= MUC_TOI_DA)
+
+    TRA VE:
+        Dict {'level', 'size', 'cells'} - size la so o moi canh tile, moi
+        phan tu cells la [cot, hang, so_cua_hang, diem_trung_binh] voi cot,
+        hang tinh tu goc tren trai cua tile; diem_trung_binh None neu o
+        chua co danh gia
+
+    VI DU:
+        >>> lay_o_mat_do(10, 815, 485)['cells'][:1]
+        [[3, 7, 12, 4.25]]
+    """
+    muc = muc_cho_zoom(z)
+    so_o = 2 ** (muc - z)
+    x_min, y_min = int(x * so_o), int(y * so_o)
+    x_max, y_max = int((x + 1) * so_o) - 1, int((y + 1) * so_o) - 1
+
+    cac_dong = OMatDo.objects.filter(
+        muc=muc, o_x__range=(x_min, x_max), o_y__range=(y_min, y_max), so_cua_hang__gt=0,
+    ).values_list('o_x', 'o_y', 'so_cua_hang', 'so_danh_gia', 'tong_diem')
+
+    return {
+        'level': muc,
+        'size': so_o,
+        'cells': [
+            [o_x - x_min, o_y - y_min, so_cua_hang,
+             round(tong_diem / so_danh_gia, 2) if so_danh_gia > 0 else None]
+            for o_x, o_y, so_cua_hang, so_danh_gia, tong_diem in cac_dong
+        ],
+    }
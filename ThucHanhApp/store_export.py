@@ -0,0 +1,177 @@
+"""
+Xuat Du Lieu Theo Luong (GeoJSON / CSV / NDJSON)
+Streaming exports of stores, reviews and events with constant memory
+"""
+
+import csv
+import json
+
+from django.db.models import Exists, F, OuterRef
+
+from .models import BanDoCuaHang, CuaHangSuKien, DanhGia, SuKien
+
+
+CAC_DINH_DANG_XUAT = {
+    'geojson': ('application/geo+json', 'geojson'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+# So dong doc moi lan tu server-side cursor va so dong gop vao mot khoi gui di
+SO_DONG_MOI_KHOI = 2000
+
+
+def _cua_hang(loai_id, khung, tu_ngay, den_ngay):
+    if tu_ngay or den_ngay:
+        raise ValueError('Cửa hàng không có ngày: tu_ngay/den_ngay chỉ dùng cho danh-gia, su-kien')
+    truy_van = BanDoCuaHang.objects.all()
+    if loai_id is not None:
+        truy_van = truy_van.filter(loai_id=loai_id)
+    if khung is not None:
+        truy_van = truy_van.filter(geom__bboverlaps=khung)
+    return truy_van.order_by('cua_hang_id').values(
+        'ten_cua_hang', 'dia_chi', 'loai_id', 'ten_loai', 'su_kien', 'vi_do', 'kinh_do', id=F('cua_hang_id'),
+    )
+
+
+def _danh_gia(loai_id, khung, tu_ngay, den_ngay):
+    truy_van = DanhGia.objects.all()
+    if loai_id is not None:
+        truy_van = truy_van.filter(cua_hang__loai_id=loai_id)
+    if khung is not None:
+        truy_van = truy_van.filter(cua_hang__geom__bboverlaps=khung)
+    if tu_ngay:
+        truy_van = truy_van.filter(ngay_danh_gia__gte=tu_ngay)
+    if den_ngay:
+        truy_van = truy_van.filter(ngay_danh_gia__lte=den_ngay)
+    return truy_van.order_by('id').values(
+        'id', 'cua_hang_id', 'diem', 'nhan_xet', 'ngay_danh_gia',
+        ten_cua_hang=F('cua_hang__ban_do__ten_cua_hang'),
+        vi_do=F('cua_hang__ban_do__vi_do'),
+        kinh_do=F('cua_hang__ban_do__kinh_do'),
+    )
+
+
+def _su_kien(loai_id, khung, tu_ngay, den_ngay):
+    truy_van = SuKien.objects.all()
+    if loai_id is not None or khung is not None:
+        # Su kien co it nhat mot cua hang lien ket thoa dieu kien
+        lien_ket = CuaHangSuKien.objects.filter(su_kien=OuterRef('pk'))
+        if loai_id is not None:
+            lien_ket = lien_ket.filter(cua_hang__loai_id=loai_id)
+        if khung is not None:
+            lien_ket = lien_ket.filter(cua_hang__geom__bboverlaps=khung)
+        truy_van = truy_van.filter(Exists(lien_ket))
+    # Khoang ngay: su kien dien ra giao voi [tu_ngay, den_ngay]
+    if tu_ngay:
+        truy_van = truy_van.filter(ngay_ket_thuc__gte=tu_ngay)
+    if den_ngay:
+        truy_van = truy_van.filter(ngay_bat_dau__lte=den_ngay)
+    return truy_van.order_by('id').values('id', 'ten_su_kien', 'mo_ta', 'ngay_bat_dau', 'ngay_ket_thuc')
+
+
+# Ten du lieu -> (ham tao truy van, cac cot thuoc tinh, co toa do); co toa
+# do thi GeoJSON co geometry Point (theo vi_do, kinh_do), khong thi null
+CAC_BANG_XUAT = {
+    'cua-hang': (_cua_hang, ('ten_cua_hang', 'dia_chi', 'loai_id', 'ten_loai', 'su_kien'), True),
+    'danh-gia': (_danh_gia, ('cua_hang_id', 'ten_cua_hang', 'diem', 'nhan_xet', 'ngay_danh_gia'), True),
+    'su-kien': (_su_kien, ('ten_su_kien', 'mo_ta', 'ngay_bat_dau', 'ngay_ket_thuc'), False),
+}
+
+
+def _gia_tri_json(gia_tri):
+    return gia_tri.isoformat() if hasattr(gia_tri, 'isoformat') else gia_tri
+
+
+def _dac_trung(dong, cac_cot):
+    """Mot dong thanh chuoi JSON cua Feature GeoJSON"""
+    vi_do, kinh_do = dong.get('vi_do'), dong.get('kinh_do')
+    return json.dumps({
+        'type': 'Feature',
+        'id': dong['id'],
+        'geometry': {'type': 'Point', 'coordinates': [kinh_do, vi_do]} if vi_do is not None else None,
+        'properties': {cot: _gia_tri_json(dong[cot]) for cot in cac_cot},
+    }, ensure_ascii=False, separators=(',', ':'))
+
+
+class _BoDemDong:
+    """Doi tuong 'tep' cho csv.writer: write() tra lai chuoi vua ghi"""
+
+    def write(self, gia_tri):
+        return gia_tri
+
+
+def _theo_khoi(cac_chuoi):
+    """Gop cac chuoi nho thanh khoi SO_DONG_MOI_KHOI dong de giam so lan ghi ra socket"""
+    khoi = []
+    for chuoi in cac_chuoi:
+        khoi.append(chuoi)
+        if len(khoi) >= SO_DONG_MOI_KHOI:
+            yield ''.join(khoi)
+            khoi = []
+    if khoi:
+        yield ''.join(khoi)
+
+
+def tao_luong_xuat(loai_du_lieu, dinh_dang, loai_id=None, khung=None, tu_ngay=None, den_ngay=None):
+    """
+    Tao luong xuat du lieu: mot generator cac khoi chuoi
+
+    GIAI THICH:
+    - Truy van values() doc bang iterator(): tren PostgreSQL la server-side
+      cursor, moi lan chi lay SO_DONG_MOI_KHOI dong nen bo nho khong phu
+      thuoc kich thuoc bang
+    - Cua hang doc bang doc BanDoCuaHang (mot bang); danh gia lay toa do va
+      ten cua hang tu bang nay qua mot join
+    - geojson: FeatureCollection viet dan tung Feature; ndjson: moi dong
+      mot Feature; csv: dong tieu de roi moi dong mot ban ghi (mang ten
+      su kien noi bang '; ')
+    - Kiem tra tham so (nem ValueError) ngay khi goi, truoc khi tra ve luong
+
+    THAM SO:
+        loai_du_lieu: 'cua-hang', 'danh-gia' hoac 'su-kien'
+        dinh_dang: 'geojson', 'ndjson' hoac 'csv'
+        loai_id: Chi xuat du lieu cua cua hang thuoc loai nay (tuy chon)
+        khung: Polygon SRID 4326 - chi cua hang trong khung (tuy chon)
+        tu_ngay, den_ngay: datetime.date - loc ngay danh gia / thoi gian su kien
+
+    TRA VE:
+        Generator cac chuoi (dung cho StreamingHttpResponse)
+
+    VI DU:
+        >>> luong = tao_luong_xuat('danh-gia', 'csv', tu_ngay=date(2025, 1, 1))
+        >>> phan_hoi = StreamingHttpResponse(luong, content_type='text/csv')
+    """
+    if loai_du_lieu not in CAC_BANG_XUAT:
+        raise ValueError(f'Không có dữ liệu {loai_du_lieu!r} (dùng {", ".join(CAC_BANG_XUAT)})')
+    if dinh_dang not in CAC_DINH_DANG_XUAT:
+        raise ValueError(f'Định dạng không hỗ trợ: {dinh_dang} (dùng {", ".join(CAC_DINH_DANG_XUAT)})')
+
+    tao_truy_van, cac_cot, co_toa_do = CAC_BANG_XUAT[loai_du_lieu]
+    truy_van = tao_truy_van(loai_id, khung, tu_ngay, den_ngay)
+
+    def cac_dong():
+        return truy_van.iterator(chunk_size=SO_DONG_MOI_KHOI)
+
+    if dinh_dang == 'ndjson':
+        return _theo_khoi(_dac_trung(dong, cac_cot) + '\n' for dong in cac_dong())
+
+    if dinh_dang == 'geojson':
+        def luong_geojson():
+            yield '{"type":"FeatureCollection","features":['
+            for thu_tu, dong in enumerate(cac_dong()):
+                yield (',' if thu_tu else '') + _dac_trung(dong, cac_cot)
+            yield ']}\n'
+        return _theo_khoi(luong_geojson())
+
+    cot_csv = ('id', *cac_cot, *(('vi_do', 'kinh_do') if co_toa_do else ()))
+    but = csv.writer(_BoDemDong())
+
+    def luong_csv():
+        yield but.writerow(cot_csv)
+        for dong in cac_dong():
+            yield but.writerow([
+                '; '.join(dong[cot]) if isinstance(dong[cot], list) else _gia_tri_json(dong[cot])
+                for cot in cot_csv
+            ])
+    return _theo_khoi(luong_csv())
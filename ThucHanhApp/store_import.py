@@ -0,0 +1,351 @@
+"""
+Nhap Cua Hang Hang Loat Tu CSV / GeoJSON
+Streaming bulk store import: validate, batch into a staging table, upsert by name
+"""
+
+import csv
+import json
+import math
+import os
+
+from django.db import connection, transaction
+
+from .models import LoaiCuaHang
+from .store_changes import cua_hang_da_thay_doi
+from .store_read_model import dong_bo_ban_do_cua_hang
+
+
+CAC_DINH_DANG = ('csv', 'geojson', 'ndjson')
+
+SO_DONG_MOI_LO = 5000
+
+# So thong bao loi giu lai de hien thi (cac dong loi khac chi duoc dem)
+SO_LOI_GIU_LAI = 20
+
+KICH_THUOC_KHOI_DOC = 1 << 16
+
+# Mot Feature GeoJSON dai hon muc nay ma van chua giai ma duoc thi coi la hong
+# (khong doc tiep ca tep vao bo dem)
+KICH_THUOC_FEATURE_TOI_DA = 4 << 20
+
+# Bang tam cua mot lan nhap, tu xoa khi transaction ket thuc
+SQL_TAO_BANG_TAM = """
+    CREATE TEMPORARY TABLE tam_nhap_cua_hang (
+        ten_cua_hang varchar(200) NOT NULL,
+        dia_chi text NOT NULL,
+        loai_id bigint NOT NULL,
+        kinh_do double precision NOT NULL,
+        vi_do double precision NOT NULL
+    ) ON COMMIT DROP
+"""
+
+# Upsert theo ten: cua hang trung ten duoc cap nhat, con lai them moi
+SQL_CAP_NHAT = """
+    UPDATE cua_hang ch
+    SET dia_chi = t.dia_chi, loai_id = t.loai_id, geom = ST_SetSRID(ST_MakePoint(t.kinh_do, t.vi_do), 4326)
+    FROM tam_nhap_cua_hang t
+    WHERE ch.ten_cua_hang = t.ten_cua_hang
+    RETURNING ch.id
+"""
+SQL_THEM = """
+    INSERT INTO cua_hang (ten_cua_hang, dia_chi, loai_id, geom)
+    SELECT t.ten_cua_hang, t.dia_chi, t.loai_id, ST_SetSRID(ST_MakePoint(t.kinh_do, t.vi_do), 4326)
+    FROM tam_nhap_cua_hang t
+    WHERE NOT EXISTS (SELECT 1 FROM cua_hang ch WHERE ch.ten_cua_hang = t.ten_cua_hang)
+    RETURNING id
+"""
+
+COT_BANG_TAM = ('ten_cua_hang', 'dia_chi', 'loai_id', 'kinh_do', 'vi_do')
+
+
+def doan_dinh_dang(ten_tep):
+    """Dinh dang theo duoi ten tep (.csv, .geojson/.json, .ndjson/.geojsonl/.jsonl)"""
+    duoi = os.path.splitext(ten_tep)[1].lower()
+    if duoi in ('.ndjson', '.geojsonl', '.jsonl'):
+        return 'ndjson'
+    if duoi in ('.geojson', '.json'):
+        return 'geojson'
+    if duoi == '.csv':
+        return 'csv'
+    raise ValueError(f'Không nhận ra định dạng tệp {ten_tep!r} (dùng {", ".join(CAC_DINH_DANG)})')
+
+
+def _doc_csv(tep):
+    """
+    Moi dong CSV thanh (thuoc_tinh, vi_do, kinh_do)
+
+    GIAI THICH:
+    - Tep CSV hong (ky tu NUL, truong dai qua csv.field_size_limit(), ...)
+      lam csv nem csv.Error: doi thanh ValueError kem so thu tu dong du
+      lieu (cung cach dem voi cac loi dong cua nhap_cua_hang)
+    """
+    so_dong = 0
+    try:
+        for dong in csv.DictReader(tep):
+            so_dong += 1
+            yield dong, _lay_mot(dong, 'vi_do', 'lat'), _lay_mot(dong, 'kinh_do', 'lng', 'lon')
+    except csv.Error as e:
+        raise ValueError(f'Tệp CSV không hợp lệ ở dòng {so_dong + 1}: {e}')
+
+
+def _tu_dac_trung(dac_trung):
+    """
+    Feature GeoJSON (Point) thanh (thuoc_tinh, vi_do, kinh_do)
+
+    GIAI THICH:
+    - Kiem tra kieu tung phan (Feature, geometry, properties la object,
+      coordinates la mang) de moi Feature sai dang deu la ValueError, tuc
+      la mot dong loi bi bo qua, khong lam hong ca lan nhap
+    """
+    if not isinstance(dac_trung, dict):
+        raise ValueError('Feature không hợp lệ')
+    hinh = dac_trung.get('geometry') or {}
+    if not isinstance(hinh, dict) or hinh.get('type') != 'Point':
+        raise ValueError('Geometry phải là Point')
+    toa_do = hinh.get('coordinates') or []
+    if not isinstance(toa_do, (list, tuple)):
+        raise ValueError('Tọa độ Point phải là mảng [lon, lat]')
+    if len(toa_do) < 2:
+        raise ValueError('Point thiếu tọa độ')
+    thuoc_tinh = dac_trung.get('properties') or {}
+    if not isinstance(thuoc_tinh, dict):
+        raise ValueError('Properties phải là object')
+    return thuoc_tinh, toa_do[1], toa_do[0]
+
+
+def _doc_ndjson(tep):
+    """Moi dong la mot Feature GeoJSON"""
+    for dong in tep:
+        if dong.strip():
+            try:
+                yield _tu_dac_trung(json.loads(dong))
+            except ValueError as e:
+                yield e
+
+
+def _doc_geojson(tep):
+    """
+    Doc tung Feature cua FeatureCollection ma khong nap ca tep vao bo nho
+
+    GIAI THICH:
+    - Doc tep theo khoi 64 KB; tim mang "features" roi dung
+      JSONDecoder.raw_decode giai ma tung Feature tai vi tri hien tai
+    - Feature cat ngang ranh gioi khoi thi doc them khoi roi giai ma lai;
+      bo dem chi giu phan chua giai ma nen bo nho khong phu thuoc kich
+      thuoc tep
+    - Feature hong (vd. thieu dau dong ngoac) se khong bao gio giai ma
+      duoc: qua KICH_THUOC_FEATURE_TOI_DA ma van loi thi nem ValueError
+      kem so thu tu Feature thay vi doc tiep ca tep vao bo dem
+    """
+    giai_ma = json.JSONDecoder()
+    bo_dem, vi_tri, het_tep = '', 0, False
+    so_feature = 0
+
+    def doc_them():
+        nonlocal bo_dem, vi_tri, het_tep
+        khoi = tep.read(KICH_THUOC_KHOI_DOC)
+        het_tep = not khoi
+        bo_dem, vi_tri = bo_dem[vi_tri:] + khoi, 0
+
+    # Tim dau mang "features"
+    while True:
+        tim_thay = bo_dem.find('"features"', vi_tri)
+        if tim_thay >= 0:
+            mo_mang = bo_dem.find('[', tim_thay)
+            if mo_mang >= 0:
+                vi_tri = mo_mang + 1
+                break
+        elif het_tep:
+            raise ValueError('Tệp GeoJSON không có mảng "features"')
+        else:
+            vi_tri = max(vi_tri, len(bo_dem) - len('"features"'))
+        doc_them()
+
+    while True:
+        while vi_tri < len(bo_dem) and bo_dem[vi_tri] in ' \t\r\n,':
+            vi_tri += 1
+        if vi_tri >= len(bo_dem):
+            if het_tep:
+                raise ValueError('Tệp GeoJSON bị cắt giữa chừng')
+            doc_them()
+            continue
+        if bo_dem[vi_tri] == ']':
+            return
+        try:
+            dac_trung, ket_thuc = giai_ma.raw_decode(bo_dem, vi_tri)
+        except json.JSONDecodeError:
+            if het_tep:
+                raise ValueError(f'Tệp GeoJSON không hợp lệ ở Feature thứ {so_feature + 1}')
+            if len(bo_dem) - vi_tri > KICH_THUOC_FEATURE_TOI_DA:
+                raise ValueError(f'Feature thứ {so_feature + 1} không hợp lệ hoặc dài quá '
+                                 f'{KICH_THUOC_FEATURE_TOI_DA >> 20} MB')
+            doc_them()
+            continue
+        vi_tri = ket_thuc
+        so_feature += 1
+        try:
+            yield _tu_dac_trung(dac_trung)
+        except ValueError as e:
+            yield e
+
+
+def _lay_mot(thuoc_tinh, *cac_ten):
+    """Gia tri cua ten cot dau tien co mat trong thuoc_tinh"""
+    for ten in cac_ten:
+        if thuoc_tinh.get(ten) not in (None, ''):
+            return thuoc_tinh[ten]
+    return None
+
+
+def kiem_tra_toa_do(vi_do, kinh_do):
+    """
+    Chuyen va kiem tra toa do
+
+    TRA VE:
+        Tuple (vi_do, kinh_do) kieu float; nem ValueError neu thieu, khong
+        phai so hoac nam ngoai [-90, 90] x [-180, 180]
+    """
+    if vi_do is None or kinh_do is None:
+        raise ValueError('Thiếu tọa độ')
+    try:
+        vi_do, kinh_do = float(vi_do), float(kinh_do)
+    except (TypeError, ValueError):
+        raise ValueError('Tọa độ không phải số')
+    if not (math.isfinite(vi_do) and math.isfinite(kinh_do)):
+        raise ValueError('Tọa độ không hợp lệ')
+    if not (-90 <= vi_do <= 90 and -180 <= kinh_do <= 180):
+        raise ValueError(f'Tọa độ ngoài phạm vi: {vi_do}, {kinh_do}')
+    return vi_do, kinh_do
+
+
+class _BangLoai:
+    """Tra ten loai -> id bang mot dict nap mot lan; tao loai moi neu duoc phep"""
+
+    def __init__(self, tao_moi):
+        self.tao_moi = tao_moi
+        self.theo_ten = {ten.strip().casefold(): id_loai for id_loai, ten in
+                         LoaiCuaHang.objects.values_list('id', 'ten_loai')}
+
+    def lay_id(self, ten_loai):
+        if not ten_loai or not str(ten_loai).strip():
+            raise ValueError('Thiếu loại cửa hàng')
+        khoa = str(ten_loai).strip().casefold()
+        if khoa not in self.theo_ten:
+            if not self.tao_moi:
+                raise ValueError(f'Không có loại cửa hàng {ten_loai!r}')
+            self.theo_ten[khoa] = LoaiCuaHang.objects.create(ten_loai=str(ten_loai).strip()).id
+        return self.theo_ten[khoa]
+
+
+def _ghi_lo(con_tro, lo):
+    """
+    Dua mot lo dong vao bang tam (COPY neu driver ho tro) roi upsert
+
+    TRA VE:
+        Tuple (cac_id_cap_nhat, cac_id_them)
+    """
+    con_tro.execute('TRUNCATE tam_nhap_cua_hang')
+    con_tro_goc = con_tro.cursor
+    if hasattr(con_tro_goc, 'copy'):
+        # psycopg 3: COPY ... FROM STDIN, khong tao cau INSERT nao
+        with con_tro_goc.copy(f'COPY tam_nhap_cua_hang ({", ".join(COT_BANG_TAM)}) FROM STDIN') as copy:
+            for dong in lo:
+                copy.write_row(dong)
+    else:
+        con_tro.executemany(
+            f'INSERT INTO tam_nhap_cua_hang ({", ".join(COT_BANG_TAM)}) VALUES (%s, %s, %s, %s, %s)', lo
+        )
+
+    con_tro.execute(SQL_CAP_NHAT)
+    cac_id_cap_nhat = [dong[0] for dong in con_tro.fetchall()]
+    con_tro.execute(SQL_THEM)
+    cac_id_them = [dong[0] for dong in con_tro.fetchall()]
+    return cac_id_cap_nhat, cac_id_them
+
+
+def nhap_cua_hang(tep, dinh_dang, tao_loai=False, so_dong_moi_lo=SO_DONG_MOI_LO, bao_tien_do=None):
+    """
+    Nhap cua hang hang loat tu mot luong van ban CSV / GeoJSON / NDJSON
+
+    GIAI THICH:
+    - Doc va kiem tra tung dong (ten, dia chi, loai, toa do) ma khong nap
+      ca tep; dong loi bi bo qua va dem lai
+    - Ten loai tra trong mot dict nap mot lan (_BangLoai), khong truy van
+      moi dong; tao_loai=True thi tao loai chua co
+    - Moi lo so_dong_moi_lo dong: COPY vao bang tam, roi UPDATE cac cua hang
+      trung ten va INSERT cac cua hang moi (upsert theo ten); ten trung
+      nhau trong cung lo thi dong sau thang. Bang doc BanDoCuaHang cua cac
+      cua hang trong lo duoc dong bo ngay
+    - Ca lan nhap la mot transaction; cuoi cung tinh lai thong ke, luoi mat
+      do, ban chup va cache tile mot lan (cua_hang_da_thay_doi())
+
+    THAM SO:
+        tep: Doi tuong tep van ban (doc duoc bang read()/lap tung dong)
+        dinh_dang: 'csv', 'geojson' hoac 'ndjson'
+        tao_loai: Tao loai cua hang chua co thay vi bao loi dong
+        so_dong_moi_lo: So dong moi lo ghi
+        bao_tien_do: Ham goi sau moi lo voi dict ket qua tam thoi
+
+    TRA VE:
+        Dict {'so_dong', 'so_them', 'so_cap_nhat', 'so_loi', 'cac_loi'}
+        - cac_loi la toi da SO_LOI_GIU_LAI thong bao "dong N: ..."
+
+    VI DU:
+        >>> with open('cua_hang.csv', encoding='utf-8-sig', newline='') as tep:
+        ...     ket_qua = nhap_cua_hang(tep, 'csv', tao_loai=True)
+        >>> ket_qua['so_them'], ket_qua['so_loi']
+        (998000, 12)
+    """
+    if dinh_dang not in CAC_DINH_DANG:
+        raise ValueError(f'Định dạng không hỗ trợ: {dinh_dang} (dùng {", ".join(CAC_DINH_DANG)})')
+    cac_dong = {'csv': _doc_csv, 'geojson': _doc_geojson, 'ndjson': _doc_ndjson}[dinh_dang](tep)
+
+    ket_qua = {'so_dong': 0, 'so_them': 0, 'so_cap_nhat': 0, 'so_loi': 0, 'cac_loi': []}
+
+    def ghi_loi(so_dong, loi):
+        ket_qua['so_loi'] += 1
+        if len(ket_qua['cac_loi']) < SO_LOI_GIU_LAI:
+            ket_qua['cac_loi'].append(f'dòng {so_dong}: {loi}')
+
+    with transaction.atomic(), connection.cursor() as con_tro:
+        con_tro.execute(SQL_TAO_BANG_TAM)
+        bang_loai = _BangLoai(tao_loai)
+        lo = {}
+
+        def ghi(lo):
+            cac_id_cap_nhat, cac_id_them = _ghi_lo(con_tro, list(lo.values()))
+            dong_bo_ban_do_cua_hang(cac_id_cap_nhat + cac_id_them)
+            ket_qua['so_cap_nhat'] += len(cac_id_cap_nhat)
+            ket_qua['so_them'] += len(cac_id_them)
+            if bao_tien_do:
+                bao_tien_do(ket_qua)
+
+        for dong in cac_dong:
+            ket_qua['so_dong'] += 1
+            if isinstance(dong, ValueError):
+                ghi_loi(ket_qua['so_dong'], dong)
+                continue
+            thuoc_tinh, vi_do, kinh_do = dong
+            try:
+                ten = str(_lay_mot(thuoc_tinh, 'ten_cua_hang', 'ten') or '').strip()
+                if not ten:
+                    raise ValueError('Thiếu tên cửa hàng')
+                if len(ten) > 200:
+                    raise ValueError('Tên cửa hàng dài quá 200 ký tự')
+                vi_do, kinh_do = kiem_tra_toa_do(vi_do, kinh_do)
+                loai_id = bang_loai.lay_id(_lay_mot(thuoc_tinh, 'loai', 'ten_loai'))
+            except ValueError as e:
+                ghi_loi(ket_qua['so_dong'], e)
+                continue
+
+            lo[ten] = (ten, str(thuoc_tinh.get('dia_chi') or '').strip(), loai_id, kinh_do, vi_do)
+            if len(lo) >= so_dong_moi_lo:
+                ghi(lo)
+                lo = {}
+
+        if lo:
+            ghi(lo)
+        if ket_qua['so_them'] or ket_qua['so_cap_nhat']:
+            cua_hang_da_thay_doi()
+
+    return ket_qua
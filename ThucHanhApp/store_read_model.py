@@ -0,0 +1,94 @@
+"""
+Bang Doc Ban Do Cua Hang (Phi Chuan Hoa)
+Denormalized one-row-per-store read model (BanDoCuaHang) kept in sync by the admin views
+"""
+
+from django.db import connection
+from django.db.models import QuerySet
+
+
+# Dung lai dong cua cac cua hang thoa {dieu_kien} tu cua_hang, loai_cua_hang,
+# cua_hang_su_kien va su_kien; dong da co thi ghi de (ON CONFLICT)
+SQL_DONG_BO = """
+    INSERT INTO ban_do_cua_hang
+        (cua_hang_id, ten_cua_hang, dia_chi, loai_id, ten_loai, geom, vi_do, kinh_do, su_kien)
+    SELECT ch.id, ch.ten_cua_hang, ch.dia_chi, ch.loai_id, l.ten_loai, ch.geom, ST_Y(ch.geom), ST_X(ch.geom),
+           COALESCE((SELECT array_agg(sk.ten_su_kien ORDER BY chsk.id)
+                     FROM cua_hang_su_kien chsk JOIN su_kien sk ON sk.id = chsk.su_kien_id
+                     WHERE chsk.cua_hang_id = ch.id), '{{}}')
+    FROM cua_hang ch JOIN loai_cua_hang l ON l.id = ch.loai_id
+    WHERE {dieu_kien}
+    ON CONFLICT (cua_hang_id) DO UPDATE SET
+        ten_cua_hang = EXCLUDED.ten_cua_hang,
+        dia_chi = EXCLUDED.dia_chi,
+        loai_id = EXCLUDED.loai_id,
+        ten_loai = EXCLUDED.ten_loai,
+        geom = EXCLUDED.geom,
+        vi_do = EXCLUDED.vi_do,
+        kinh_do = EXCLUDED.kinh_do,
+        su_kien = EXCLUDED.su_kien
+"""
+
+# Khoa dong cua_hang cua cac cua hang sap dong bo (theo thu tu id de khong
+# deadlock); NO KEY UPDATE khong xung dot voi khoa KEY SHARE ma lenh them
+# cua_hang_su_kien da giu tren cung dong
+SQL_KHOA_CUA_HANG = """
+    SELECT ch.id FROM cua_hang ch WHERE {dieu_kien} ORDER BY ch.id FOR NO KEY UPDATE
+"""
+
+
+def dong_bo_ban_do_cua_hang(cac_cua_hang=None):
+    """
+    Dung lai dong BanDoCuaHang cua cac cua hang tu cac bang goc
+
+    GIAI THICH:
+    - Mot cau INSERT ... SELECT ... ON CONFLICT DO UPDATE chay hoan toan
+      trong database (ca khi dong bo moi cua hang cua mot loai)
+    - Goi tu store_changes.py trong cung transaction voi thao tac ghi nen
+      bang doc luon khop voi du lieu da commit
+    - Truoc khi dung lai, khoa dong cua_hang cua cac cua hang (SELECT ...
+      FOR NO KEY UPDATE) den het transaction: hai transaction cung them/xoa
+      lien ket su kien cua mot cua hang se dong bo lan luot, lenh sau doc
+      lai sau khi lenh truoc commit nen khong ghi de mat lien ket cua nhau
+    - Cua hang bi xoa qua ORM (ke ca cascade khi xoa loai) thi Django xoa
+      luon dong BanDoCuaHang (on_delete=CASCADE chi duoc Django mo phong,
+      khoa ngoai trong database khong co ON DELETE CASCADE): khong can dong
+      bo; xoa cua_hang bang SQL thuan se loi khoa ngoai, phai xoa dong
+      ban_do_cua_hang truoc
+
+    THAM SO:
+        cac_cua_hang: Danh sach id, QuerySet tra ve mot cot id
+            (vd. CuaHang.objects.filter(loai=loai).values('id')), hoac None
+            de dung lai tat ca
+
+    TRA VE:
+        So dong duoc ghi
+
+    VI DU:
+        >>> dong_bo_ban_do_cua_hang([cua_hang.id])
+        >>> dong_bo_ban_do_cua_hang(CuaHang.objects.filter(su_kiens__su_kien=su_kien).values('id'))
+    """
+    if cac_cua_hang is None:
+        dieu_kien, tham_so = 'TRUE', []
+    elif isinstance(cac_cua_hang, QuerySet):
+        cau_truy_van, tham_so = cac_cua_hang.query.sql_with_params()
+        dieu_kien = f'ch.id IN ({cau_truy_van})'
+    else:
+        dieu_kien, tham_so = 'ch.id = ANY(%s)', [list(cac_cua_hang)]
+
+    with connection.cursor() as con_tro:
+        con_tro.execute(SQL_KHOA_CUA_HANG.format(dieu_kien=dieu_kien), tham_so)
+        con_tro.execute(SQL_DONG_BO.format(dieu_kien=dieu_kien), tham_so)
+        return con_tro.rowcount
+
+
+def tao_lai_ban_do_cua_hang():
+    """
+    Dung lai toan bo bang doc (bo ca dong khong con cua hang tuong ung)
+
+    TRA VE:
+        So dong duoc ghi
+    """
+    with connection.cursor() as con_tro:
+        con_tro.execute('DELETE FROM ban_do_cua_hang WHERE cua_hang_id NOT IN (SELECT id FROM cua_hang)')
+    return dong_bo_ban_do_cua_hang()
@@ -0,0 +1,259 @@
+"""
+Ban Chup Toa Do Cua Hang Dung Chung Giua Cac Worker (mmap)
+Process-shared, memory-mapped snapshot of store coordinates
+"""
+
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import connection
+
+from .utils.gis_tools import CongCuGIS, TapDiemCuaHang, np
+
+
+# Dinh dang file:
+#   header 32 byte: magic (8s) | phien ban du lieu (Q) | so cua hang (Q) | du tru (Q)
+#   sau do la 4 mang song song, moi mang so_luong * 8 byte (thu tu byte cua may):
+#   ids (q) | vi_do (d) | kinh_do (d) | loai_ids (q)
+MAGIC = b'CHSNAP01'
+DINH_DANG_HEADER = '<8sQQQ'
+KICH_THUOC_HEADER = struct.calcsize(DINH_DANG_HEADER)
+
+# So diem xu ly moi khoi khi tim gan nhat: bo nho tam cua mot truy van
+# khong phu thuoc so cua hang
+SO_DIEM_MOI_KHOI = 65536
+
+# Khoa pg_advisory_lock tuan tu hoa tao_lai_ban_chup giua cac worker/process
+KHOA_TAO_LAI = 7_310_001
+
+
+def lay_duong_dan_ban_chup():
+    """Duong dan file ban chup (settings.STORE_SNAPSHOT_PATH)"""
+    return os.fspath(settings.STORE_SNAPSHOT_PATH)
+
+
+def ghi_ban_chup(tap, duong_dan, phien_ban):
+    """
+    Ghi TapDiemCuaHang ra file ban chup mot cach nguyen tu
+
+    GIAI THICH:
+    - Ghi vao file tam trong cung thu muc, fsync roi os.replace de doi ten
+    - os.replace la nguyen tu: worker dang doc van thay file cu (da mmap),
+      worker mo file sau thoi diem doi ten thay file moi, khong ai thay
+      file ghi do dang
+
+    THAM SO:
+        tap: TapDiemCuaHang can ghi
+        duong_dan: Duong dan file dich
+        phien_ban: So phien ban du lieu luu trong header
+    """
+    thu_muc = os.path.dirname(duong_dan) or '.'
+    os.makedirs(thu_muc, exist_ok=True)
+    duong_dan_tam = f'{duong_dan}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    try:
+        with open(duong_dan_tam, 'wb') as f:
+            f.write(struct.pack(DINH_DANG_HEADER, MAGIC, phien_ban, len(tap), 0))
+            for mang, kieu in ((tap.ids, 'q'), (tap.vi_do, 'd'), (tap.kinh_do, 'd'), (tap.loai_ids, 'q')):
+                f.write(array(kieu, mang).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(duong_dan_tam, duong_dan)
+    except BaseException:
+        if os.path.exists(duong_dan_tam):
+            os.remove(duong_dan_tam)
+        raise
+
+
+def doc_phien_ban_ban_chup(duong_dan):
+    """Phien ban ghi trong header file ban chup, None neu chua co file hoac file hong"""
+    try:
+        with open(duong_dan, 'rb') as f:
+            header = f.read(KICH_THUOC_HEADER)
+    except FileNotFoundError:
+        return None
+    if len(header) < KICH_THUOC_HEADER:
+        return None
+    magic, phien_ban, _, _ = struct.unpack(DINH_DANG_HEADER, header)
+    return phien_ban if magic == MAGIC else None
+
+
+def tao_lai_ban_chup(chi_khi_cu_hon=None):
+    """
+    Doc toa do cua hang tu database va ghi lai file ban chup
+
+    GIAI THICH:
+    - Goi khi cua hang duoc them, di chuyen hoac xoa (xem store_changes.py)
+      va khi trien khai (lenh manage.py tao_lai_ban_chup)
+    - Doc database va ghi file trong pg_advisory_lock: hai lan ghi commit
+      gan nhau khong the de lan tao cham hon (doc du lieu cu) ghi de ban
+      chup moi hon - lan tao sau luon doc sau khi lan truoc da ghi xong
+    - Phien ban du lieu la thoi diem tao (nano giay), lay trong khoa nen
+      tang dan theo thu tu ghi file
+    - chi_khi_cu_hon: sau khi co khoa, neu file hien tai co phien ban >=
+      moc nay thi lan tao do da doc database sau moc => bo qua. Nhieu lan
+      ghi commit dong thoi (dang cho khoa) vi vay chi ton mot lan tao
+
+    THAM SO:
+        chi_khi_cu_hon: Moc thoi gian (time.time_ns()) hoac None de luon tao
+
+    TRA VE:
+        Phien ban cua ban chup vua ghi (hoac ban chup da du moi)
+    """
+    # Import tai cho de tranh vong import voi spatial_queries
+    from .spatial_queries import lay_tap_diem_cua_hang
+
+    with connection.cursor() as con_tro:
+        con_tro.execute('SELECT pg_advisory_lock(%s)', [KHOA_TAO_LAI])
+        try:
+            duong_dan = lay_duong_dan_ban_chup()
+            if chi_khi_cu_hon is not None:
+                phien_ban = doc_phien_ban_ban_chup(duong_dan)
+                if phien_ban is not None and phien_ban >= chi_khi_cu_hon:
+                    return phien_ban
+            phien_ban = time.time_ns()
+            ghi_ban_chup(lay_tap_diem_cua_hang(), duong_dan, phien_ban)
+        finally:
+            con_tro.execute('SELECT pg_advisory_unlock(%s)', [KHOA_TAO_LAI])
+    return phien_ban
+
+
+def tao_lai_ban_chup_sau_ghi():
+    """
+    Tao lai ban chup sau khi mot thao tac ghi da commit (store_changes.py)
+
+    GIAI THICH:
+    - Moc la thoi diem goi (sau commit): lan tao nao doc database sau moc
+      nay da co du lieu vua ghi, nen cac lan ghi dong thoi gop chung mot
+      lan tao (xem tao_lai_ban_chup)
+    """
+    return tao_lai_ban_chup(chi_khi_cu_hon=time.time_ns())
+
+
+class BanChupCuaHang:
+    """
+    Ban chup da mmap: TapDiemCuaHang tro thang vao vung nho cua file
+
+    GIAI THICH:
+    - Cac mang ids/vi_do/kinh_do/loai_ids la memoryview tren mmap chi doc:
+      khong sao chep, cac worker tren cung may dung chung page cache cua OS
+    - tim_gan_nhat() quet thang cac mang da mmap (vector hoa theo khoi),
+      khong xay chi muc rieng trong tung worker
+
+    THAM SO:
+        duong_dan: Duong dan file ban chup
+    """
+
+    def __init__(self, duong_dan):
+        with open(duong_dan, 'rb') as f:
+            thong_tin = os.fstat(f.fileno())
+            self.dau_hieu = (thong_tin.st_ino, thong_tin.st_mtime_ns, thong_tin.st_size)
+            if thong_tin.st_size < KICH_THUOC_HEADER:
+                raise ValueError(f'File ban chup hong: {duong_dan}')
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.phien_ban, so_luong, _ = struct.unpack_from(DINH_DANG_HEADER, self._mmap, 0)
+        if magic != MAGIC or len(self._mmap) != KICH_THUOC_HEADER + 32 * so_luong:
+            raise ValueError(f'File ban chup khong dung dinh dang: {duong_dan}')
+
+        vung_nho = memoryview(self._mmap)
+        cac_mang = []
+        for thu_tu, kieu in enumerate('qddq'):
+            bat_dau = KICH_THUOC_HEADER + thu_tu * 8 * so_luong
+            cac_mang.append(vung_nho[bat_dau:bat_dau + 8 * so_luong].cast(kieu))
+        self.tap = TapDiemCuaHang(*cac_mang)
+
+    def tim_gan_nhat(self, vi_do_goc, kinh_do_goc):
+        """
+        Tim cua hang gan nhat tren ban chup
+
+        GIAI THICH:
+        - Co NumPy: moi khoi SO_DIEM_MOI_KHOI diem doc thang tu mmap
+          (np.frombuffer, khong sao chep), tinh so hang haversine
+          a = sin^2(dlat/2) + cos.cos.sin^2(dlon/2) roi argmin; a dong bien
+          voi khoang cach nen chi can tinh khoang cach cho diem thang cuoc
+        - Khong co NumPy: mot vong lap tren cac mang
+        - O(n) moi truy van nhung khong ton bo nho rieng cho tung worker
+
+        TRA VE:
+            Tuple (diem_gan_nhat, khoang_cach) nhu CongCuGIS.tim_diem_gan_nhat,
+            (None, None) neu ban chup rong
+        """
+        so_luong = len(self.tap)
+        if not so_luong:
+            return None, None
+
+        vi_do_goc_rad, kinh_do_goc_rad = math.radians(vi_do_goc), math.radians(kinh_do_goc)
+        cos_vi_do_goc = math.cos(vi_do_goc_rad)
+        chi_so, a_nho_nhat = 0, float('inf')
+        if np is not None:
+            cac_vi_do = np.frombuffer(self.tap.vi_do, dtype=float)
+            cac_kinh_do = np.frombuffer(self.tap.kinh_do, dtype=float)
+            for dau in range(0, so_luong, SO_DIEM_MOI_KHOI):
+                vi_do = np.radians(cac_vi_do[dau:dau + SO_DIEM_MOI_KHOI])
+                kinh_do = np.radians(cac_kinh_do[dau:dau + SO_DIEM_MOI_KHOI])
+                a = np.sin((vi_do - vi_do_goc_rad) / 2) ** 2 + \
+                    cos_vi_do_goc * np.cos(vi_do) * np.sin((kinh_do - kinh_do_goc_rad) / 2) ** 2
+                i = int(np.argmin(a))
+                if a[i] < a_nho_nhat:
+                    chi_so, a_nho_nhat = dau + i, float(a[i])
+        else:
+            sin, cos, radians = math.sin, math.cos, math.radians
+            for i, (vi_do, kinh_do) in enumerate(zip(self.tap.vi_do, self.tap.kinh_do)):
+                vi_do = radians(vi_do)
+                a = sin((vi_do - vi_do_goc_rad) / 2) ** 2 + \
+                    cos_vi_do_goc * cos(vi_do) * sin((radians(kinh_do) - kinh_do_goc_rad) / 2) ** 2
+                if a < a_nho_nhat:
+                    chi_so, a_nho_nhat = i, a
+
+        diem = self.tap[chi_so]
+        return diem, CongCuGIS.tinh_khoang_cach_haversine(vi_do_goc, kinh_do_goc, diem[0], diem[1])
+
+
+_ban_chup_hien_tai = None
+_khoa_ban_chup = threading.Lock()
+
+
+def lay_ban_chup():
+    """
+    Lay ban chup hien tai cho worker nay, tu dong doi sang file moi
+
+    GIAI THICH:
+    - Moi lan goi chi ton mot os.stat: neu file van la file da mmap
+      (cung inode, mtime, kich thuoc) thi tra ve ban chup dang dung
+    - Neu file da bi thay (tao_lai_ban_chup o worker khac) thi mmap file moi;
+      ban chup cu duoc giai phong khi khong con request nao dung
+    - Chua co file thi tao tu database
+
+    TRA VE:
+        BanChupCuaHang
+
+    VI DU:
+        >>> ban_chup = lay_ban_chup()
+        >>> gan_nhat, kc = ban_chup.tim_gan_nhat(16.05, 108.20)
+        >>> trong_5km = CongCuGIS.tim_diem_trong_ban_kinh(16.05, 108.20, ban_chup.tap, 5)
+    """
+    global _ban_chup_hien_tai
+
+    duong_dan = lay_duong_dan_ban_chup()
+    try:
+        thong_tin = os.stat(duong_dan)
+    except FileNotFoundError:
+        tao_lai_ban_chup()
+        thong_tin = os.stat(duong_dan)
+
+    dau_hieu = (thong_tin.st_ino, thong_tin.st_mtime_ns, thong_tin.st_size)
+    ban_chup = _ban_chup_hien_tai
+    if ban_chup is not None and ban_chup.dau_hieu == dau_hieu:
+        return ban_chup
+
+    with _khoa_ban_chup:
+        if _ban_chup_hien_tai is None or _ban_chup_hien_tai.dau_hieu != dau_hieu:
+            _ban_chup_hien_tai = BanChupCuaHang(duong_dan)
+        return _ban_chup_hien_tai
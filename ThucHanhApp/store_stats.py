@@ -0,0 +1,157 @@
+"""
+Thong Ke Toa Do Cua Hang Cap Nhat Tang Dan
+Running sums and bounding box of store coordinates (ThongKeCuaHang)
+"""
+
+from django.db.models import Count, F, FloatField, Func, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least
+
+from .models import CuaHang, ThongKeCuaHang
+
+
+def _loc_pham_vi(loai_id):
+    """Dieu kien loc hang thong ke: loai_id = None la hang tong"""
+    return {'loai__isnull': True} if loai_id is None else {'loai_id': loai_id}
+
+
+def them_diem(loai_id, vi_do, kinh_do):
+    """
+    Cong mot cua hang vao hang tong va hang cua loai loai_id
+
+    GIAI THICH:
+    - Cap nhat bang UPDATE ... SET so_luong = so_luong + 1, ... trong
+      database (bieu thuc F) nen cac request dong thoi khong ghi de nhau
+    - Khung bao chi can mo rong: LEAST/GREATEST (PostgreSQL bo qua NULL
+      nen hang dang rong cung dung)
+    """
+    for khoa in (None, loai_id):
+        cac_truong = dict(
+            so_luong=F('so_luong') + 1,
+            tong_vi_do=F('tong_vi_do') + vi_do,
+            tong_kinh_do=F('tong_kinh_do') + kinh_do,
+            vi_do_min=Least('vi_do_min', Value(vi_do)),
+            vi_do_max=Greatest('vi_do_max', Value(vi_do)),
+            kinh_do_min=Least('kinh_do_min', Value(kinh_do)),
+            kinh_do_max=Greatest('kinh_do_max', Value(kinh_do)),
+        )
+        if not ThongKeCuaHang.objects.filter(**_loc_pham_vi(khoa)).update(**cac_truong):
+            # Cua hang dau tien cua pham vi nay; get_or_create dong thoi gap
+            # rang buoc unique (ke ca hang tong, xem thong_ke_mot_hang_tong)
+            # thi doc lai hang da tao
+            ThongKeCuaHang.objects.get_or_create(**_loc_pham_vi(khoa))
+            ThongKeCuaHang.objects.filter(**_loc_pham_vi(khoa)).update(**cac_truong)
+
+
+def bot_diem(loai_id, vi_do, kinh_do):
+    """
+    Tru mot cua hang khoi hang tong va hang cua loai loai_id
+
+    GIAI THICH:
+    - Tong va so luong tru truc tiep nhu them_diem
+    - Khung bao khong thu hep tang dan duoc: chi khi diem bi xoa nam tren
+      canh khung bao moi tinh lai khung bao cua pham vi do bang aggregate
+      (doc bang cua_hang hien tai - co the da chua vi tri moi, khong sao
+      vi them_diem mo rong khung bao lai van cho cung ket qua)
+    - Het cua hang thi dat lai tong ve 0 (xoa sai so cong don)
+    """
+    for khoa in (None, loai_id):
+        ThongKeCuaHang.objects.filter(**_loc_pham_vi(khoa)).update(
+            so_luong=F('so_luong') - 1,
+            tong_vi_do=F('tong_vi_do') - vi_do,
+            tong_kinh_do=F('tong_kinh_do') - kinh_do,
+        )
+        hang = ThongKeCuaHang.objects.filter(**_loc_pham_vi(khoa)).first()
+        if hang is None:
+            continue
+        if hang.so_luong <= 0:
+            ThongKeCuaHang.objects.filter(pk=hang.pk).update(
+                so_luong=0, tong_vi_do=0, tong_kinh_do=0,
+                vi_do_min=None, vi_do_max=None, kinh_do_min=None, kinh_do_max=None,
+            )
+        elif vi_do in (hang.vi_do_min, hang.vi_do_max) or kinh_do in (hang.kinh_do_min, hang.kinh_do_max):
+            tinh_lai_khung_bao(khoa)
+
+
+def _tong_hop(truy_van):
+    """Aggregate so luong, tong va khung bao toa do cua mot QuerySet cua hang"""
+    vi_do = Func('geom', function='ST_Y', output_field=FloatField())
+    kinh_do = Func('geom', function='ST_X', output_field=FloatField())
+    return truy_van.filter(geom__isnull=False).aggregate(
+        so_luong=Count('id'),
+        tong_vi_do=Sum(vi_do),
+        tong_kinh_do=Sum(kinh_do),
+        vi_do_min=Min(vi_do),
+        vi_do_max=Max(vi_do),
+        kinh_do_min=Min(kinh_do),
+        kinh_do_max=Max(kinh_do),
+    )
+
+
+def _loc_cua_hang(loai_id):
+    """QuerySet cua hang thuoc pham vi: loai_id = None la tat ca"""
+    return CuaHang.objects.all() if loai_id is None else CuaHang.objects.filter(loai_id=loai_id)
+
+
+def tinh_lai_khung_bao(loai_id=None):
+    """Tinh lai khung bao cua mot pham vi bang MIN/MAX trong database"""
+    gia_tri = _tong_hop(_loc_cua_hang(loai_id))
+    ThongKeCuaHang.objects.filter(**_loc_pham_vi(loai_id)).update(
+        vi_do_min=gia_tri['vi_do_min'], vi_do_max=gia_tri['vi_do_max'],
+        kinh_do_min=gia_tri['kinh_do_min'], kinh_do_max=gia_tri['kinh_do_max'],
+    )
+
+
+def tinh_lai_thong_ke(loai_id=None):
+    """
+    Tinh lai toan bo mot hang thong ke tu bang cua_hang
+
+    GIAI THICH:
+    - Dung khi thay doi khong the cap nhat tang dan (xoa loai cua hang
+      cascade xoa nhieu cua hang) hoac de xoa sai so cong don
+    """
+    gia_tri = _tong_hop(_loc_cua_hang(loai_id))
+    gia_tri['tong_vi_do'] = gia_tri['tong_vi_do'] or 0
+    gia_tri['tong_kinh_do'] = gia_tri['tong_kinh_do'] or 0
+    ThongKeCuaHang.objects.update_or_create(defaults=gia_tri, **_loc_pham_vi(loai_id))
+
+
+def tinh_lai_tat_ca_thong_ke():
+    """Tinh lai hang tong va hang cua moi loai dang co cua hang"""
+    tinh_lai_thong_ke(None)
+    cac_loai = set(CuaHang.objects.values_list('loai_id', flat=True).distinct())
+    for loai_id in cac_loai:
+        tinh_lai_thong_ke(loai_id)
+    ThongKeCuaHang.objects.filter(loai__isnull=False).exclude(loai_id__in=cac_loai).delete()
+
+
+def cap_nhat_thong_ke(truoc, sau):
+    """
+    Cap nhat thong ke khi mot cua hang thay doi
+
+    THAM SO:
+        truoc: (loai_id, vi_do, kinh_do) truoc khi thay doi, None neu moi tao
+        sau: (loai_id, vi_do, kinh_do) sau khi thay doi, None neu da xoa
+    """
+    if truoc == sau:
+        return
+    if truoc is not None:
+        bot_diem(*truoc)
+    if sau is not None:
+        them_diem(*sau)
+
+
+def lay_thong_ke(loai_id=None):
+    """
+    Doc hang thong ke (mot dong) cua tat ca cua hang hoac cua mot loai
+
+    TRA VE:
+        ThongKeCuaHang hoac None neu pham vi nay chua co cua hang
+
+    VI DU:
+        >>> thong_ke = lay_thong_ke()
+        >>> tam = (thong_ke.tong_vi_do / thong_ke.so_luong, thong_ke.tong_kinh_do / thong_ke.so_luong)
+    """
+    hang = ThongKeCuaHang.objects.filter(**_loc_pham_vi(loai_id)).first()
+    if hang is None or hang.so_luong <= 0:
+        return None
+    return hang
@@ -0,0 +1,187 @@
+"""
+Vector Tile (MVT) Cua Hang Va Bo Nho Dem Tile Tren Dia
+Mapbox Vector Tiles of stores with an on-disk tile cache
+"""
+
+import math
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from .result_cache import lay_phien_ban_du_lieu
+
+
+# Phien ban noi dung tile: doi khi doi lop/thuoc tinh trong tile de bo
+# toan bo tile cu (thu muc cache moi)
+PHIEN_BAN_NOI_DUNG = 'v1'
+
+TEN_LOP = 'stores'
+DO_PHAN_GIAI = 4096         # extent cua MVT
+VUNG_DEM = 64               # don vi tile, diem gan canh duoc ve ca o tile ben canh
+ZOOM_TOI_DA = 18
+
+# Tile cua mot muc zoom, doc bang doc ban_do_cua_hang (store_read_model.py);
+# vung dem mo rong ST_TileEnvelope (PostGIS >= 3.1) de diem gan canh tile ben
+# canh cung co trong tile nay
+SQL_TILE = f"""
+    WITH hinh AS (
+        SELECT ST_AsMVTGeom(ST_Transform(bd.geom, 3857), ST_TileEnvelope(%(z)s, %(x)s, %(y)s),
+                            {DO_PHAN_GIAI}, {VUNG_DEM}, true) AS geom,
+               bd.cua_hang_id AS id,
+               bd.ten_cua_hang AS ten,
+               bd.loai_id,
+               cardinality(bd.su_kien) > 0 AS co_su_kien
+        FROM ban_do_cua_hang bd
+        WHERE bd.geom && ST_Transform(
+            ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => {VUNG_DEM / DO_PHAN_GIAI}), 4326
+        )
+    )
+    SELECT ST_AsMVT(hinh.*, '{TEN_LOP}', {DO_PHAN_GIAI}, 'geom', 'id') FROM hinh
+"""
+
+
+def lay_thu_muc_tile():
+    """Thu muc cache tile cua phien ban noi dung hien tai"""
+    return os.path.join(os.fspath(settings.STORE_TILE_CACHE_DIR), PHIEN_BAN_NOI_DUNG)
+
+
+def duong_dan_tile(z, x, y):
+    return os.path.join(lay_thu_muc_tile(), str(z), str(x), f'{y}.pbf')
+
+
+def tile_hop_le(z, x, y):
+    return 0 <= z <= ZOOM_TOI_DA and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tao_tile(z, x, y):
+    """
+    Tao mot vector tile cua hang bang ST_AsMVT trong PostGIS
+
+    GIAI THICH:
+    - Mot bang (ban_do_cua_hang), loc geom && khung tile (co vung dem)
+      theo GiST index
+    - Moi cua hang la mot diem trong lop 'stores' voi id, ten, loai_id,
+      co_su_kien
+
+    TRA VE:
+        bytes (rong neu tile khong co cua hang)
+    """
+    with connection.cursor() as con_tro:
+        con_tro.execute(SQL_TILE, {'z': z, 'x': x, 'y': y})
+        dong = con_tro.fetchone()
+    return bytes(dong[0]) if dong and dong[0] is not None else b''
+
+
+def _ghi_nguyen_tu(duong_dan, noi_dung):
+    """Ghi file tam roi os.replace de request khac khong doc file ghi do dang"""
+    os.makedirs(os.path.dirname(duong_dan), exist_ok=True)
+    duong_dan_tam = f'{duong_dan}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(duong_dan_tam, 'wb') as f:
+        f.write(noi_dung)
+    os.replace(duong_dan_tam, duong_dan)
+
+
+def lay_tile(z, x, y):
+    """
+    Doc tile tu cache tren dia, chua co thi tao va ghi vao cache
+
+    GIAI THICH:
+    - Tile rong cung duoc luu (file 0 byte) de vung khong co cua hang
+      khong phai truy van lai
+    - Tranh ghi de tile cu len tile vua bi vo hieu: ghi lai phien ban du
+      lieu truoc khi truy van, sau khi ghi file neu phien ban da doi (cua
+      hang vua thay doi trong luc tao tile) thi xoa file vua ghi. Ben ghi
+      cua hang doi phien ban truoc roi moi xoa tile (store_changes.py) nen
+      file cu khong the con lai
+
+    TRA VE:
+        bytes cua tile
+    """
+    duong_dan = duong_dan_tile(z, x, y)
+    try:
+        with open(duong_dan, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    phien_ban = lay_phien_ban_du_lieu()
+    noi_dung = tao_tile(z, x, y)
+    _ghi_nguyen_tu(duong_dan, noi_dung)
+    if lay_phien_ban_du_lieu() != phien_ban:
+        _xoa_file(duong_dan)
+    return noi_dung
+
+
+def so_tile(vi_do, kinh_do, z):
+    """Toa do tile (so thuc) cua mot diem o muc zoom z (Web Mercator)"""
+    n = 2 ** z
+    vi_do = min(max(vi_do, -85.05112878), 85.05112878)
+    x = (kinh_do + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(vi_do))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def cac_tile_chua_diem(vi_do, kinh_do, zoom_toi_da=ZOOM_TOI_DA):
+    """
+    Cac tile (z, x, y) ma mot diem xuat hien trong do, moi muc zoom
+
+    GIAI THICH:
+    - Tile chua diem, cong them tile ben canh neu diem nam trong vung dem
+      (VUNG_DEM / DO_PHAN_GIAI) gan canh tile vi tile do cung ve diem nay
+    """
+    le = VUNG_DEM / DO_PHAN_GIAI
+    cac_tile = set()
+    for z in range(zoom_toi_da + 1):
+        n = 2 ** z
+        x, y = so_tile(vi_do, kinh_do, z)
+        o_x, o_y = min(int(x), n - 1), min(int(y), n - 1)
+        cac_x = {o_x} | ({o_x - 1} if x - o_x < le else set()) | ({o_x + 1} if o_x + 1 - x < le else set())
+        cac_y = {o_y} | ({o_y - 1} if y - o_y < le else set()) | ({o_y + 1} if o_y + 1 - y < le else set())
+        cac_tile.update((z, tx % n, ty) for tx in cac_x for ty in cac_y if 0 <= ty < n)
+    return cac_tile
+
+
+def _xoa_file(duong_dan):
+    try:
+        os.remove(duong_dan)
+    except FileNotFoundError:
+        pass
+
+
+def xoa_tile_quanh(cac_vi_tri):
+    """
+    Xoa khoi cache cac tile chua mot trong cac vi tri (vi_do, kinh_do)
+
+    GIAI THICH:
+    - Chi cac tile co the chua cua hang vua thay doi bi xoa (toi da vai
+      chuc file moi vi tri), moi tile khac van dung duoc
+    """
+    cac_tile = set()
+    for vi_do, kinh_do in cac_vi_tri:
+        cac_tile |= cac_tile_chua_diem(vi_do, kinh_do)
+    for z, x, y in cac_tile:
+        _xoa_file(duong_dan_tile(z, x, y))
+
+
+def xoa_tat_ca_tile():
+    """Xoa toan bo cache tile (doi ten thu muc truoc de request moi bat dau tu cache rong ngay)"""
+    thu_muc = lay_thu_muc_tile()
+    thu_muc_xoa = f'{thu_muc}.{os.getpid()}.{threading.get_ident()}.xoa'
+    try:
+        os.replace(thu_muc, thu_muc_xoa)
+    except FileNotFoundError:
+        return
+    shutil.rmtree(thu_muc_xoa, ignore_errors=True)
+
+
+def cac_tile_co_cua_hang(tap, z):
+    """Tap (x, y) cac tile o muc zoom z co it nhat mot cua hang trong tap (dung de tao truoc)"""
+    n = 2 ** z
+    cac_tile = set()
+    for vi_do, kinh_do, _ in tap:
+        x, y = so_tile(vi_do, kinh_do, z)
+        cac_tile.add((min(int(x), n - 1), min(int(y), n - 1)))
+    return cac_tile
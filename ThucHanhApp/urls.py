@@ -7,6 +7,17 @@ urlpatterns = [
     
     # GIS Tools API
     path('api/gis-tools/', views.api_gis_tools, name='api_gis_tools'),
+    path('api/gis-tools/batch/', views.api_gis_tools_batch, name='api_gis_tools_batch'),
+    
+    # Cua hang trong khung nhin ban do (GeoJSON)
+    path('api/cua-hang/', views.api_cua_hang_khung_nhin, name='api_cua_hang_khung_nhin'),
+    path('api/cua-hang/cum/', views.api_cum_cua_hang, name='api_cum_cua_hang'),
+    
+    # Vector tile cua hang (MVT)
+    path('tiles/stores/<int:z>/<int:x>/<int:y>.pbf', views.tile_cua_hang, name='tile_cua_hang'),
+    
+    # Luoi mat do cua hang / diem danh gia theo tile
+    path('api/mat-do/<int:z>/<int:x>/<int:y>/', views.api_mat_do, name='api_mat_do'),
     
     # Admin authentication
     path('quan-ly/login/', views.admin_login, name='admin_login'),
@@ -22,6 +33,7 @@ urlpatterns = [
     # Admin CRUD: Cua Hang
     path('quan-ly/cuahang/', views.admin_cuahang_list, name='admin_cuahang_list'),
     path('quan-ly/cuahang/create/', views.admin_cuahang_create, name='admin_cuahang_create'),
+    path('quan-ly/cuahang/import/', views.admin_cuahang_import, name='admin_cuahang_import'),
     path('quan-ly/cuahang/<int:id>/update/', views.admin_cuahang_update, name='admin_cuahang_update'),
     path('quan-ly/cuahang/<int:id>/delete/', views.admin_cuahang_delete, name='admin_cuahang_delete'),
     
@@ -41,4 +53,7 @@ urlpatterns = [
     path('quan-ly/cuahang-sukien/', views.admin_cuahang_sukien_list, name='admin_cuahang_sukien_list'),
     path('quan-ly/cuahang-sukien/create/', views.admin_cuahang_sukien_create, name='admin_cuahang_sukien_create'),
     path('quan-ly/cuahang-sukien/<int:id>/delete/', views.admin_cuahang_sukien_delete, name='admin_cuahang_sukien_delete'),
+    
+    # Xuat du lieu theo luong (cua-hang, danh-gia, su-kien)
+    path('quan-ly/export/<str:loai_du_lieu>/', views.admin_export, name='admin_export'),
 ]
@@ -3,7 +3,195 @@ Cong Cu GIS Tu Viet - Khong Su Dung Thu Vien Ben Ngoai
 Custom GIS Tools - Implemented without external libraries
 """
 
+import bisect
+import heapq
 import math
+from array import array
+from functools import lru_cache
+from itertools import accumulate
+
+try:
+    # NumPy chi la tuy chon: neu co thi cac ham hang loat duoc vector hoa,
+    # neu khong co thi van chay bang vong lap thuan Python
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ToaDoRadian:
+    """
+    Tap toa do da chuyen sang radian, dung lai duoc cho nhieu truy van
+    
+    GIAI THICH:
+    - Luu vi do, kinh do (radian) va cos(vi do) cua tung diem
+    - Chuyen doi mot lan, cac lan tinh khoang cach sau bo qua buoc
+      math.radians va cos(vi do) cho phia diem dich
+    - Dung mang NumPy neu co, nguoc lai dung list Python
+    
+    THAM SO:
+        vi_do_rad, kinh_do_rad: Day vi do, kinh do theo radian
+    
+    VI DU:
+        >>> toa_do = CongCuGIS.chuyen_doi_radian([(16.05, 108.20), (16.06, 108.21)])
+        >>> kc = CongCuGIS.tinh_khoang_cach_mot_nhieu(16.05, 108.20, toa_do)
+    """
+    
+    __slots__ = ('vi_do', 'kinh_do', 'cos_vi_do')
+    
+    def __init__(self, vi_do_rad, kinh_do_rad):
+        if np is not None:
+            self.vi_do = np.asarray(vi_do_rad, dtype=float)
+            self.kinh_do = np.asarray(kinh_do_rad, dtype=float)
+            self.cos_vi_do = np.cos(self.vi_do)
+        else:
+            self.vi_do = list(vi_do_rad)
+            self.kinh_do = list(kinh_do_rad)
+            self.cos_vi_do = [math.cos(v) for v in self.vi_do]
+    
+    def __len__(self):
+        return len(self.vi_do)
+    
+    def tap_con(self, cac_chi_so):
+        """Lay ToaDoRadian con theo danh sach chi so, khong tinh lai cos(vi do)"""
+        tap_con = ToaDoRadian.__new__(ToaDoRadian)
+        if np is not None:
+            tap_con.vi_do = self.vi_do[cac_chi_so]
+            tap_con.kinh_do = self.kinh_do[cac_chi_so]
+            tap_con.cos_vi_do = self.cos_vi_do[cac_chi_so]
+        else:
+            tap_con.vi_do = [self.vi_do[i] for i in cac_chi_so]
+            tap_con.kinh_do = [self.kinh_do[i] for i in cac_chi_so]
+            tap_con.cos_vi_do = [self.cos_vi_do[i] for i in cac_chi_so]
+        return tap_con
+    
+    def loc_trong_khung(self, khung_bao):
+        """
+        Tra ve chi so cac diem nam trong khung bao (loc so bo, vector hoa)
+        
+        THAM SO:
+            khung_bao: ((vi_do_min, kinh_do_min), (vi_do_max, kinh_do_max)) theo do
+        
+        TRA VE:
+            Mang NumPy (hoac list) chi so tang dan
+        """
+        (vi_do_min, kinh_do_min), (vi_do_max, kinh_do_max) = khung_bao
+        vi_do_min, vi_do_max = math.radians(vi_do_min), math.radians(vi_do_max)
+        kinh_do_min, kinh_do_max = math.radians(kinh_do_min), math.radians(kinh_do_max)
+        loc_kinh_do = kinh_do_min > -math.pi or kinh_do_max < math.pi
+        
+        if np is not None:
+            mat_na = (self.vi_do >= vi_do_min) & (self.vi_do <= vi_do_max)
+            if loc_kinh_do:
+                mat_na &= (self.kinh_do >= kinh_do_min) & (self.kinh_do <= kinh_do_max)
+            return np.flatnonzero(mat_na)
+        
+        if loc_kinh_do:
+            return [i for i, (vi_do, kinh_do) in enumerate(zip(self.vi_do, self.kinh_do))
+                    if vi_do_min <= vi_do <= vi_do_max and kinh_do_min <= kinh_do <= kinh_do_max]
+        return [i for i, vi_do in enumerate(self.vi_do) if vi_do_min <= vi_do <= vi_do_max]
+
+
+class TapDiemCuaHang:
+    """
+    Tap toa do cua hang gon nhe, luu trong cac mang kieu co dinh song song
+    
+    GIAI THICH:
+    - Thay cho list cac tuple (vi_do, kinh_do, doi_tuong_model): moi cua hang
+      chi ton 4 o nho (id, vi do, kinh do, id loai) trong array('q')/array('d'),
+      khong giu model Django hay doi tuong GEOS => it bo nho, GC khong phai duyet
+    - Dung nhu mot danh sach diem: phan tu thu i la tuple (vi_do, kinh_do, id)
+      nen dua thang vao moi ham cua CongCuGIS (ket qua tra ve id cua hang)
+    - Cac ham hang loat (tinh_khoang_cach_mot_nhieu, tim_diem_trong_ban_kinh, ...)
+      doc thang tu mang, khong tao tuple cho tung diem
+    - ToaDoRadian duoc tinh mot lan va luu lai cho cac truy van sau
+    
+    THAM SO:
+        ids, vi_do, kinh_do, loai_ids: Cac mang song song (mac dinh rong)
+    
+    VI DU:
+        >>> tap = TapDiemCuaHang.tu_danh_sach([(1, 16.05, 108.20, 2), (2, 16.10, 108.25, 1)])
+        >>> gan_nhat, kc = CongCuGIS.tim_diem_gan_nhat(16.055, 108.205, tap)
+        >>> print(f"Cua hang id={gan_nhat[2]}, cach {kc:.2f} km")
+    """
+    
+    __slots__ = ('ids', 'vi_do', 'kinh_do', 'loai_ids', '_toa_do_radian')
+    
+    def __init__(self, ids=None, vi_do=None, kinh_do=None, loai_ids=None):
+        self.ids = ids if ids is not None else array('q')
+        self.vi_do = vi_do if vi_do is not None else array('d')
+        self.kinh_do = kinh_do if kinh_do is not None else array('d')
+        self.loai_ids = loai_ids if loai_ids is not None else array('q')
+        self._toa_do_radian = None
+    
+    @classmethod
+    def tu_danh_sach(cls, cac_dong):
+        """
+        Tao tap tu cac dong (id, vi_do, kinh_do, loai_id)
+        
+        GIAI THICH:
+        - Dung truc tiep voi ket qua values_list cua QuerySet (co the la
+          .iterator() de khong giu toan bo ket qua trong bo nho)
+        
+        VI DU:
+            >>> tap = TapDiemCuaHang.tu_danh_sach(
+            ...     qs.values_list('id', 'vi_do', 'kinh_do', 'loai_id').iterator())
+        """
+        tap = cls()
+        for id_cua_hang, vi_do, kinh_do, loai_id in cac_dong:
+            tap.ids.append(id_cua_hang)
+            tap.vi_do.append(vi_do)
+            tap.kinh_do.append(kinh_do)
+            tap.loai_ids.append(loai_id)
+        return tap
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def __getitem__(self, i):
+        return self.vi_do[i], self.kinh_do[i], self.ids[i]
+    
+    def __iter__(self):
+        return zip(self.vi_do, self.kinh_do, self.ids)
+    
+    def them(self, id_cua_hang, vi_do, kinh_do, loai_id):
+        """Them mot cua hang vao cuoi tap"""
+        self.ids.append(id_cua_hang)
+        self.vi_do.append(vi_do)
+        self.kinh_do.append(kinh_do)
+        self.loai_ids.append(loai_id)
+        self._toa_do_radian = None
+    
+    def loc_theo_loai(self, loai_id):
+        """Tra ve tap con chi gom cac cua hang thuoc loai loai_id"""
+        tap_con = TapDiemCuaHang()
+        for i, loai in enumerate(self.loai_ids):
+            if loai == loai_id:
+                tap_con.them(self.ids[i], self.vi_do[i], self.kinh_do[i], loai)
+        return tap_con
+    
+    def loc_theo_id(self, cac_id):
+        """Tra ve tap con chi gom cac cua hang co id thuoc cac_id (giu thu tu trong tap)"""
+        cac_id = set(cac_id)
+        tap_con = TapDiemCuaHang()
+        for i, id_cua_hang in enumerate(self.ids):
+            if id_cua_hang in cac_id:
+                tap_con.them(id_cua_hang, self.vi_do[i], self.kinh_do[i], self.loai_ids[i])
+        return tap_con
+    
+    def toa_do_radian(self):
+        """ToaDoRadian cua tap (tinh mot lan, dung lai cho cac truy van sau)"""
+        if self._toa_do_radian is None:
+            if np is not None:
+                self._toa_do_radian = ToaDoRadian(
+                    np.radians(np.frombuffer(self.vi_do, dtype=float)),
+                    np.radians(np.frombuffer(self.kinh_do, dtype=float))
+                )
+            else:
+                self._toa_do_radian = ToaDoRadian(
+                    [math.radians(v) for v in self.vi_do],
+                    [math.radians(v) for v in self.kinh_do]
+                )
+        return self._toa_do_radian
 
 
 class CongCuGIS:
@@ -15,6 +203,10 @@ class CongCuGIS:
     # Ban kinh trai dat theo kilometers
     BAN_KINH_TRAI_DAT_KM = 6371.0
     
+    # 8 huong chinh theo thu tu bearing 0°, 45°, ..., 315°
+    CAC_HUONG_CHINH = ['Bắc', 'Đông Bắc', 'Đông', 'Đông Nam',
+                       'Nam', 'Tây Nam', 'Tây', 'Tây Bắc']
+    
     @staticmethod
     def tinh_khoang_cach_haversine(vi_do_1, kinh_do_1, vi_do_2, kinh_do_2):
         """
@@ -55,19 +247,198 @@ class CongCuGIS:
         return khoang_cach
     
     @staticmethod
-    def tim_diem_gan_nhat(vi_do_goc, kinh_do_goc, danh_sach_diem):
+    def chuyen_doi_radian(danh_sach_diem):
+        """
+        Chuyen danh sach diem (do) sang ToaDoRadian de tinh hang loat
+        
+        THAM SO:
+            danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do, ...) theo do
+        
+        TRA VE:
+            Doi tuong ToaDoRadian
+        """
+        if isinstance(danh_sach_diem, ToaDoRadian):
+            return danh_sach_diem
+        if isinstance(danh_sach_diem, TapDiemCuaHang):
+            return danh_sach_diem.toa_do_radian()
+        
+        if np is not None:
+            so_diem = len(danh_sach_diem)
+            vi_do = np.fromiter((diem[0] for diem in danh_sach_diem), dtype=float, count=so_diem)
+            kinh_do = np.fromiter((diem[1] for diem in danh_sach_diem), dtype=float, count=so_diem)
+            return ToaDoRadian(np.radians(vi_do), np.radians(kinh_do))
+        
+        return ToaDoRadian(
+            [math.radians(diem[0]) for diem in danh_sach_diem],
+            [math.radians(diem[1]) for diem in danh_sach_diem]
+        )
+    
+    @staticmethod
+    def tinh_khoang_cach_mot_nhieu(vi_do_goc, kinh_do_goc, diem_dich):
+        """
+        Tinh khoang cach Haversine tu mot diem goc den nhieu diem dich
+        
+        GIAI THICH:
+        - Cung cong thuc voi tinh_khoang_cach_haversine nhung tinh cho ca
+          day diem trong mot lan goi
+        - Co NumPy: tinh vector hoa tren mang, khong co vong lap Python
+        - Khong co NumPy: mot vong lap, cos(vi do) cua diem dich da tinh san
+        - diem_dich co the la ToaDoRadian da chuan bi truoc de bo qua
+          buoc chuyen doi khi truy van lap lai
+        
+        THAM SO:
+            vi_do_goc, kinh_do_goc: Toa do diem goc (do)
+            diem_dich: Danh sach tuple (vi_do, kinh_do, ...) hoac ToaDoRadian
+        
+        TRA VE:
+            Mang NumPy (hoac list) khoang cach theo kilometers, cung thu tu
+            voi diem_dich
+            
+        VI DU:
+            >>> diem = [(16.05, 108.20), (16.10, 108.25)]
+            >>> kc = tinh_khoang_cach_mot_nhieu(16.055, 108.205, diem)
+        """
+        vi_do_goc_rad = math.radians(vi_do_goc)
+        return CongCuGIS._khoang_cach_tu_radian(
+            vi_do_goc_rad, math.radians(kinh_do_goc), math.cos(vi_do_goc_rad),
+            CongCuGIS.chuyen_doi_radian(diem_dich)
+        )
+    
+    @staticmethod
+    def _khoang_cach_tu_radian(vi_do_goc_rad, kinh_do_goc_rad, cos_vi_do_goc, toa_do):
+        """Khoang cach (km) tu mot diem goc da o dang radian den mot ToaDoRadian"""
+        if np is not None:
+            a = np.sin((toa_do.vi_do - vi_do_goc_rad) / 2) ** 2 + \
+                cos_vi_do_goc * toa_do.cos_vi_do * np.sin((toa_do.kinh_do - kinh_do_goc_rad) / 2) ** 2
+            return CongCuGIS.BAN_KINH_TRAI_DAT_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        hai_r = 2 * CongCuGIS.BAN_KINH_TRAI_DAT_KM
+        ket_qua = []
+        for vi_do, kinh_do, cos_vi_do in zip(toa_do.vi_do, toa_do.kinh_do, toa_do.cos_vi_do):
+            a = sin((vi_do - vi_do_goc_rad) / 2) ** 2 + \
+                cos_vi_do_goc * cos_vi_do * sin((kinh_do - kinh_do_goc_rad) / 2) ** 2
+            ket_qua.append(hai_r * asin(sqrt(min(a, 1.0))))
+        return ket_qua
+    
+    @staticmethod
+    def tinh_ma_tran_khoang_cach(diem_goc, diem_dich):
+        """
+        Tinh ma tran khoang cach Haversine giua N diem goc va M diem dich
+        
+        GIAI THICH:
+        - Phan tu [i][j] la khoang cach tu diem goc i den diem dich j
+        - Co NumPy: broadcast mang (N, 1) voi (1, M), bo nho tam O(N * M)
+        - Khong co NumPy: moi hang goi tinh_khoang_cach_mot_nhieu
+        - Ca hai tham so deu nhan ToaDoRadian da chuan bi truoc
+        - Ma tran lon: dung tinh_ma_tran_khoang_cach_theo_khoi
+        
+        THAM SO:
+            diem_goc: Danh sach tuple (vi_do, kinh_do, ...) hoac ToaDoRadian
+            diem_dich: Danh sach tuple (vi_do, kinh_do, ...) hoac ToaDoRadian
+        
+        TRA VE:
+            Mang NumPy kich thuoc (N, M) hoac list cac list
+            
+        VI DU:
+            >>> goc = [(16.05, 108.20), (16.07, 108.22)]
+            >>> dich = [(16.06, 108.21), (16.10, 108.25), (15.88, 108.34)]
+            >>> ma_tran = tinh_ma_tran_khoang_cach(goc, dich)  # 2 x 3
+        """
+        goc = CongCuGIS.chuyen_doi_radian(diem_goc)
+        dich = CongCuGIS.chuyen_doi_radian(diem_dich)
+        
+        if np is not None:
+            vi_do_goc = goc.vi_do[:, np.newaxis]
+            kinh_do_goc = goc.kinh_do[:, np.newaxis]
+            cos_vi_do_goc = goc.cos_vi_do[:, np.newaxis]
+            a = np.sin((dich.vi_do - vi_do_goc) / 2) ** 2 + \
+                cos_vi_do_goc * dich.cos_vi_do * np.sin((dich.kinh_do - kinh_do_goc) / 2) ** 2
+            return CongCuGIS.BAN_KINH_TRAI_DAT_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        
+        return [
+            CongCuGIS._khoang_cach_tu_radian(vi_do, kinh_do, cos_vi_do, dich)
+            for vi_do, kinh_do, cos_vi_do in zip(goc.vi_do, goc.kinh_do, goc.cos_vi_do)
+        ]
+    
+    @staticmethod
+    def tinh_ma_tran_khoang_cach_theo_khoi(diem_goc, diem_dich, so_o_moi_khoi=1_000_000):
+        """
+        Tinh ma tran khoang cach theo tung khoi hang de gioi han bo nho tam
+        
+        GIAI THICH:
+        - Chuyen doi radian ca hai phia mot lan, sau do moi khoi gom
+          so_o_moi_khoi // M diem goc (it nhat 1) duoc tinh bang
+          tinh_ma_tran_khoang_cach
+        - Bo nho tam cua NumPy chi ty le voi kich thuoc mot khoi, khong
+          phai N * M; nguoi goi ghi tung khoi vao noi can (vd: payload phang)
+        
+        THAM SO:
+            diem_goc, diem_dich: Danh sach tuple (vi_do, kinh_do, ...) hoac ToaDoRadian
+            so_o_moi_khoi: So o ma tran toi da moi khoi
+        
+        TRA VE:
+            Generator cac tuple (chi_so_hang_dau, khoi); khoi la mang NumPy
+            (so_hang, M) hoac list cac list
+        
+        VI DU:
+            >>> for hang_dau, khoi in tinh_ma_tran_khoang_cach_theo_khoi(goc, dich):
+            ...     ket_qua[hang_dau:hang_dau + len(khoi)] = khoi
+        """
+        goc = CongCuGIS.chuyen_doi_radian(diem_goc)
+        dich = CongCuGIS.chuyen_doi_radian(diem_dich)
+        so_hang_moi_khoi = max(1, so_o_moi_khoi // max(len(dich), 1))
+        
+        for hang_dau in range(0, len(goc), so_hang_moi_khoi):
+            cac_hang = range(hang_dau, min(hang_dau + so_hang_moi_khoi, len(goc)))
+            yield hang_dau, CongCuGIS.tinh_ma_tran_khoang_cach(goc.tap_con(cac_hang), dich)
+    
+    @staticmethod
+    def tinh_khoang_cach_tung_cap(cac_cap_diem):
+        """
+        Tinh khoang cach Haversine cho nhieu cap diem doc lap trong mot lan goi
+        
+        GIAI THICH:
+        - Cap thu i: (vi_do_1, kinh_do_1, vi_do_2, kinh_do_2) - khac voi
+          tinh_khoang_cach_mot_nhieu, moi cap co diem goc rieng
+        - Co NumPy: vector hoa tren 4 mang; khong co: goi
+          tinh_khoang_cach_haversine cho tung cap
+        
+        THAM SO:
+            cac_cap_diem: Danh sach tuple (vi_do_1, kinh_do_1, vi_do_2, kinh_do_2)
+        
+        TRA VE:
+            Mang NumPy (hoac list) khoang cach theo kilometers
+        
+        VI DU:
+            >>> kc = tinh_khoang_cach_tung_cap([(16.05, 108.20, 16.06, 108.21),
+            ...                                  (10.77, 106.70, 21.03, 105.85)])
+        """
+        if np is None:
+            return [CongCuGIS.tinh_khoang_cach_haversine(*cap) for cap in cac_cap_diem]
+        
+        vi_do_1, kinh_do_1, vi_do_2, kinh_do_2 = np.radians(
+            np.array(cac_cap_diem, dtype=float).reshape(-1, 4)).T
+        a = np.sin((vi_do_2 - vi_do_1) / 2) ** 2 + \
+            np.cos(vi_do_1) * np.cos(vi_do_2) * np.sin((kinh_do_2 - kinh_do_1) / 2) ** 2
+        return CongCuGIS.BAN_KINH_TRAI_DAT_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    
+    @staticmethod
+    def tim_diem_gan_nhat(vi_do_goc, kinh_do_goc, danh_sach_diem, toa_do_radian=None):
         """
         Tim diem gan nhat tu mot danh sach cac diem
         
         GIAI THICH:
-        - Duyet qua tat ca cac diem trong danh sach
-        - Tinh khoang cach tu diem goc den tung diem
-        - Luu lai diem co khoang cach nho nhat
+        - Tinh khoang cach tu diem goc den tat ca cac diem trong mot lan
+          goi tinh_khoang_cach_mot_nhieu (vector hoa neu co NumPy)
+        - Lay diem co khoang cach nho nhat (diem dau tien neu bang nhau)
         - Do phuc tap: O(n) voi n la so luong diem
         
         THAM SO:
             vi_do_goc, kinh_do_goc: Toa do diem goc
-            danh_sach_diem: Danh sach cac tuple [(vi_do, kinh_do, du_lieu), ...]
+            danh_sach_diem: Danh sach cac tuple [(vi_do, kinh_do, du_lieu), ...] hoac TapDiemCuaHang
+            toa_do_radian: ToaDoRadian cua danh_sach_diem da chuan bi truoc
+                           (tuy chon, dung lai khi truy van nhieu lan)
         
         TRA VE:
             Tuple cua (diem_gan_nhat, khoang_cach) hoac (None, None) neu khong co diem
@@ -80,20 +451,17 @@ class CongCuGIS:
         if not danh_sach_diem:
             return None, None
         
-        khoang_cach_nho_nhat = float('inf')
-        diem_gan_nhat = None
+        cac_khoang_cach = CongCuGIS.tinh_khoang_cach_mot_nhieu(
+            vi_do_goc, kinh_do_goc,
+            toa_do_radian if toa_do_radian is not None else danh_sach_diem
+        )
         
-        for diem in danh_sach_diem:
-            vi_do, kinh_do = diem[0], diem[1]
-            khoang_cach = CongCuGIS.tinh_khoang_cach_haversine(
-                vi_do_goc, kinh_do_goc, vi_do, kinh_do
-            )
-            
-            if khoang_cach < khoang_cach_nho_nhat:
-                khoang_cach_nho_nhat = khoang_cach
-                diem_gan_nhat = diem
+        if np is not None:
+            chi_so = int(np.argmin(cac_khoang_cach))
+        else:
+            chi_so = min(range(len(cac_khoang_cach)), key=cac_khoang_cach.__getitem__)
         
-        return diem_gan_nhat, khoang_cach_nho_nhat
+        return danh_sach_diem[chi_so], float(cac_khoang_cach[chi_so])
     
     @staticmethod
     def kiem_tra_diem_trong_da_giac(vi_do_diem, kinh_do_diem, toa_do_da_giac):
@@ -108,6 +476,7 @@ class CongCuGIS:
           + Neu so lan cat la chan => diem nam ngoai
         - Do phuc tap: O(m) voi m la so canh cua da giac
         - Hoat dong voi polygon loi (concave) va polygon lom (convex)
+        - Kiem tra nhieu diem voi cung da giac: dung DaGiacChuanBi
         
         THAM SO:
             vi_do_diem, kinh_do_diem: Toa do diem can kiem tra
@@ -200,6 +569,8 @@ class CongCuGIS:
           + Goc = 2π * i / N (voi i tu 0 den N-1)
           + Delta latitude = ban_kinh * cos(goc)
           + Delta longitude = ban_kinh * sin(goc) / cos(latitude)
+        - cos(goc), sin(goc) chi phu thuoc N nen duoc tinh mot lan cho moi N
+          (_bang_luong_giac_duong_tron); nhieu tam: tao_nhieu_vung_dem_hinh_tron
         - Ket qua la xap xi hinh tron (da giac N canh)
         
         THAM SO:
@@ -214,24 +585,78 @@ class CongCuGIS:
             >>> vung_dem = tao_vung_dem_hinh_tron(16.05, 108.20, 5.0, so_diem=16)
             >>> print(f"Vung dem co {len(vung_dem)} diem")
         """
-        danh_sach_diem_tron = []
+        cac_cos, cac_sin = CongCuGIS._bang_luong_giac_duong_tron(so_diem)
         
-        for i in range(so_diem):
-            # Goc theo radian
-            goc = 2 * math.pi * i / so_diem
-            
-            # Tinh do chenh lech theo km
-            delta_vi_do = ban_kinh_km / CongCuGIS.BAN_KINH_TRAI_DAT_KM * math.cos(goc)
-            delta_kinh_do = ban_kinh_km / (CongCuGIS.BAN_KINH_TRAI_DAT_KM * 
-                                           math.cos(math.radians(vi_do_tam))) * math.sin(goc)
-            
-            # Chuyen doi sang do
-            vi_do_moi = vi_do_tam + math.degrees(delta_vi_do)
-            kinh_do_moi = kinh_do_tam + math.degrees(delta_kinh_do)
-            
-            danh_sach_diem_tron.append((vi_do_moi, kinh_do_moi))
+        # Do chenh lech (radian) tren moi don vi cos/sin cua goc
+        he_so_vi_do = ban_kinh_km / CongCuGIS.BAN_KINH_TRAI_DAT_KM
+        he_so_kinh_do = ban_kinh_km / (CongCuGIS.BAN_KINH_TRAI_DAT_KM * math.cos(math.radians(vi_do_tam)))
         
-        return danh_sach_diem_tron
+        # Chuyen doi sang do
+        return [(vi_do_tam + math.degrees(he_so_vi_do * cos_goc),
+                 kinh_do_tam + math.degrees(he_so_kinh_do * sin_goc))
+                for cos_goc, sin_goc in zip(cac_cos, cac_sin)]
+    
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _bang_luong_giac_duong_tron(so_diem):
+        """
+        Bang cos/sin cua so_diem goc deu nhau tren duong tron don vi
+        
+        GIAI THICH:
+        - Goc = 2π * i / N chi phu thuoc so diem, khong phu thuoc tam hay
+          ban kinh => tinh mot lan cho moi so_diem va dung lai
+        
+        TRA VE:
+            Tuple (cac_cos, cac_sin), moi phan tu la tuple do dai so_diem
+        """
+        cac_goc = [2 * math.pi * i / so_diem for i in range(so_diem)]
+        return tuple(math.cos(goc) for goc in cac_goc), tuple(math.sin(goc) for goc in cac_goc)
+    
+    @staticmethod
+    def tao_nhieu_vung_dem_hinh_tron(cac_tam, ban_kinh_km, so_diem=32):
+        """
+        Tao vung dem hinh tron cho nhieu tam trong mot lan goi
+        
+        GIAI THICH:
+        - Cung cong thuc voi tao_vung_dem_hinh_tron, bang cos/sin dung chung
+        - Co NumPy: tinh mot mang toa do (N, so_diem, 2) bang broadcast,
+          khong co vong lap Python theo tung tam
+        
+        THAM SO:
+            cac_tam: Danh sach tuple (vi_do, kinh_do, ...) hoac TapDiemCuaHang
+            ban_kinh_km: Ban kinh chung (km) hoac day ban kinh cho tung tam
+            so_diem: So diem tren moi duong tron
+        
+        TRA VE:
+            Mang NumPy (N, so_diem, 2) cac cap (vi_do, kinh_do), hoac list
+            cac danh sach diem neu khong co NumPy
+        
+        VI DU:
+            >>> vung_dem = tao_nhieu_vung_dem_hinh_tron(tap_cua_hang, 1.0)
+            >>> vung_dem[0]   # duong tron quanh cua hang dau tien
+        """
+        if np is None:
+            if isinstance(ban_kinh_km, (int, float)):
+                ban_kinh_km = [ban_kinh_km] * len(cac_tam)
+            return [CongCuGIS.tao_vung_dem_hinh_tron(tam[0], tam[1], ban_kinh, so_diem)
+                    for tam, ban_kinh in zip(cac_tam, ban_kinh_km)]
+        
+        if isinstance(cac_tam, TapDiemCuaHang):
+            vi_do_tam = np.frombuffer(cac_tam.vi_do, dtype=float)
+            kinh_do_tam = np.frombuffer(cac_tam.kinh_do, dtype=float)
+        else:
+            vi_do_tam = np.fromiter((tam[0] for tam in cac_tam), dtype=float, count=len(cac_tam))
+            kinh_do_tam = np.fromiter((tam[1] for tam in cac_tam), dtype=float, count=len(cac_tam))
+        
+        cac_cos, cac_sin = (np.array(bang) for bang in CongCuGIS._bang_luong_giac_duong_tron(so_diem))
+        ban_kinh = np.asarray(ban_kinh_km, dtype=float).reshape(-1, 1)
+        he_so_vi_do = ban_kinh / CongCuGIS.BAN_KINH_TRAI_DAT_KM
+        he_so_kinh_do = ban_kinh / (CongCuGIS.BAN_KINH_TRAI_DAT_KM * np.cos(np.radians(vi_do_tam)))[:, np.newaxis]
+        
+        ket_qua = np.empty((len(vi_do_tam), so_diem, 2))
+        ket_qua[:, :, 0] = vi_do_tam[:, np.newaxis] + np.degrees(he_so_vi_do * cac_cos)
+        ket_qua[:, :, 1] = kinh_do_tam[:, np.newaxis] + np.degrees(he_so_kinh_do * cac_sin)
+        return ket_qua
     
     @staticmethod
     def tinh_diem_trung_tam(danh_sach_diem):
@@ -244,7 +669,7 @@ class CongCuGIS:
         - Khong phai la centroid hinh hoc chinh xac cho da giac phuc tap
         
         THAM SO:
-            danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do)
+            danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do) hoac TapDiemCuaHang
         
         TRA VE:
             Tuple cua (vi_do_trung_tam, kinh_do_trung_tam)
@@ -257,8 +682,12 @@ class CongCuGIS:
         if not danh_sach_diem:
             return None, None
         
-        tong_vi_do = sum(diem[0] for diem in danh_sach_diem)
-        tong_kinh_do = sum(diem[1] for diem in danh_sach_diem)
+        if isinstance(danh_sach_diem, TapDiemCuaHang):
+            tong_vi_do = math.fsum(danh_sach_diem.vi_do)
+            tong_kinh_do = math.fsum(danh_sach_diem.kinh_do)
+        else:
+            tong_vi_do = sum(diem[0] for diem in danh_sach_diem)
+            tong_kinh_do = sum(diem[1] for diem in danh_sach_diem)
         
         vi_do_trung_tam = tong_vi_do / len(danh_sach_diem)
         kinh_do_trung_tam = tong_kinh_do / len(danh_sach_diem)
@@ -303,6 +732,42 @@ class CongCuGIS:
         
         return huong_do
     
+    @staticmethod
+    def tinh_huong_di_tung_cap(cac_cap_diem):
+        """
+        Tinh huong di cho nhieu cap diem trong mot lan goi (vector hoa neu co NumPy)
+        
+        THAM SO:
+            cac_cap_diem: Danh sach tuple (vi_do_1, kinh_do_1, vi_do_2, kinh_do_2)
+        
+        TRA VE:
+            Mang NumPy (hoac list) goc bearing theo do (0-360°)
+        """
+        if np is None:
+            return [CongCuGIS.tinh_huong_di(*cap) for cap in cac_cap_diem]
+        
+        vi_do_1, kinh_do_1, vi_do_2, kinh_do_2 = np.array(cac_cap_diem, dtype=float).reshape(-1, 4).T
+        vi_do_1_rad = np.radians(vi_do_1)
+        vi_do_2_rad = np.radians(vi_do_2)
+        chenh_lech_kinh_do_rad = np.radians(kinh_do_2 - kinh_do_1)
+        
+        x = np.sin(chenh_lech_kinh_do_rad) * np.cos(vi_do_2_rad)
+        y = np.cos(vi_do_1_rad) * np.sin(vi_do_2_rad) - \
+            np.sin(vi_do_1_rad) * np.cos(vi_do_2_rad) * np.cos(chenh_lech_kinh_do_rad)
+        
+        return (np.degrees(np.arctan2(x, y)) + 360) % 360
+    
+    @staticmethod
+    def ten_huong_di(huong_do):
+        """
+        Doi goc bearing thanh ten mot trong 8 huong chinh
+        
+        VI DU:
+            >>> CongCuGIS.ten_huong_di(45.0)
+            'Đông Bắc'
+        """
+        return CongCuGIS.CAC_HUONG_CHINH[int((huong_do + 22.5) // 45) % 8]
+    
     @staticmethod
     def lay_khung_bao(danh_sach_diem, khoang_dem_km=0):
         """
@@ -315,7 +780,7 @@ class CongCuGIS:
         - Huu ich khi fit map bounds de hien thi tat ca cac diem
         
         THAM SO:
-            danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do)
+            danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do) hoac TapDiemCuaHang
             khoang_dem_km: Khoang dem them theo kilometers
         
         TRA VE:
@@ -329,8 +794,11 @@ class CongCuGIS:
         if not danh_sach_diem:
             return None
         
-        cac_vi_do = [p[0] for p in danh_sach_diem]
-        cac_kinh_do = [p[1] for p in danh_sach_diem]
+        if isinstance(danh_sach_diem, TapDiemCuaHang):
+            cac_vi_do, cac_kinh_do = danh_sach_diem.vi_do, danh_sach_diem.kinh_do
+        else:
+            cac_vi_do = [p[0] for p in danh_sach_diem]
+            cac_kinh_do = [p[1] for p in danh_sach_diem]
         
         vi_do_min = min(cac_vi_do)
         vi_do_max = max(cac_vi_do)
@@ -352,21 +820,71 @@ class CongCuGIS:
         return (vi_do_min, kinh_do_min), (vi_do_max, kinh_do_max)
     
     @staticmethod
-    def tim_diem_trong_ban_kinh(vi_do_goc, kinh_do_goc, danh_sach_diem, ban_kinh_km):
+    def tinh_khung_bao_ban_kinh(vi_do_tam, kinh_do_tam, ban_kinh_km):
+        """
+        Tinh khung bao chac chan chua tron vong tron ban kinh cho truoc
+        
+        GIAI THICH:
+        - Khac voi lay_khung_bao (xap xi theo cos vi do trung binh), khung nay
+          khong bao gio bo sot diem nao co khoang cach Haversine <= ban kinh
+        - Chenh lech vi do = ban_kinh / R (radian)
+        - Chenh lech kinh do lon nhat = asin(sin(ban_kinh / R) / cos(vi_do))
+        - Neu vong tron chua cuc Bac/Nam thi kinh do mo rong toan bo [-180, 180]
+        - Neu vuot kinh tuyen 180 thi kinh do cung mo rong toan bo [-180, 180]
+          (it gap, chap nhan khung rong hon de don gian)
+        - Dung lam buoc loc so bo (prefilter) truoc khi tinh khoang cach chinh xac
+        
+        THAM SO:
+            vi_do_tam, kinh_do_tam: Toa do tam (do)
+            ban_kinh_km: Ban kinh theo kilometers
+        
+        TRA VE:
+            Tuple cua ((vi_do_min, kinh_do_min), (vi_do_max, kinh_do_max))
+            
+        VI DU:
+            >>> khung = tinh_khung_bao_ban_kinh(16.05, 108.20, 5.0)
+        """
+        goc = ban_kinh_km / CongCuGIS.BAN_KINH_TRAI_DAT_KM
+        # Noi them mot chut de bu sai so lam tron
+        sai_so = 1e-9
+        vi_do_tam_rad = math.radians(vi_do_tam)
+        vi_do_min = vi_do_tam_rad - goc
+        vi_do_max = vi_do_tam_rad + goc
+        
+        if vi_do_min <= -math.pi / 2 or vi_do_max >= math.pi / 2:
+            return ((max(math.degrees(vi_do_min), -90.0) - sai_so, -180.0),
+                    (min(math.degrees(vi_do_max), 90.0) + sai_so, 180.0))
+        
+        chenh_lech_kinh_do = math.degrees(math.asin(math.sin(goc) / math.cos(vi_do_tam_rad)))
+        kinh_do_min = kinh_do_tam - chenh_lech_kinh_do - sai_so
+        kinh_do_max = kinh_do_tam + chenh_lech_kinh_do + sai_so
+        if kinh_do_min < -180.0 or kinh_do_max > 180.0:
+            kinh_do_min, kinh_do_max = -180.0, 180.0
+        
+        return ((math.degrees(vi_do_min) - sai_so, kinh_do_min),
+                (math.degrees(vi_do_max) + sai_so, kinh_do_max))
+    
+    @staticmethod
+    def tim_diem_trong_ban_kinh(vi_do_goc, kinh_do_goc, danh_sach_diem, ban_kinh_km,
+                                toa_do_radian=None):
         """
         Tim tat ca cac diem nam trong ban kinh cho truoc
         
         GIAI THICH:
-        - Duyet qua tung diem trong danh sach
-        - Tinh khoang cach tu diem goc den tung diem
-        - Chi giu lai cac diem co khoang cach <= ban kinh
-        - Sap xep ket qua theo khoang cach (gan nhat truoc)
-        - Do phuc tap: O(n log n) voi n la so diem (do sorting)
+        - Loc (filter): so sanh toa do voi khung bao chac chan cua vong tron
+          (tinh_khung_bao_ban_kinh) - chi la phep so sanh, vector hoa neu co NumPy
+        - Tinh chinh xac (refine): chi tinh Haversine cho cac diem lot qua khung,
+          giu lai cac diem co khoang cach <= ban kinh
+        - Khung bao khong bo sot diem nao nen ket qua giong het cach quet toan bo
+        - Sap xep ket qua theo khoang cach (gan nhat truoc, on dinh khi bang nhau)
+        - Do phuc tap: O(n) phep so sanh + O(m) luong giac voi m la so diem trong khung
         
         THAM SO:
             vi_do_goc, kinh_do_goc: Toa do diem goc
-            danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do, du_lieu)
+            danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do, du_lieu) hoac TapDiemCuaHang
             ban_kinh_km: Ban kinh tim kiem theo kilometers
+            toa_do_radian: ToaDoRadian cua danh_sach_diem da chuan bi truoc
+                           (tuy chon, dung lai khi truy van nhieu lan)
         
         TRA VE:
             Danh sach cac dict {'diem': ..., 'khoang_cach': ...} da sap xep
@@ -377,19 +895,41 @@ class CongCuGIS:
             >>> for kq in ket_qua:
             ...     print(f"{kq['diem'][2]}: {kq['khoang_cach']:.2f} km")
         """
-        ket_qua = []
+        if not danh_sach_diem or ban_kinh_km < 0:
+            return []
         
-        for diem in danh_sach_diem:
-            vi_do, kinh_do = diem[0], diem[1]
-            khoang_cach = CongCuGIS.tinh_khoang_cach_haversine(
-                vi_do_goc, kinh_do_goc, vi_do, kinh_do
-            )
-            
-            if khoang_cach <= ban_kinh_km:
-                ket_qua.append({
-                    'diem': diem,
-                    'khoang_cach': khoang_cach
-                })
+        toa_do = CongCuGIS.chuyen_doi_radian(
+            toa_do_radian if toa_do_radian is not None else danh_sach_diem
+        )
+        
+        # Buoc loc: chi giu cac diem nam trong khung bao cua vong tron
+        ung_vien = toa_do.loc_trong_khung(
+            CongCuGIS.tinh_khung_bao_ban_kinh(vi_do_goc, kinh_do_goc, ban_kinh_km)
+        )
+        if len(ung_vien) == 0:
+            return []
+        
+        # Buoc tinh chinh xac: Haversine chi cho cac ung vien
+        vi_do_goc_rad = math.radians(vi_do_goc)
+        cac_khoang_cach = CongCuGIS._khoang_cach_tu_radian(
+            vi_do_goc_rad, math.radians(kinh_do_goc), math.cos(vi_do_goc_rad),
+            toa_do.tap_con(ung_vien)
+        )
+        
+        if np is not None:
+            vi_tri_trong = np.flatnonzero(cac_khoang_cach <= ban_kinh_km)
+            # Sap xep theo khoang cach
+            vi_tri_trong = vi_tri_trong[np.argsort(cac_khoang_cach[vi_tri_trong], kind='stable')]
+            return [{
+                'diem': danh_sach_diem[i],
+                'khoang_cach': float(khoang_cach)
+            } for i, khoang_cach in zip(ung_vien[vi_tri_trong].tolist(),
+                                        cac_khoang_cach[vi_tri_trong].tolist())]
+        
+        ket_qua = [{
+            'diem': danh_sach_diem[i],
+            'khoang_cach': khoang_cach
+        } for i, khoang_cach in zip(ung_vien, cac_khoang_cach) if khoang_cach <= ban_kinh_km]
         
         # Sap xep theo khoang cach
         ket_qua.sort(key=lambda x: x['khoang_cach'])
@@ -397,23 +937,28 @@ class CongCuGIS:
         return ket_qua
     
     @staticmethod
-    def don_gian_hoa_duong(danh_sach_diem, do_chiu_sai_so=0.0001):
+    def don_gian_hoa_duong(danh_sach_diem, do_chiu_sai_so=0.0001, thuat_toan='douglas_peucker'):
         """
-        Don gian hoa duong di bang thuat toan Douglas-Peucker
+        Don gian hoa duong di bang thuat toan Douglas-Peucker (hoac Visvalingam-Whyatt)
         
         GIAI THICH:
         - Thuat toan Douglas-Peucker giam so diem trong duong di
           ma van giu nguyen hinh dang tong the:
           1. Noi diem dau va diem cuoi
           2. Tim diem co khoang cach vuong goc lon nhat den duong noi
-          3. Neu khoang cach > nguong => giu diem do, de quy 2 doan
+          3. Neu khoang cach > nguong => giu diem do, xet tiep 2 doan
           4. Neu khoang cach <= nguong => loai bo tat ca diem giua
+        - Chay bang ngan xep chi so (khong de quy, khong cat list), xem
+          tinh_mat_na_don_gian_hoa; ket qua giong phien ban de quy truoc day
+        - thuat_toan='visvalingam': bo dan diem tao tam giac dien tich nho nhat
+          (vong lap heap Python, cham hon Douglas-Peucker voi route dai)
         - Do phuc tap: O(n log n) best case, O(n²) worst case
         - Huu ich de giam dung luong du lieu route tu GPS
         
         THAM SO:
             danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do)
             do_chiu_sai_so: Nguong sai so cho phep (cang lon cang don gian)
+            thuat_toan: 'douglas_peucker' (mac dinh) hoac 'visvalingam'
         
         TRA VE:
             Danh sach diem da duoc don gian hoa
@@ -426,48 +971,832 @@ class CongCuGIS:
         if len(danh_sach_diem) < 3:
             return danh_sach_diem
         
-        def tinh_khoang_cach_vuong_goc(diem, diem_dau_duong, diem_cuoi_duong):
-            """Tinh khoang cach vuong goc tu diem den duong thang"""
-            x0, y0 = diem[1], diem[0]  # kinh_do, vi_do
-            x1, y1 = diem_dau_duong[1], diem_dau_duong[0]
-            x2, y2 = diem_cuoi_duong[1], diem_cuoi_duong[0]
+        mat_na = CongCuGIS.tinh_mat_na_don_gian_hoa(danh_sach_diem, do_chiu_sai_so, thuat_toan)
+        return [diem for diem, giu in zip(danh_sach_diem, mat_na) if giu]
+    
+    @staticmethod
+    def tinh_mat_na_don_gian_hoa(danh_sach_diem, do_chiu_sai_so=0.0001, thuat_toan='douglas_peucker'):
+        """
+        Tinh mat na giu/bo cho tung diem khi don gian hoa duong
+        
+        GIAI THICH:
+        - Douglas-Peucker: ngan xep cac doan (chi_so_dau, chi_so_cuoi); moi
+          doan tinh khoang cach vuong goc cua ca day diem giua mot lan
+          (vector hoa neu co NumPy), khong sao chep list, khong de quy nen
+          khong vuot gioi han de quy voi route GPS dai
+        - Visvalingam-Whyatt: heap theo dien tich tam giac hieu dung
+          (diem truoc, diem, diem sau); lien tuc bo diem co dien tich nho nhat
+          cho den khi dien tich nho nhat >= do_chiu_sai_so²
+        - Diem dau va diem cuoi luon duoc giu
+        
+        THAM SO:
+            danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do)
+            do_chiu_sai_so: Nguong khoang cach (do); voi Visvalingam nguong
+                            dien tich la do_chiu_sai_so² (do²)
+            thuat_toan: 'douglas_peucker' (mac dinh) hoac 'visvalingam'
+        
+        TRA VE:
+            Mang NumPy bool (hoac list bool) cung do dai voi danh_sach_diem,
+            True la diem duoc giu
             
-            tu_so = abs((y2 - y1) * x0 - (x2 - x1) * y0 + x2 * y1 - y2 * x1)
-            mau_so = math.sqrt((y2 - y1)**2 + (x2 - x1)**2)
+        VI DU:
+            >>> mat_na = tinh_mat_na_don_gian_hoa(route, 0.001)
+            >>> so_diem_giu = sum(mat_na)
+        """
+        so_diem = len(danh_sach_diem)
+        if thuat_toan not in ('douglas_peucker', 'visvalingam'):
+            raise ValueError(f'Thuat toan khong ho tro: {thuat_toan}')
+        
+        cac_x = [diem[1] for diem in danh_sach_diem]  # kinh_do
+        cac_y = [diem[0] for diem in danh_sach_diem]  # vi_do
+        if np is not None:
+            mang_x = np.array(cac_x, dtype=float)
+            mang_y = np.array(cac_y, dtype=float)
+            mat_na = np.zeros(so_diem, dtype=bool)
+        else:
+            mat_na = [False] * so_diem
+        
+        if so_diem < 3:
+            mat_na[:] = [True] * so_diem
+            return mat_na
+        mat_na[0] = mat_na[-1] = True
+        
+        if thuat_toan == 'visvalingam':
+            CongCuGIS._visvalingam_whyatt(cac_x, cac_y, mat_na, do_chiu_sai_so ** 2)
+            return mat_na
+        
+        # Doan ngan tinh bang vong lap nhanh hon goi NumPy (chi phi moi lan goi)
+        nguong_vector_hoa = 64
+        
+        ngan_xep = [(0, so_diem - 1)]
+        while ngan_xep:
+            dau, cuoi = ngan_xep.pop()
+            if cuoi - dau < 2:
+                continue
             
+            x1, y1 = cac_x[dau], cac_y[dau]
+            x2, y2 = cac_x[cuoi], cac_y[cuoi]
+            mau_so = math.sqrt((y2 - y1)**2 + (x2 - x1)**2)
             if mau_so == 0:
-                return 0
+                # Diem dau trung diem cuoi: coi moi khoang cach bang 0
+                continue
+            
+            # Khoang cach vuong goc tu cac diem giua den duong noi dau-cuoi
+            if np is not None and cuoi - dau > nguong_vector_hoa:
+                x0 = mang_x[dau + 1:cuoi]
+                y0 = mang_y[dau + 1:cuoi]
+                khoang_cach = np.abs((y2 - y1) * x0 - (x2 - x1) * y0 + x2 * y1 - y2 * x1) / mau_so
+                vi_tri_max = int(np.argmax(khoang_cach))
+                khoang_cach_max = float(khoang_cach[vi_tri_max])
+                chi_so_max = dau + 1 + vi_tri_max
+            else:
+                khoang_cach_max = 0
+                chi_so_max = dau
+                for i in range(dau + 1, cuoi):
+                    khoang_cach = abs((y2 - y1) * cac_x[i] - (x2 - x1) * cac_y[i] + x2 * y1 - y2 * x1) / mau_so
+                    if khoang_cach > khoang_cach_max:
+                        khoang_cach_max = khoang_cach
+                        chi_so_max = i
             
-            return tu_so / mau_so
+            if khoang_cach_max > do_chiu_sai_so:
+                mat_na[chi_so_max] = True
+                ngan_xep.append((dau, chi_so_max))
+                ngan_xep.append((chi_so_max, cuoi))
+        
+        return mat_na
+    
+    @staticmethod
+    def _visvalingam_whyatt(cac_x, cac_y, mat_na, nguong_dien_tich):
+        """
+        Bo diem theo Visvalingam-Whyatt, cap nhat mat_na tai cho
+        
+        GIAI THICH:
+        - Dien tich ban dau tinh vector hoa (NumPy); heap chi nhan cac diem
+          co dien tich < nguong - diem khac chi co the bi bo sau khi dien tich
+          duoc tinh lai (luc do moi dua vao heap)
+        - Vong lap heap van la Python thuan: O(k log k) voi k so diem bi bo,
+          ~1 giay cho 100k diem khi bo gan het; Douglas-Peucker (mac dinh,
+          vector hoa theo doan) nhanh hon nhieu cho route dai
+        """
+        so_diem = len(cac_x)
+        truoc = list(range(-1, so_diem - 1))
+        sau = list(range(1, so_diem + 1))
+        
+        if np is not None:
+            x = np.array(cac_x, dtype=float)
+            y = np.array(cac_y, dtype=float)
+            mang_dien_tich = np.abs((x[:-2] - x[1:-1]) * (y[2:] - y[1:-1]) -
+                                    (x[2:] - x[1:-1]) * (y[:-2] - y[1:-1])) / 2
+            cac_chi_so = np.flatnonzero(mang_dien_tich < nguong_dien_tich)
+            dong = list(zip(mang_dien_tich[cac_chi_so].tolist(), (cac_chi_so + 1).tolist(),
+                            [0] * len(cac_chi_so)))
+        else:
+            dong = []
+            for i in range(1, so_diem - 1):
+                dt = abs((cac_x[i - 1] - cac_x[i]) * (cac_y[i + 1] - cac_y[i]) -
+                         (cac_x[i + 1] - cac_x[i]) * (cac_y[i - 1] - cac_y[i])) / 2
+                if dt < nguong_dien_tich:
+                    dong.append((dt, i, 0))
+        
+        # phien_ban[i] tang moi khi dien tich cua i duoc tinh lai => bo qua muc cu trong heap
+        phien_ban = [0] * so_diem
+        heapq.heapify(dong)
+        da_bo = [False] * so_diem
+        heappop, heappush = heapq.heappop, heapq.heappush
+        cuoi = so_diem - 1
         
-        def thuat_toan_douglas_peucker(diem_list, sai_so):
-            """Thuat toan Douglas-Peucker (de quy)"""
-            if len(diem_list) < 3:
-                return diem_list
+        while dong:
+            dt, i, pb = heappop(dong)
+            if da_bo[i] or pb != phien_ban[i]:
+                continue
+            if dt >= nguong_dien_tich:
+                break
             
-            # Tim diem co khoang cach lon nhat
-            khoang_cach_max = 0
-            chi_so_max = 0
+            da_bo[i] = True
+            a, c = truoc[i], sau[i]
+            sau[a] = c
+            truoc[c] = a
             
-            for i in range(1, len(diem_list) - 1):
-                khoang_cach = tinh_khoang_cach_vuong_goc(
-                    diem_list[i], diem_list[0], diem_list[-1]
-                )
-                if khoang_cach > khoang_cach_max:
-                    khoang_cach_max = khoang_cach
-                    chi_so_max = i
+            # Dien tich hieu dung cua hang xom khong nho hon diem vua bo
+            for j in (a, c):
+                if 0 < j < cuoi:
+                    t, s = truoc[j], sau[j]
+                    xj, yj = cac_x[j], cac_y[j]
+                    dt_j = abs((cac_x[t] - xj) * (cac_y[s] - yj) - (cac_x[s] - xj) * (cac_y[t] - yj)) / 2
+                    if dt_j < dt:
+                        dt_j = dt
+                    # Muc cu cua j trong heap het han; dien tich >= nguong thi khong can dua lai
+                    phien_ban[j] += 1
+                    if dt_j < nguong_dien_tich:
+                        heappush(dong, (dt_j, j, phien_ban[j]))
+        
+        for i in range(1, so_diem - 1):
+            if not da_bo[i]:
+                mat_na[i] = True
+
+
+class _NutCayKD:
+    """Mot nut cua cay KD trong ChiMucKhongGian"""
+    
+    __slots__ = ('diem', 'xyz', 'truc', 'trai', 'phai', 'da_xoa')
+    
+    def __init__(self, diem, xyz):
+        self.diem = diem
+        self.xyz = xyz
+        self.truc = 0
+        self.trai = None
+        self.phai = None
+        self.da_xoa = False
+
+
+class ChiMucKhongGian:
+    """
+    Chi muc khong gian (cay KD tren mat cau) cho truy van gan nhat,
+    k gan nhat va trong ban kinh
+    
+    GIAI THICH:
+    - Moi diem (vi_do, kinh_do) duoc doi sang vector don vi 3D (x, y, z)
+      tren mat cau; khoang cach day cung (chord) giua 2 vector tang dong
+      bien voi khoang cach Haversine nen co the cat nhanh cay KD 3D ma
+      khong lam sai ket qua
+    - Xay dung can bang mot lan: O(n log² n); truy van: ~O(log n)
+    - Khoang cach tra ve duoc tinh lai chinh xac bang Haversine
+    - Them diem: di xuong la cay; cay qua sau thi tu xay dung lai
+    - Xoa diem: danh dau (tombstone); xoa qua nhieu thi tu xay dung lai
+    - Moi diem co mot khoa duy nhat (mac dinh la du_lieu = diem[2]);
+      them lai cung khoa se thay the diem cu (dung khi cua hang di chuyen)
+    
+    THAM SO:
+        danh_sach_diem: Danh sach cac tuple (vi_do, kinh_do, du_lieu) ban dau
+    
+    VI DU:
+        >>> chi_muc = ChiMucKhongGian([(16.05, 108.20, "A"), (16.10, 108.25, "B")])
+        >>> chi_muc.them(16.07, 108.22, "C")
+        >>> gan_nhat, kc = chi_muc.tim_gan_nhat(16.055, 108.205)
+        >>> ba_diem = chi_muc.tim_k_gan_nhat(16.055, 108.205, 3)
+        >>> chi_muc.xoa("B")
+    """
+    
+    def __init__(self, danh_sach_diem=None):
+        self._goc = None
+        self._theo_khoa = {}
+        self._so_nut = 0
+        self._so_da_xoa = 0
+        if danh_sach_diem:
+            cac_nut = []
+            for diem in danh_sach_diem:
+                nut = _NutCayKD(tuple(diem), self._vector_don_vi(diem[0], diem[1]))
+                khoa = self._lay_khoa(nut.diem)
+                if khoa in self._theo_khoa:
+                    cac_nut.remove(self._theo_khoa[khoa])
+                self._theo_khoa[khoa] = nut
+                cac_nut.append(nut)
+            self._xay_dung_lai(cac_nut)
+    
+    def __len__(self):
+        return len(self._theo_khoa)
+    
+    def __contains__(self, khoa):
+        return khoa in self._theo_khoa
+    
+    @staticmethod
+    def _lay_khoa(diem):
+        return diem[2] if len(diem) > 2 else (diem[0], diem[1])
+    
+    @staticmethod
+    def _vector_don_vi(vi_do, kinh_do):
+        vi_do_rad = math.radians(vi_do)
+        kinh_do_rad = math.radians(kinh_do)
+        cos_vi_do = math.cos(vi_do_rad)
+        return (cos_vi_do * math.cos(kinh_do_rad),
+                cos_vi_do * math.sin(kinh_do_rad),
+                math.sin(vi_do_rad))
+    
+    def _xay_dung_lai(self, cac_nut=None):
+        """Xay dung lai cay can bang tu cac nut con hieu luc"""
+        if cac_nut is None:
+            cac_nut = list(self._theo_khoa.values())
+        
+        def xay_dung(ds_nut, do_sau):
+            if not ds_nut:
+                return None
+            truc = do_sau % 3
+            ds_nut.sort(key=lambda n: n.xyz[truc])
+            giua = len(ds_nut) // 2
+            nut = ds_nut[giua]
+            nut.truc = truc
+            nut.trai = xay_dung(ds_nut[:giua], do_sau + 1)
+            nut.phai = xay_dung(ds_nut[giua + 1:], do_sau + 1)
+            return nut
+        
+        self._goc = xay_dung(cac_nut, 0)
+        self._so_nut = len(cac_nut)
+        self._so_da_xoa = 0
+    
+    def them(self, vi_do, kinh_do, du_lieu=None):
+        """
+        Them mot diem vao chi muc (thay the diem cu neu trung khoa)
+        
+        THAM SO:
+            vi_do, kinh_do: Toa do diem (do)
+            du_lieu: Du lieu kem theo, cung la khoa de xoa/cap nhat
+        """
+        diem = (vi_do, kinh_do, du_lieu)
+        khoa = self._lay_khoa(diem)
+        if khoa in self._theo_khoa:
+            self.xoa(khoa)
+        
+        nut_moi = _NutCayKD(diem, self._vector_don_vi(vi_do, kinh_do))
+        self._theo_khoa[khoa] = nut_moi
+        self._so_nut += 1
+        
+        if self._goc is None:
+            self._goc = nut_moi
+            return
+        
+        nut = self._goc
+        do_sau = 1
+        while True:
+            if nut_moi.xyz[nut.truc] < nut.xyz[nut.truc]:
+                if nut.trai is None:
+                    nut.trai = nut_moi
+                    break
+                nut = nut.trai
+            else:
+                if nut.phai is None:
+                    nut.phai = nut_moi
+                    break
+                nut = nut.phai
+            do_sau += 1
+        nut_moi.truc = do_sau % 3
+        
+        # Cay mat can bang qua nhieu thi xay dung lai
+        if do_sau > 16 and do_sau > 3 * math.log2(self._so_nut + 1):
+            self._xay_dung_lai()
+    
+    def xoa(self, khoa):
+        """
+        Xoa diem theo khoa (du_lieu da truyen khi them)
+        
+        TRA VE:
+            True neu da xoa, False neu khong tim thay khoa
+        """
+        nut = self._theo_khoa.pop(khoa, None)
+        if nut is None:
+            return False
+        
+        nut.da_xoa = True
+        self._so_da_xoa += 1
+        if self._so_da_xoa > 16 and self._so_da_xoa * 2 > self._so_nut:
+            self._xay_dung_lai()
+        return True
+    
+    def _duyet(self, xyz, k=None, nguong_chord2=float('inf')):
+        """
+        Duyet cay khong de quy, tra ve danh sach (chord², nut) thoa man
+        
+        - k khac None: giu k nut gan nhat (max-heap kich thuoc k)
+        - nguong_chord2: chi lay nut co chord² <= nguong
+        """
+        if self._goc is None:
+            return []
+        
+        x, y, z = xyz
+        dong = []  # max-heap theo chord²: (-chord², thu_tu, nut)
+        dem = 0
+        ngan_xep = [(self._goc, 0.0)]
+        
+        while ngan_xep:
+            nut, can_duoi = ngan_xep.pop()
+            gioi_han = -dong[0][0] if (k is not None and len(dong) == k) else nguong_chord2
+            if can_duoi > gioi_han:
+                continue
             
-            # Neu khoang cach lon hon sai so, de quy don gian hoa
-            if khoang_cach_max > sai_so:
-                phan_trai = thuat_toan_douglas_peucker(diem_list[:chi_so_max + 1], sai_so)
-                phan_phai = thuat_toan_douglas_peucker(diem_list[chi_so_max:], sai_so)
-                
-                # Ket hop ket qua
-                return phan_trai[:-1] + phan_phai
+            if not nut.da_xoa:
+                nx, ny, nz = nut.xyz
+                chord2 = (x - nx) ** 2 + (y - ny) ** 2 + (z - nz) ** 2
+                if chord2 <= gioi_han:
+                    dem += 1
+                    if k is None:
+                        dong.append((-chord2, dem, nut))
+                    elif len(dong) < k:
+                        heapq.heappush(dong, (-chord2, dem, nut))
+                    elif chord2 < gioi_han:
+                        heapq.heapreplace(dong, (-chord2, dem, nut))
+            
+            chenh_lech = xyz[nut.truc] - nut.xyz[nut.truc]
+            if chenh_lech < 0:
+                gan, xa = nut.trai, nut.phai
             else:
-                return [diem_list[0], diem_list[-1]]
+                gan, xa = nut.phai, nut.trai
+            # Day nhanh xa truoc de nhanh gan duoc duyet truoc
+            if xa is not None:
+                ngan_xep.append((xa, max(can_duoi, chenh_lech * chenh_lech)))
+            if gan is not None:
+                ngan_xep.append((gan, can_duoi))
+        
+        return [nut for _, _, nut in dong]
+    
+    def _ket_qua(self, vi_do_goc, kinh_do_goc, cac_nut):
+        ket_qua = [{
+            'diem': nut.diem,
+            'khoang_cach': CongCuGIS.tinh_khoang_cach_haversine(
+                vi_do_goc, kinh_do_goc, nut.diem[0], nut.diem[1]
+            )
+        } for nut in cac_nut]
+        ket_qua.sort(key=lambda x: x['khoang_cach'])
+        return ket_qua
+    
+    def tim_k_gan_nhat(self, vi_do_goc, kinh_do_goc, k):
+        """
+        Tim k diem gan nhat
+        
+        TRA VE:
+            Danh sach cac dict {'diem': ..., 'khoang_cach': ...} sap xep
+            tu gan den xa (toi da k phan tu)
+        """
+        if k <= 0:
+            return []
+        cac_nut = self._duyet(self._vector_don_vi(vi_do_goc, kinh_do_goc), k=k)
+        return self._ket_qua(vi_do_goc, kinh_do_goc, cac_nut)
+    
+    def tim_gan_nhat(self, vi_do_goc, kinh_do_goc):
+        """
+        Tim diem gan nhat - cung dinh dang ket qua voi CongCuGIS.tim_diem_gan_nhat
+        
+        TRA VE:
+            Tuple (diem_gan_nhat, khoang_cach) hoac (None, None) neu rong
+        """
+        ket_qua = self.tim_k_gan_nhat(vi_do_goc, kinh_do_goc, 1)
+        if not ket_qua:
+            return None, None
+        return ket_qua[0]['diem'], ket_qua[0]['khoang_cach']
+    
+    def tim_trong_ban_kinh(self, vi_do_goc, kinh_do_goc, ban_kinh_km):
+        """
+        Tim cac diem trong ban kinh - cung dinh dang ket qua voi
+        CongCuGIS.tim_diem_trong_ban_kinh
+        
+        TRA VE:
+            Danh sach cac dict {'diem': ..., 'khoang_cach': ...} da sap xep
+        """
+        if ban_kinh_km < 0:
+            return []
+        # Doi ban kinh (km) sang do dai day cung tren mat cau don vi,
+        # noi rong mot chut de bu sai so lam tron, loc chinh xac o duoi
+        goc = min(ban_kinh_km / CongCuGIS.BAN_KINH_TRAI_DAT_KM, math.pi)
+        chord = 2 * math.sin(goc / 2) + 1e-12
+        cac_nut = self._duyet(self._vector_don_vi(vi_do_goc, kinh_do_goc),
+                              nguong_chord2=chord * chord)
+        return [kq for kq in self._ket_qua(vi_do_goc, kinh_do_goc, cac_nut)
+                if kq['khoang_cach'] <= ban_kinh_km]
+
+
+class DaGiacChuanBi:
+    """
+    Da giac da chuan bi san de kiem tra hang loat diem nam trong
+    
+    GIAI THICH:
+    - Tinh truoc mot lan: khung bao, mang cac canh (bo canh nam ngang vi
+      khong bao gio bi tia cat) va chi muc canh theo dai vi do: chia khoang
+      vi do cua da giac thanh cac dai, moi dai ghi cac canh cat qua no
+    - Moi diem chi xet cac canh thuoc dai chua vi do cua diem, thay vi
+      tat ca cac canh; diem ngoai khung bao bi loai ngay
+    - chua_nhieu vector hoa bang NumPy theo tung dai (neu co NumPy)
+    - Cung dieu kien ray casting voi kiem_tra_diem_trong_da_giac nen ket
+      qua giong het (ke ca diem nam tren canh / dinh)
+    - Dung khi kiem tra nhieu diem (vd: tat ca cua hang) voi cung mot
+      vung giao hang
+    
+    THAM SO:
+        toa_do_da_giac: Danh sach cac tuple (vi_do, kinh_do) tao thanh da giac
+    
+    VI DU:
+        >>> vung = DaGiacChuanBi([(16.00, 108.00), (16.00, 108.50),
+        ...                       (16.50, 108.50), (16.50, 108.00)])
+        >>> vung.chua(16.25, 108.25)
+        True
+        >>> mat_na = vung.chua_nhieu(tap_cua_hang)   # TapDiemCuaHang hoac list diem
+    """
+    
+    def __init__(self, toa_do_da_giac):
+        cac_dinh = [(dinh[1], dinh[0]) for dinh in toa_do_da_giac]  # (kinh_do, vi_do)
+        
+        # Canh (dinh truoc -> dinh sau) cung chieu voi kiem_tra_diem_trong_da_giac
+        cac_canh = [(x1, y1, x2, y2)
+                    for (x1, y1), (x2, y2) in zip(cac_dinh[-1:] + cac_dinh[:-1], cac_dinh)
+                    if y1 != y2]
+        
+        self.so_canh = len(cac_canh)
+        if cac_dinh:
+            self.khung_bao = (
+                (min(y for _, y in cac_dinh), min(x for x, _ in cac_dinh)),
+                (max(y for _, y in cac_dinh), max(x for x, _ in cac_dinh)),
+            )
+        else:
+            self.khung_bao = ((0.0, 0.0), (0.0, 0.0))
+        (self._y_min, self._x_min), (self._y_max, self._x_max) = self.khung_bao
+        
+        self._x1 = [c[0] for c in cac_canh]
+        self._y1 = [c[1] for c in cac_canh]
+        self._dx = [c[2] - c[0] for c in cac_canh]
+        self._dy = [c[3] - c[1] for c in cac_canh]
+        self._canh_y_min = [min(c[1], c[3]) for c in cac_canh]
+        self._canh_y_max = [max(c[1], c[3]) for c in cac_canh]
+        self._canh_x_max = [max(c[0], c[2]) for c in cac_canh]
+        
+        # Chi muc theo dai vi do: khoang 4 canh moi dai, toi da 256 dai
+        self._so_dai = max(1, min(self.so_canh // 4, 256))
+        self._chieu_cao_dai = (self._y_max - self._y_min) / self._so_dai or 1.0
+        self._canh_theo_dai = [[] for _ in range(self._so_dai)]
+        for i in range(self.so_canh):
+            for dai in range(self._lay_dai(self._canh_y_min[i]), self._lay_dai(self._canh_y_max[i]) + 1):
+                self._canh_theo_dai[dai].append(i)
+        
+        if np is not None:
+            self._mang = {
+                ten: np.array(getattr(self, ten), dtype=float)
+                for ten in ('_x1', '_y1', '_dx', '_dy', '_canh_y_min', '_canh_y_max', '_canh_x_max')
+            }
+            self._mang_theo_dai = [np.array(cac_chi_so, dtype=np.intp) for cac_chi_so in self._canh_theo_dai]
+    
+    def _lay_dai(self, y):
+        """Chi so dai vi do chua y (gioi han trong [0, so_dai - 1])"""
+        dai = int((y - self._y_min) / self._chieu_cao_dai)
+        return min(max(dai, 0), self._so_dai - 1)
+    
+    def chua(self, vi_do, kinh_do):
+        """
+        Kiem tra mot diem co nam trong da giac khong
+        
+        TRA VE:
+            True/False - giong kiem_tra_diem_trong_da_giac
+        """
+        x, y = kinh_do, vi_do
+        if not (self._y_min < y <= self._y_max and self._x_min <= x <= self._x_max):
+            return False
+        
+        nam_trong = False
+        for i in self._canh_theo_dai[self._lay_dai(y)]:
+            if self._canh_y_min[i] < y <= self._canh_y_max[i] and x <= self._canh_x_max[i]:
+                giao_diem_x = (y - self._y1[i]) * self._dx[i] / self._dy[i] + self._x1[i]
+                if x <= giao_diem_x:
+                    nam_trong = not nam_trong
+        return nam_trong
+    
+    def chua_nhieu(self, danh_sach_diem):
+        """
+        Kiem tra hang loat diem co nam trong da giac khong
+        
+        GIAI THICH:
+        - Loai ngay cac diem ngoai khung bao
+        - Nhom diem con lai theo dai vi do, moi dai tinh mot ma tran
+          (diem x canh cua dai) bang NumPy, dem so lan cat theo hang
+        
+        THAM SO:
+            danh_sach_diem: List [(vi_do, kinh_do, ...), ...] hoac TapDiemCuaHang
         
-        return thuat_toan_douglas_peucker(danh_sach_diem, do_chiu_sai_so)
+        TRA VE:
+            Mat na True/False cho tung diem (mang NumPy bool, hoac list neu
+            khong co NumPy)
+        
+        VI DU:
+            >>> mat_na = vung.chua_nhieu(tap_cua_hang)
+            >>> cac_id_trong_vung = [tap_cua_hang.ids[i] for i in np.flatnonzero(mat_na)]
+        """
+        if np is None:
+            return [self.chua(diem[0], diem[1]) for diem in danh_sach_diem]
+        
+        if isinstance(danh_sach_diem, TapDiemCuaHang):
+            cac_y = np.frombuffer(danh_sach_diem.vi_do, dtype=float)
+            cac_x = np.frombuffer(danh_sach_diem.kinh_do, dtype=float)
+        else:
+            cac_y = np.fromiter((diem[0] for diem in danh_sach_diem), dtype=float)
+            cac_x = np.fromiter((diem[1] for diem in danh_sach_diem), dtype=float)
+        
+        mat_na = np.zeros(len(cac_y), dtype=bool)
+        if not self.so_canh:
+            return mat_na
+        
+        # Loai som cac diem ngoai khung bao
+        chi_so = np.flatnonzero((cac_y > self._y_min) & (cac_y <= self._y_max) &
+                                (cac_x >= self._x_min) & (cac_x <= self._x_max))
+        if not len(chi_so):
+            return mat_na
+        
+        # Nhom diem theo dai vi do (cung cong thuc voi _lay_dai)
+        cac_dai = np.clip(((cac_y[chi_so] - self._y_min) / self._chieu_cao_dai).astype(np.intp),
+                          0, self._so_dai - 1)
+        thu_tu = np.argsort(cac_dai, kind='stable')
+        chi_so, cac_dai = chi_so[thu_tu], cac_dai[thu_tu]
+        cac_dai_co_diem, vi_tri_dau = np.unique(cac_dai, return_index=True)
+        vi_tri_cuoi = np.append(vi_tri_dau[1:], len(chi_so))
+        
+        m = self._mang
+        for dai, dau, cuoi in zip(cac_dai_co_diem.tolist(), vi_tri_dau.tolist(), vi_tri_cuoi.tolist()):
+            canh = self._mang_theo_dai[dai]
+            if not len(canh):
+                continue
+            y1, dx, dy, x1 = m['_y1'][canh], m['_dx'][canh], m['_dy'][canh], m['_x1'][canh]
+            canh_y_min, canh_y_max = m['_canh_y_min'][canh], m['_canh_y_max'][canh]
+            canh_x_max = m['_canh_x_max'][canh]
+            
+            # Chia khoi de ma tran (diem x canh) khong qua lon
+            buoc = max(1, 1_000_000 // len(canh))
+            for bat_dau in range(dau, cuoi, buoc):
+                diem = chi_so[bat_dau:min(bat_dau + buoc, cuoi)]
+                y = cac_y[diem][:, None]
+                x = cac_x[diem][:, None]
+                bi_cat = (y > canh_y_min) & (y <= canh_y_max) & (x <= canh_x_max)
+                bi_cat &= x <= (y - y1) * dx / dy + x1
+                mat_na[diem] = np.count_nonzero(bi_cat, axis=1) % 2 == 1
+        return mat_na
+
+
+def _xen_bit(v):
+    """Trai 20 bit thap cua v ra cac bit chan (ma Morton); dung duoc cho int va mang NumPy int64"""
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    return (v | (v << 1)) & 0x5555555555555555
+
+
+class ChiMucCum:
+    """
+    Chi muc gom cum cua hang cho moi muc zoom (luoi phan cap kieu quadtree)
+    
+    GIAI THICH:
+    - Moi tile 256px o muc zoom z chia thanh 4x4 o (64px); o cua zoom z la
+      hop dung 4 o cua zoom z+1 => cac muc zoom long nhau nhu quadtree
+    - Moi cua hang co mot ma Morton (xen bit x, y Web Mercator o muc
+      ZOOM_TOI_DA): mot o o bat ky muc zoom nao la mot doan ma lien tuc
+    - Chi luu cua hang sap xep theo ma cung tong cong don vi do, kinh do
+      => mot bang dung chung cho ca 19 muc zoom (~48 byte/cua hang); moi
+      o dem bang 2 lan tim nhi phan, tam cum = tong / so luong
+    - Mot khung nhin tra ve toi da (rong / 64) x (cao / 64) o, khong phu
+      thuoc so cua hang (vai tram o cho mot man hinh)
+    - cap_nhat: chi tinh ma va chen/xoa cac cua hang thay doi, khong sap
+      xep lai; tong cong don tinh lai mot luot (vector hoa neu co NumPy)
+    - Khac supercluster (gom tham lam theo ban kinh): luoi co dinh cho phep
+      cap nhat tang dan va ket qua khong phu thuoc thu tu cua hang
+    
+    THAM SO:
+        tap: TapDiemCuaHang (hoac list (vi_do, kinh_do, id)) ban dau
+    
+    VI DU:
+        >>> chi_muc = ChiMucCum(tap_cua_hang)
+        >>> cac_cum = chi_muc.tim_cum(15.9, 108.0, 16.2, 108.4, zoom=11)
+        >>> cac_cum[0]
+        {'o': (11, 6523, 3641), 'so_luong': 12, 'vi_do': 16.06, 'kinh_do': 108.21, 'id': None}
+    """
+    
+    ZOOM_TOI_DA = 18
+    BAC_O_MOI_TILE = 2                          # 2^2 = 4 o moi chieu cua tile
+    SO_BIT = ZOOM_TOI_DA + BAC_O_MOI_TILE       # so bit toa do o moi truc
+    VI_DO_MERCATOR_TOI_DA = 85.05112878
+    SO_O_TOI_DA = 4096                          # so o toi da moi truy van tim_cum
+    
+    def __init__(self, tap=()):
+        ids, vi_do, kinh_do = self._doc_tap(tap)
+        ma = self._ma_nhieu_diem(vi_do, kinh_do)
+        if np is not None:
+            thu_tu = np.argsort(ma, kind='stable')
+        else:
+            thu_tu = sorted(range(len(ma)), key=ma.__getitem__)
+        self._dat_du_lieu(*(self._lay(cot, thu_tu) for cot in (ma, ids, vi_do, kinh_do)))
+    
+    @staticmethod
+    def _lay(cot, chi_so):
+        """cot[chi_so] cho ca mang NumPy va list"""
+        if np is not None:
+            return cot[chi_so]
+        return [cot[i] for i in chi_so]
+    
+    @staticmethod
+    def _doc_tap(tap):
+        """Tach (ids, vi_do, kinh_do) tu TapDiemCuaHang hoac list (vi_do, kinh_do, id)"""
+        if isinstance(tap, TapDiemCuaHang):
+            ids, vi_do, kinh_do = tap.ids, tap.vi_do, tap.kinh_do
+        else:
+            tap = list(tap)
+            ids = [diem[2] for diem in tap]
+            vi_do = [diem[0] for diem in tap]
+            kinh_do = [diem[1] for diem in tap]
+        if np is not None:
+            return (np.array(ids, dtype=np.int64), np.array(vi_do, dtype=float),
+                    np.array(kinh_do, dtype=float))
+        return list(ids), list(vi_do), list(kinh_do)
+    
+    @classmethod
+    def _toa_do_luoi(cls, vi_do, kinh_do):
+        """Toa do o (x, y) Web Mercator o muc ZOOM_TOI_DA cua mot diem"""
+        kich_thuoc = 1 << cls.SO_BIT
+        vi_do = min(max(vi_do, -cls.VI_DO_MERCATOR_TOI_DA), cls.VI_DO_MERCATOR_TOI_DA)
+        x = (kinh_do + 180.0) / 360.0
+        y = (1.0 - math.asinh(math.tan(math.radians(vi_do))) / math.pi) / 2.0
+        return (min(max(int(x * kich_thuoc), 0), kich_thuoc - 1),
+                min(max(int(y * kich_thuoc), 0), kich_thuoc - 1))
+    
+    @classmethod
+    def _ma_nhieu_diem(cls, vi_do, kinh_do):
+        """Ma Morton cua nhieu diem (mang int64 neu co NumPy, nguoc lai list)"""
+        if np is None:
+            ket_qua = []
+            for y_do, x_do in zip(vi_do, kinh_do):
+                x, y = cls._toa_do_luoi(y_do, x_do)
+                ket_qua.append(_xen_bit(x) | (_xen_bit(y) << 1))
+            return ket_qua
+        
+        kich_thuoc = 1 << cls.SO_BIT
+        vi_do = np.clip(vi_do, -cls.VI_DO_MERCATOR_TOI_DA, cls.VI_DO_MERCATOR_TOI_DA)
+        x = (kinh_do + 180.0) / 360.0
+        y = (1.0 - np.arcsinh(np.tan(np.radians(vi_do))) / np.pi) / 2.0
+        x = np.clip((x * kich_thuoc).astype(np.int64), 0, kich_thuoc - 1)
+        y = np.clip((y * kich_thuoc).astype(np.int64), 0, kich_thuoc - 1)
+        return _xen_bit(x) | (_xen_bit(y) << 1)
+    
+    def _dat_du_lieu(self, ma, ids, vi_do, kinh_do):
+        """
+        Thay toan bo du lieu bang mot tuple: gan mot lan nen luong dang doc
+        khong bao gio thay du lieu lan giua phien ban cu va moi
+        """
+        if np is not None:
+            cong_don = [np.concatenate(([0.0], np.cumsum(cot))) for cot in (vi_do, kinh_do)]
+        else:
+            cong_don = [list(accumulate(cot, initial=0.0)) for cot in (vi_do, kinh_do)]
+        self._du_lieu = (ma, ids, vi_do, kinh_do, *cong_don)
+    
+    def __len__(self):
+        return len(self._du_lieu[0])
+    
+    def cap_nhat(self, tap):
+        """
+        Dua chi muc ve dung noi dung cua tap moi, chi xu ly phan thay doi
+        
+        GIAI THICH:
+        - So sanh theo id voi du lieu hien tai: cua hang bi xoa hoac doi toa
+          do duoc bo ra; cua hang moi hoac doi toa do duoc tinh ma va chen
+          vao dung vi tri (tim nhi phan); cua hang khong doi giu nguyen
+        
+        THAM SO:
+            tap: TapDiemCuaHang day du sau khi thay doi (vd ban chup moi)
+        
+        TRA VE:
+            So cua hang bo ra + so cua hang chen vao (0 neu khong co gi doi)
+        """
+        ma, ids, vi_do, kinh_do = self._du_lieu[:4]
+        ids_moi, vi_do_moi, kinh_do_moi = self._doc_tap(tap)
+        
+        if np is None:
+            cu = {id_cua_hang: (y, x) for id_cua_hang, y, x in zip(ids, vi_do, kinh_do)}
+            moi = {id_cua_hang: (y, x) for id_cua_hang, y, x in zip(ids_moi, vi_do_moi, kinh_do_moi)}
+            bo_ra = {id_cua_hang for id_cua_hang, toa_do in cu.items() if moi.get(id_cua_hang) != toa_do}
+            chen_vao = [(id_cua_hang, y, x) for id_cua_hang, (y, x) in moi.items() if cu.get(id_cua_hang) != (y, x)]
+            if not bo_ra and not chen_vao:
+                return 0
+            
+            giu = [i for i, id_cua_hang in enumerate(ids) if id_cua_hang not in bo_ra]
+            ma, ids, vi_do, kinh_do = (self._lay(cot, giu) for cot in (ma, ids, vi_do, kinh_do))
+            for id_cua_hang, y, x in chen_vao:
+                ma_moi = self._ma_nhieu_diem([y], [x])[0]
+                vi_tri = bisect.bisect_right(ma, ma_moi)
+                for cot, gia_tri in ((ma, ma_moi), (ids, id_cua_hang), (vi_do, y), (kinh_do, x)):
+                    cot.insert(vi_tri, gia_tri)
+            self._dat_du_lieu(ma, ids, vi_do, kinh_do)
+            return len(bo_ra) + len(chen_vao)
+        
+        _, chi_so_cu, chi_so_moi = np.intersect1d(ids, ids_moi, assume_unique=True, return_indices=True)
+        khong_doi = ((vi_do[chi_so_cu] == vi_do_moi[chi_so_moi]) &
+                     (kinh_do[chi_so_cu] == kinh_do_moi[chi_so_moi]))
+        giu = np.zeros(len(ids), dtype=bool)
+        giu[chi_so_cu[khong_doi]] = True
+        chen_vao = np.ones(len(ids_moi), dtype=bool)
+        chen_vao[chi_so_moi[khong_doi]] = False
+        so_thay_doi = int(len(ids) - np.count_nonzero(giu) + np.count_nonzero(chen_vao))
+        if not so_thay_doi:
+            return 0
+        
+        ma_moi = self._ma_nhieu_diem(vi_do_moi[chen_vao], kinh_do_moi[chen_vao])
+        thu_tu = np.argsort(ma_moi, kind='stable')
+        ma = ma[giu]
+        vi_tri = np.searchsorted(ma, ma_moi[thu_tu], side='right')
+        self._dat_du_lieu(
+            np.insert(ma, vi_tri, ma_moi[thu_tu]),
+            np.insert(ids[giu], vi_tri, ids_moi[chen_vao][thu_tu]),
+            np.insert(vi_do[giu], vi_tri, vi_do_moi[chen_vao][thu_tu]),
+            np.insert(kinh_do[giu], vi_tri, kinh_do_moi[chen_vao][thu_tu]),
+        )
+        return so_thay_doi
+    
+    def tim_cum(self, vi_do_min, kinh_do_min, vi_do_max, kinh_do_max, zoom):
+        """
+        Cac cum (va cua hang le) trong mot khung o muc zoom cho truoc
+        
+        GIAI THICH:
+        - Liet ke cac o cua muc zoom phu khung, moi o la doan ma
+          [m << dich, (m + 1) << dich): hai lan tim nhi phan cho so luong,
+          tong cong don cho tam cum - vector hoa tren tat ca o neu co NumPy
+        - Nem ValueError neu khung can qua SO_O_TOI_DA o (khung qua lon so
+          voi muc zoom, khong phai mot man hinh)
+        
+        THAM SO:
+            vi_do_min, kinh_do_min, vi_do_max, kinh_do_max: Khung can lay (do)
+            zoom: Muc zoom ban do (gioi han trong 0 - ZOOM_TOI_DA)
+        
+        TRA VE:
+            List dict {'o': (zoom, x, y), 'so_luong', 'vi_do', 'kinh_do', 'id'};
+            'id' la id cua hang neu o chi co mot cua hang, nguoc lai None
+        """
+        zoom = min(max(int(zoom), 0), self.ZOOM_TOI_DA)
+        dich = self.ZOOM_TOI_DA - zoom
+        x_dau, y_cuoi = (v >> dich for v in self._toa_do_luoi(vi_do_min, kinh_do_min))
+        x_cuoi, y_dau = (v >> dich for v in self._toa_do_luoi(vi_do_max, kinh_do_max))
+        if (x_cuoi - x_dau + 1) * (y_cuoi - y_dau + 1) > self.SO_O_TOI_DA:
+            raise ValueError(f'Khung quá lớn cho mức zoom {zoom} (tối đa {self.SO_O_TOI_DA} ô)')
+        
+        du_lieu = self._du_lieu
+        ma = du_lieu[0]
+        do_dai_o = 1 << (2 * dich)
+        
+        if np is None:
+            ket_qua = []
+            for o_x in range(x_dau, x_cuoi + 1):
+                for o_y in range(y_dau, y_cuoi + 1):
+                    dau = (_xen_bit(o_x) | (_xen_bit(o_y) << 1)) << (2 * dich)
+                    i_dau = bisect.bisect_left(ma, dau)
+                    i_cuoi = bisect.bisect_left(ma, dau + do_dai_o, i_dau)
+                    if i_cuoi > i_dau:
+                        ket_qua.append(self._tao_cum(du_lieu, zoom, o_x, o_y, i_dau, i_cuoi))
+            return ket_qua
+        
+        o_x, o_y = np.meshgrid(np.arange(x_dau, x_cuoi + 1, dtype=np.int64),
+                               np.arange(y_dau, y_cuoi + 1, dtype=np.int64), indexing='ij')
+        o_x, o_y = o_x.ravel(), o_y.ravel()
+        dau = (_xen_bit(o_x) | (_xen_bit(o_y) << 1)) << (2 * dich)
+        i_dau = np.searchsorted(ma, dau, side='left')
+        i_cuoi = np.searchsorted(ma, dau + do_dai_o, side='left')
+        co_cua_hang = i_cuoi > i_dau
+        return [self._tao_cum(du_lieu, zoom, x, y, a, b) for x, y, a, b in zip(
+            o_x[co_cua_hang].tolist(), o_y[co_cua_hang].tolist(),
+            i_dau[co_cua_hang].tolist(), i_cuoi[co_cua_hang].tolist()
+        )]
+    
+    @staticmethod
+    def _tao_cum(du_lieu, zoom, o_x, o_y, i_dau, i_cuoi):
+        """Dict ket qua cho o chua cac cua hang thu i_dau den i_cuoi - 1"""
+        _, ids, vi_do, kinh_do, cong_don_vi_do, cong_don_kinh_do = du_lieu
+        so_luong = i_cuoi - i_dau
+        if so_luong == 1:
+            return {'o': (zoom, o_x, o_y), 'so_luong': 1, 'vi_do': float(vi_do[i_dau]),
+                    'kinh_do': float(kinh_do[i_dau]), 'id': int(ids[i_dau])}
+        return {
+            'o': (zoom, o_x, o_y),
+            'so_luong': so_luong,
+            'vi_do': float(cong_don_vi_do[i_cuoi] - cong_don_vi_do[i_dau]) / so_luong,
+            'kinh_do': float(cong_don_kinh_do[i_cuoi] - cong_don_kinh_do[i_dau]) / so_luong,
+            'id': None,
+        }
 
 
 # Cac ham tien ich de su dung nhanh (convenience functions)
@@ -489,3 +1818,43 @@ def kiem_tra_diem_trong(vi_do, kinh_do, da_giac):
 def tim_gan_nhat(vi_do_goc, kinh_do_goc, danh_sach_diem):
     """Tim diem gan nhat tu danh sach"""
     return CongCuGIS.tim_diem_gan_nhat(vi_do_goc, kinh_do_goc, danh_sach_diem)
+
+
+def ma_tran_khoang_cach_km(diem_goc, diem_dich):
+    """Tinh ma tran khoang cach (km) giua nhieu diem goc va nhieu diem dich"""
+    return CongCuGIS.tinh_ma_tran_khoang_cach(diem_goc, diem_dich)
+
+
+def ma_tran_khoang_cach_met_phang(diem_goc, diem_dich):
+    """
+    Ma tran khoang cach (met, lam tron) dang list phang theo hang (row-major):
+    phan tu [i * M + j] la khoang cach tu diem goc i den diem dich j
+    """
+    so_cot = len(diem_dich)
+    if np is not None:
+        ket_qua = np.empty(len(diem_goc) * so_cot, dtype=np.int64)
+        for hang_dau, khoi in CongCuGIS.tinh_ma_tran_khoang_cach_theo_khoi(diem_goc, diem_dich):
+            ket_qua[hang_dau * so_cot:hang_dau * so_cot + khoi.size] = np.rint(khoi * 1000).ravel()
+        return ket_qua.tolist()
+    
+    ket_qua = []
+    for _, khoi in CongCuGIS.tinh_ma_tran_khoang_cach_theo_khoi(diem_goc, diem_dich):
+        for hang in khoi:
+            ket_qua.extend(round(khoang_cach * 1000) for khoang_cach in hang)
+    return ket_qua
+
+
+def luong_ma_tran_khoang_cach_met(diem_goc, diem_dich, so_o_moi_khoi=100_000):
+    """
+    Nhu ma_tran_khoang_cach_met_phang nhung tra ve tung khoi dang chuoi
+    "d1,d2,..." (khoi sau bat dau bang dau phay): ghep lai la noi dung mang
+    JSON phang theo hang. Bo nho chi ty le voi mot khoi, dung cho
+    StreamingHttpResponse
+    """
+    for hang_dau, khoi in CongCuGIS.tinh_ma_tran_khoang_cach_theo_khoi(diem_goc, diem_dich, so_o_moi_khoi):
+        if np is not None:
+            cac_gia_tri = np.rint(khoi * 1000).astype(np.int64).ravel().tolist()
+        else:
+            cac_gia_tri = [round(khoang_cach * 1000) for hang in khoi for khoang_cach in hang]
+        if cac_gia_tri:
+            yield (',' if hang_dau else '') + ','.join(map(str, cac_gia_tri))
@@ -3,10 +3,87 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.gis.geos import Point
-from django.http import JsonResponse
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from .models import LoaiCuaHang, CuaHang, DanhGia, SuKien, CuaHangSuKien
-from .utils.gis_tools import CongCuGIS, khoang_cach_km
+from .utils.gis_tools import CongCuGIS, DaGiacChuanBi, khoang_cach_km, luong_ma_tran_khoang_cach_met
+from .spatial_queries import (
+    lay_ten_cua_hang, tao_da_giac, tao_khung_nhin, tim_cua_hang_trong_ban_kinh,
+    tim_cua_hang_trong_da_giac, tim_cua_hang_trong_khung_nhin, tim_k_cua_hang_gan_nhat,
+)
+from .admin_paging import lien_ket_trang, phan_trang_keyset
+from .batch_tools import SO_LENH_TOI_DA, chay_lo_lenh
+from .coverage import lay_vung_phu
+from .result_cache import bo_nho_dem_ket_qua, lam_tron_toa_do, lay_phien_ban_du_lieu
+from .store_clusters import lay_chi_muc_cum
+from .store_changes import (
+    cua_hang_da_thay_doi, danh_gia_da_thay_doi, thong_tin_cua_hang_da_thay_doi,
+    trang_thai_cua_hang, trang_thai_danh_gia,
+)
+from .store_density import MUC_TOI_DA, lay_o_mat_do, tong_danh_gia_cua_hang
+from .store_export import CAC_DINH_DANG_XUAT, tao_luong_xuat
+from .store_import import CAC_DINH_DANG, doan_dinh_dang, nhap_cua_hang
+from .store_snapshot import lay_ban_chup
+from .store_tiles import lay_tile, tile_hop_le
+from .store_stats import lay_thong_ke
 from functools import wraps
+import hashlib
+import io
+from itertools import compress
+import json
+
+
+# So cua hang toi da tra ve cho tool=nearest&mode=db&k=...
+SO_KET_QUA_GAN_NHAT_TOI_DA = 50
+
+# So cua hang toi da moi trang cho tool=within_radius&mode=db&limit=...
+# va so cua hang toi da tra ve cho tool=in_polygon&limit=...
+SO_KET_QUA_MOI_TRANG_TOI_DA = 500
+
+# So o toi da (diem goc x cua hang) cua tool=distance_matrix
+SO_O_MA_TRAN_TOI_DA = 5_000_000
+
+# Cac tool cua /api/gis-tools/ nhan POST (body JSON, chi doc du lieu): view
+# csrf_exempt nen moi tool khac chi duoc goi bang GET
+CAC_CONG_CU_POST = ('in_polygon', 'distance_matrix')
+
+# Ban kinh toi da (km) cua tool=coverage
+BAN_KINH_VUNG_PHU_TOI_DA = 50.0
+
+# /api/cua-hang/: so cua hang toi da moi khung nhin va muc zoom nho nhat
+# con tra ve tung cua hang (xa hon thi chi bao zoom_too_low)
+SO_CUA_HANG_KHUNG_NHIN_TOI_DA = 2000
+ZOOM_TOI_THIEU_CUA_HANG = 10
+
+# Thoi gian giu JSON cua /api/cua-hang/ trong Django cache (giay); khoa chua
+# phien ban du lieu nen ban cu khong bao gio duoc doc lai, timeout chi de don dep
+THOI_GIAN_GIU_KHUNG_NHIN = 3600
+
+# Danh sach quan tri: cach sap xep (tham so sap_xep, muc dau la mac dinh) ->
+# (nhan, thu tu keyset); truong cuoi luon la id. Moi thu tu co index tuong
+# ung trong models.py (Meta.indexes) de trang nao cung chi quet SO_DONG_MOI_TRANG dong
+SAP_XEP_CUA_HANG = {
+    'moi': ('Mới thêm', ('-id',)),
+    'ten': ('Tên A-Z', ('ten_cua_hang', 'id')),
+}
+SAP_XEP_DANH_GIA = {
+    'moi': ('Mới nhất', ('-ngay_danh_gia', '-id')),
+    'cu': ('Cũ nhất', ('ngay_danh_gia', 'id')),
+    'diem_cao': ('Điểm cao', ('-diem', '-ngay_danh_gia', '-id')),
+    'diem_thap': ('Điểm thấp', ('diem', 'ngay_danh_gia', 'id')),
+}
+SAP_XEP_SU_KIEN = {
+    'moi': ('Bắt đầu muộn nhất', ('-ngay_bat_dau', '-id')),
+    'cu': ('Bắt đầu sớm nhất', ('ngay_bat_dau', 'id')),
+}
+SAP_XEP_CUA_HANG_SU_KIEN = {
+    'moi': ('Mới thêm', ('-id',)),
+}
 
 
 # Decorator cho cac view danh cho admin
@@ -48,10 +125,8 @@ def trang_chu(request):
     
     GIAI THICH:
     - Hien thi trang chu voi ban do tuong tac
-    - Lay danh sach tat ca cua hang va loai cua hang
-    - Tich hop thong tin su kien cho tung cua hang
-    - Chuan bi du lieu de hien thi tren ban do va sidebar
-    - Su dung select_related va prefetch_related de toi uu query
+    - Chi lay danh sach loai cua hang (cho bo loc); cua hang khong nhung
+      vao trang ma duoc ban do tai theo khung nhin tu /api/cua-hang/
     
     THAM SO:
         request: Django HttpRequest object
@@ -63,28 +138,94 @@ def trang_chu(request):
         Truy cap: http://localhost:8000/
         Hien thi ban do voi tat ca cua hang, chuc nang tim duong, v.v.
     """
-    # Lay danh sach cua hang voi cac quan he lien ket
-    danh_sach_cua_hang = CuaHang.objects.select_related('loai').prefetch_related('su_kiens__su_kien').all()
     danh_sach_loai = LoaiCuaHang.objects.all()
     
-    # Chuan bi du lieu cua hang kem theo su kien
-    du_lieu_cua_hang = []
-    for cua_hang in danh_sach_cua_hang:
-        danh_sach_su_kien = [cs.su_kien for cs in cua_hang.su_kiens.all()]
-        du_lieu_cua_hang.append({
-            'store': cua_hang,
-            'events': danh_sach_su_kien,
-            'has_events': len(danh_sach_su_kien) > 0
-        })
-    
     return render(request, 'bando.html', {
-        'stores_data': du_lieu_cua_hang,
         'loai_cua_hangs': danh_sach_loai,
     })
 
 
 # ====== API CONG CU GIS ======
 
+def _dong_cua_hang_db(r):
+    """Mot cua hang trong ket qua nearest/within_radius mode=db"""
+    return {
+        'store_id': r['id'],
+        'store_name': r['ten_cua_hang'],
+        'loai_id': r['loai_id'],
+        'lat': r['vi_do'],
+        'lon': r['kinh_do'],
+        'distance_km': round(r['khoang_cach'].km, 3)
+    }
+
+
+def _tim_gan_nhat_db(vi_do, kinh_do, so_luong, loai_id=None):
+    """Ket qua tool=nearest&mode=db (KNN trong PostGIS) dang dict san sang tra JSON"""
+    ket_qua = tim_k_cua_hang_gan_nhat(vi_do, kinh_do, so_luong, loai_id)
+    
+    if not ket_qua:
+        return {
+            'success': False,
+            'error': 'Không có cửa hàng nào có tọa độ'
+        }
+    
+    danh_sach_ket_qua = [_dong_cua_hang_db(r) for r in ket_qua]
+    
+    return {
+        'success': True,
+        'tool': 'nearest',
+        'mode': 'db',
+        'result': dict(danh_sach_ket_qua[0], stores=danh_sach_ket_qua)
+    }
+
+
+def _tim_trong_ban_kinh_db(vi_do, kinh_do, ban_kinh_km, gioi_han, con_tro, loai_id, co_su_kien):
+    """Ket qua tool=within_radius&mode=db (mot trang) dang dict san sang tra JSON"""
+    ket_qua, con_tro_tiep_theo = tim_cua_hang_trong_ban_kinh(
+        vi_do, kinh_do, ban_kinh_km, gioi_han,
+        con_tro=con_tro, loai_id=loai_id, co_su_kien=co_su_kien
+    )
+    
+    danh_sach_ket_qua = [_dong_cua_hang_db(r) for r in ket_qua]
+    
+    return {
+        'success': True,
+        'tool': 'within_radius',
+        'mode': 'db',
+        'result': {
+            'origin': [vi_do, kinh_do],
+            'radius_km': ban_kinh_km,
+            'count': len(danh_sach_ket_qua),
+            'stores': danh_sach_ket_qua,
+            'next_cursor': con_tro_tiep_theo
+        }
+    }
+
+
+def _tinh_diem_trung_tam(loai_id):
+    """Ket qua tool=centroid: doc mot dong tong cong don trong bang thong ke"""
+    thong_ke = lay_thong_ke(loai_id)
+    
+    if thong_ke is None:
+        return {
+            'success': False,
+            'error': 'Không có cửa hàng nào có tọa độ'
+        }
+    
+    return {
+        'success': True,
+        'tool': 'centroid',
+        'result': {
+            'centroid': [thong_ke.tong_vi_do / thong_ke.so_luong,
+                         thong_ke.tong_kinh_do / thong_ke.so_luong],
+            'bbox': [[thong_ke.vi_do_min, thong_ke.kinh_do_min],
+                     [thong_ke.vi_do_max, thong_ke.kinh_do_max]],
+            'num_stores': thong_ke.so_luong
+        }
+    }
+
+
+@csrf_exempt
 def api_gis_tools(request):
     """
     API endpoint demo cac cong cu GIS tu viet
@@ -92,14 +233,23 @@ def api_gis_tools(request):
     GIAI THICH:
     - Cung cap cac endpoint API de su dung cong cu GIS
     - Ho tro cac chuc nang: tinh khoang cach, tim gan nhat, tao vung dem,
-      tinh diem trung tam, tim trong ban kinh, tinh huong di
+      tinh diem trung tam, tim trong ban kinh, tinh huong di, tim trong da giac
     - Nhan tham so qua query string va tra ve ket qua dang JSON
+    - in_polygon, distance_matrix nhan du lieu qua body JSON cua POST request
+      (chi doc du lieu nen khong yeu cau CSRF token); chi hai tool nay nhan
+      POST, tool khac chi nhan GET (csrf_exempt khong mo rong sang chung)
+    - Ket qua doc database (nearest/within_radius mode=db, centroid) duoc
+      dem theo toa do da lam tron (result_cache.py), tu vo hieu khi cua
+      hang thay doi; tool=cache_stats xem so lan trung/truot
     - Su dung cac ham tu lop CongCuGIS (khong dung thu vien ben ngoai)
     
     THAM SO:
         request: Django HttpRequest object
         Query params:
-            tool: Ten cong cu (distance, nearest, buffer, centroid, within_radius, bearing)
+            tool: Ten cong cu (distance, nearest, buffer, centroid, within_radius, bearing, in_polygon,
+                  distance_matrix, cache_stats)
+            mode: 'db' de chay truy van trong PostGIS (nearest, within_radius, in_polygon),
+                  mac dinh tinh bang Python
             Tham so khac tuy thuoc vao cong cu cu the
     
     TRA VE:
@@ -110,8 +260,25 @@ def api_gis_tools(request):
         >>> GET /api/gis-tools/?tool=distance&lat1=16.05&lon1=108.20&lat2=16.06&lon2=108.21
         >>> # Tim cua hang gan nhat
         >>> GET /api/gis-tools/?tool=nearest&lat=16.05&lon=108.20
+        >>> # 5 cua hang gan nhat, tinh bang KNN trong PostGIS
+        >>> GET /api/gis-tools/?tool=nearest&lat=16.05&lon=108.20&mode=db&k=5
+        >>> # Cua hang co su kien trong 3km, 20 cua hang moi trang
+        >>> GET /api/gis-tools/?tool=within_radius&lat=16.05&lon=108.20&radius=3&mode=db&limit=20&has_events=1
+        >>> # Tam va khung bao cua cac cua hang loai 2 (doc bang thong ke)
+        >>> GET /api/gis-tools/?tool=centroid&loai=2
+        >>> # Khoang cach (met) tu 2 diem goc den cac cua hang loai 1, phang theo hang
+        >>> POST /api/gis-tools/?tool=distance_matrix
+        >>>      {"origins": [[16.05, 108.20], [16.07, 108.22]], "loai": 1}
+        >>> # Cua hang trong vung nguoi dung ve tren ban do
+        >>> POST /api/gis-tools/?tool=in_polygon&mode=db
+        >>>      {"polygon": [[16.00, 108.15], [16.00, 108.30], [16.10, 108.30], [16.10, 108.15]]}
     """
     cong_cu = request.GET.get('tool', '')
+    if request.method not in ('GET', 'HEAD') and not (request.method == 'POST' and cong_cu in CAC_CONG_CU_POST):
+        return JsonResponse({
+            'success': False,
+            'error': f'Phương thức {request.method} không hỗ trợ cho tool={cong_cu}'
+        }, status=405)
     
     try:
         if cong_cu == 'distance':
@@ -137,19 +304,28 @@ def api_gis_tools(request):
             vi_do = float(request.GET.get('lat'))
             kinh_do = float(request.GET.get('lon'))
             
-            danh_sach_cua_hang = CuaHang.objects.filter(geom__isnull=False)
-            danh_sach_diem = [(ch.geom.y, ch.geom.x, ch) for ch in danh_sach_cua_hang]
+            if request.GET.get('mode') == 'db':
+                # KNN trong PostGIS (qua bo nho dem theo toa do da lam tron)
+                so_luong = min(max(int(request.GET.get('k', 1)), 1), SO_KET_QUA_GAN_NHAT_TOI_DA)
+                loai_id = request.GET.get('loai')
+                loai_id = int(loai_id) if loai_id else None
+                vi_do, kinh_do = lam_tron_toa_do(vi_do, kinh_do)
+                return JsonResponse(bo_nho_dem_ket_qua.lay_hoac_tinh(
+                    ('nearest', vi_do, kinh_do, so_luong, loai_id),
+                    lambda: _tim_gan_nhat_db(vi_do, kinh_do, so_luong, loai_id)
+                ))
             
-            gan_nhat, khoang_cach_nho_nhat = CongCuGIS.tim_diem_gan_nhat(vi_do, kinh_do, danh_sach_diem)
+            # Quet ban chup dung chung (mmap), khong doc database
+            gan_nhat, khoang_cach_nho_nhat = lay_ban_chup().tim_gan_nhat(vi_do, kinh_do)
             
             if gan_nhat:
-                cua_hang = gan_nhat[2]
+                id_cua_hang = gan_nhat[2]
                 return JsonResponse({
                     'success': True,
                     'tool': 'nearest',
                     'result': {
-                        'store_id': cua_hang.id,
-                        'store_name': cua_hang.ten_cua_hang,
+                        'store_id': id_cua_hang,
+                        'store_name': lay_ten_cua_hang([id_cua_hang]).get(id_cua_hang),
                         'distance_km': round(khoang_cach_nho_nhat, 3)
                     }
                 })
@@ -173,21 +349,14 @@ def api_gis_tools(request):
             })
         
         elif cong_cu == 'centroid':
-            # Tinh diem trung tam cua tat ca cua hang
-            danh_sach_cua_hang = CuaHang.objects.filter(geom__isnull=False)
-            danh_sach_diem = [(ch.geom.y, ch.geom.x) for ch in danh_sach_cua_hang]
-            
-            if danh_sach_diem:
-                vi_do_tam, kinh_do_tam = CongCuGIS.tinh_diem_trung_tam(danh_sach_diem)
-                
-                return JsonResponse({
-                    'success': True,
-                    'tool': 'centroid',
-                    'result': {
-                        'centroid': [vi_do_tam, kinh_do_tam],
-                        'num_stores': len(danh_sach_diem)
-                    }
-                })
+            # Diem trung tam cua tat ca cua hang (hoac cua mot loai):
+            # doc mot dong tong cong don trong bang thong ke (qua bo nho dem)
+            loai_id = request.GET.get('loai')
+            loai_id = int(loai_id) if loai_id else None
+            return JsonResponse(bo_nho_dem_ket_qua.lay_hoac_tinh(
+                ('centroid', loai_id),
+                lambda: _tinh_diem_trung_tam(loai_id)
+            ))
         
         elif cong_cu == 'within_radius':
             # Tim cua hang trong ban kinh cho truoc
@@ -195,14 +364,31 @@ def api_gis_tools(request):
             kinh_do = float(request.GET.get('lon'))
             ban_kinh_km = float(request.GET.get('radius', 5.0))
             
-            danh_sach_cua_hang = CuaHang.objects.filter(geom__isnull=False)
-            danh_sach_diem = [(ch.geom.y, ch.geom.x, ch) for ch in danh_sach_cua_hang]
+            if request.GET.get('mode') == 'db':
+                # Tim trong PostGIS theo index, co gioi han va phan trang
+                # (qua bo nho dem theo toa do da lam tron)
+                gioi_han = min(max(int(request.GET.get('limit', 50)), 1), SO_KET_QUA_MOI_TRANG_TOI_DA)
+                loai_id = request.GET.get('loai')
+                loai_id = int(loai_id) if loai_id else None
+                co_su_kien = request.GET.get('has_events')
+                co_su_kien = (co_su_kien.lower() in ('1', 'true')) if co_su_kien else None
+                con_tro = request.GET.get('cursor') or None
+                vi_do, kinh_do = lam_tron_toa_do(vi_do, kinh_do)
+                
+                return JsonResponse(bo_nho_dem_ket_qua.lay_hoac_tinh(
+                    ('within_radius', vi_do, kinh_do, ban_kinh_km, gioi_han, con_tro, loai_id, co_su_kien),
+                    lambda: _tim_trong_ban_kinh_db(vi_do, kinh_do, ban_kinh_km, gioi_han,
+                                                   con_tro, loai_id, co_su_kien)
+                ))
+            
+            danh_sach_diem = lay_ban_chup().tap
             
             ket_qua = CongCuGIS.tim_diem_trong_ban_kinh(vi_do, kinh_do, danh_sach_diem, ban_kinh_km)
+            ten_cua_hang = lay_ten_cua_hang(r['diem'][2] for r in ket_qua)
             
             danh_sach_ket_qua = [{
-                'store_id': r['diem'][2].id,
-                'store_name': r['diem'][2].ten_cua_hang,
+                'store_id': r['diem'][2],
+                'store_name': ten_cua_hang.get(r['diem'][2]),
                 'distance_km': round(r['khoang_cach'], 3)
             } for r in ket_qua]
             
@@ -227,9 +413,7 @@ def api_gis_tools(request):
             huong_di = CongCuGIS.tinh_huong_di(vi_do_1, kinh_do_1, vi_do_2, kinh_do_2)
             
             # Chuyen doi goc thanh huong (8 huong chinh)
-            cac_huong = ['Bắc', 'Đông Bắc', 'Đông', 'Đông Nam', 
-                         'Nam', 'Tây Nam', 'Tây', 'Tây Bắc']
-            huong = cac_huong[int((huong_di + 22.5) // 45) % 8]
+            huong = CongCuGIS.ten_huong_di(huong_di)
             
             return JsonResponse({
                 'success': True,
@@ -240,10 +424,141 @@ def api_gis_tools(request):
                 }
             })
         
+        elif cong_cu == 'in_polygon':
+            # Tim cua hang nam trong da giac nguoi dung ve (POST JSON)
+            if request.method != 'POST':
+                return JsonResponse({
+                    'success': False,
+                    'error': 'in_polygon cần POST JSON {"polygon": [[lat, lon], ...]}'
+                })
+            
+            try:
+                toa_do_da_giac = json.loads(request.body).get('polygon') or []
+                da_giac = tao_da_giac(toa_do_da_giac)
+            except (ValueError, AttributeError) as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e) if isinstance(e, ValueError) else 'Body phải là JSON {"polygon": [[lat, lon], ...]}'
+                }, status=400)
+            gioi_han = min(max(int(request.GET.get('limit', SO_KET_QUA_MOI_TRANG_TOI_DA)), 1),
+                           SO_KET_QUA_MOI_TRANG_TOI_DA)
+            
+            che_do_db = request.GET.get('mode') == 'db'
+            
+            if che_do_db:
+                # Loc theo GiST index va ST_Within ngay trong PostGIS
+                ket_qua, bi_cat = tim_cua_hang_trong_da_giac(da_giac, gioi_han)
+                danh_sach_ket_qua = [{
+                    'store_id': r['id'],
+                    'store_name': r['ten_cua_hang']
+                } for r in ket_qua]
+            else:
+                # Da giac chuan bi san (tu vong da kiem tra so cua tao_da_giac),
+                # kiem tra hang loat tren ban chup dung chung
+                tap = lay_ban_chup().tap
+                vong = [(vi_do, kinh_do) for kinh_do, vi_do in da_giac.exterior_ring.coords]
+                mat_na = DaGiacChuanBi(vong).chua_nhieu(tap)
+                cac_id = sorted(compress(tap.ids, mat_na))
+                bi_cat = len(cac_id) > gioi_han
+                cac_id = cac_id[:gioi_han]
+                ten_cua_hang = lay_ten_cua_hang(cac_id)
+                danh_sach_ket_qua = [{
+                    'store_id': id_cua_hang,
+                    'store_name': ten_cua_hang.get(id_cua_hang)
+                } for id_cua_hang in cac_id]
+            
+            phan_hoi = {'success': True, 'tool': 'in_polygon'}
+            if che_do_db:
+                phan_hoi['mode'] = 'db'
+            phan_hoi['result'] = {
+                'polygon': toa_do_da_giac,
+                'count': len(danh_sach_ket_qua),
+                'truncated': bi_cat,
+                'stores': danh_sach_ket_qua
+            }
+            return JsonResponse(phan_hoi)
+        
+        elif cong_cu == 'distance_matrix':
+            # Ma tran khoang cach tu nhieu diem goc den cac cua hang (POST JSON)
+            if request.method != 'POST':
+                return JsonResponse({
+                    'success': False,
+                    'error': 'distance_matrix cần POST JSON {"origins": [[lat, lon], ...]}'
+                })
+            
+            du_lieu = json.loads(request.body)
+            cac_diem_goc = [(float(vi_do), float(kinh_do)) for vi_do, kinh_do in du_lieu.get('origins') or []]
+            if not cac_diem_goc:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Cần ít nhất một điểm gốc trong "origins"'
+                })
+            
+            # Loc cua hang tren ban chup (tuy chon theo loai va/hoac danh sach id)
+            tap = lay_ban_chup().tap
+            if du_lieu.get('loai'):
+                tap = tap.loc_theo_loai(int(du_lieu['loai']))
+            if du_lieu.get('store_ids'):
+                tap = tap.loc_theo_id(int(id_cua_hang) for id_cua_hang in du_lieu['store_ids'])
+            
+            if len(cac_diem_goc) * len(tap) > SO_O_MA_TRAN_TOI_DA:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Ma trận tối đa {SO_O_MA_TRAN_TOI_DA} ô (origins x stores)'
+                })
+            
+            # Gui theo tung khoi hang: khong giu ca ma tran (list so Python)
+            # hay ca chuoi JSON trong bo nho
+            dau = json.dumps({
+                'success': True,
+                'tool': 'distance_matrix',
+                'result': {
+                    'rows': len(cac_diem_goc),
+                    'cols': len(tap),
+                    'store_ids': list(tap.ids),
+                }
+            })
+            
+            def luong_json():
+                yield dau[:-2] + ', "distances_m": ['
+                yield from luong_ma_tran_khoang_cach_met(cac_diem_goc, tap)
+                yield ']}}'
+            return StreamingHttpResponse(luong_json(), content_type='application/json')
+        
+        elif cong_cu == 'coverage':
+            # Vung phuc vu: hop nhat vung dem cua moi cua hang (hoac mot loai)
+            # thanh mot MultiPolygon, dem theo (loai, ban kinh, phien ban du lieu)
+            ban_kinh_km = float(request.GET.get('radius', 1.0))
+            if not 0 < ban_kinh_km <= BAN_KINH_VUNG_PHU_TOI_DA:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'radius phải trong khoảng (0, {BAN_KINH_VUNG_PHU_TOI_DA}] km'
+                })
+            loai_id = request.GET.get('loai')
+            loai_id = int(loai_id) if loai_id else None
+            
+            return JsonResponse({
+                'success': True,
+                'tool': 'coverage',
+                'result': {
+                    'radius_km': ban_kinh_km,
+                    'loai': loai_id,
+                    **lay_vung_phu(ban_kinh_km, loai_id)
+                }
+            })
+        
+        elif cong_cu == 'cache_stats':
+            # So lan trung/truot cua bo nho dem ket qua (trong worker nay)
+            return JsonResponse({
+                'success': True,
+                'tool': 'cache_stats',
+                'result': bo_nho_dem_ket_qua.thong_ke()
+            })
+        
         else:
             return JsonResponse({
                 'success': False,
-                'error': 'Unknown tool. Available: distance, nearest, buffer, centroid, within_radius, bearing'
+                'error': 'Unknown tool. Available: distance, nearest, buffer, centroid, within_radius, bearing, in_polygon, distance_matrix, coverage, cache_stats'
             })
     
     except Exception as e:
@@ -253,6 +568,288 @@ def api_gis_tools(request):
         })
 
 
+@csrf_exempt
+def api_gis_tools_batch(request):
+    """
+    API chay nhieu lenh cong cu GIS trong mot request
+    
+    GIAI THICH:
+    - Nhan mot mang JSON cac lenh qua POST, moi lenh co dang giong query
+      string cua /api/gis-tools/ (vd {"tool": "distance", "lat1": ...})
+    - Thay cho hang tram request rieng le: chi ton mot lan qua middleware,
+      session va ma hoa JSON
+    - Gom lenh theo tool de tinh vector hoa, dung chung ban chup cua hang
+      va mot truy van lay ten (xem batch_tools.chay_lo_lenh)
+    - Ket qua tra ve dung thu tu dau vao, lenh loi co loi rieng
+    
+    THAM SO:
+        request: Django HttpRequest object (POST, body la mang JSON)
+    
+    TRA VE:
+        JsonResponse {'success': True, 'results': [...]} hoac thong bao loi
+        
+    VI DU:
+        >>> POST /api/gis-tools/batch/
+        >>>      [{"tool": "distance", "lat1": 16.05, "lon1": 108.20, "lat2": 16.06, "lon2": 108.21},
+        >>>       {"tool": "bearing", "lat1": 16.05, "lon1": 108.20, "lat2": 16.06, "lon2": 108.21},
+        >>>       {"tool": "nearest", "lat": 16.05, "lon": 108.20}]
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'success': False,
+            'error': 'Cần POST một mảng JSON các lệnh'
+        })
+    
+    try:
+        cac_lenh = json.loads(request.body)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        })
+    
+    if not isinstance(cac_lenh, list):
+        return JsonResponse({
+            'success': False,
+            'error': 'Body phải là một mảng JSON các lệnh'
+        })
+    
+    if len(cac_lenh) > SO_LENH_TOI_DA:
+        return JsonResponse({
+            'success': False,
+            'error': f'Tối đa {SO_LENH_TOI_DA} lệnh mỗi request'
+        })
+    
+    return JsonResponse({
+        'success': True,
+        'results': chay_lo_lenh(cac_lenh)
+    })
+
+
+def _etag_cua_hang_khung_nhin(request, *args, **kwargs):
+    """
+    ETag cua /api/cua-hang/, /api/cua-hang/cum/ va /tiles/stores/: phien
+    ban du lieu cua hang + duong dan va tham so truy van
+    
+    GIAI THICH:
+    - Ket qua chi phu thuoc vao du lieu cua hang va query string nen ETag
+      tinh duoc ma khong can truy van database; If-None-Match trung thi
+      tra 304 ngay
+    """
+    khoa = f'{lay_phien_ban_du_lieu()}:{request.get_full_path()}'
+    return hashlib.sha1(khoa.encode()).hexdigest()
+
+
+@condition(etag_func=_etag_cua_hang_khung_nhin)
+def api_cua_hang_khung_nhin(request):
+    """
+    API GeoJSON cac cua hang trong khung nhin ban do
+    
+    GIAI THICH:
+    - Thay cho viec nhung tat ca cua hang vao trang chu: ban do goi API
+      nay moi khi di chuyen/zoom (su kien moveend) voi khung nhin hien tai
+    - Loc theo GiST index cua CuaHang.geom, chi tra cac truong ban do can
+    - zoom < ZOOM_TOI_THIEU_CUA_HANG: khong tra cua hang (zoom_too_low)
+    - Ho tro GET co dieu kien: ETag theo phien ban du lieu, trinh duyet gui
+      lai If-None-Match va nhan 304 neu cua hang chua thay doi
+    - JSON da tuan tu hoa duoc dem trong Django cache (alias 'khung_nhin',
+      tach khoi cache chung) theo (phien ban du lieu, khung, loai): cac
+      trinh duyet/worker khac xem cung khung nhin nhan ngay chuoi JSON,
+      khong truy van database va khong dung lai dict; cac view quan tri
+      doi phien ban (store_changes.py) nen khong can xoa
+    
+    THAM SO:
+        request: Django HttpRequest object
+            bbox: "lon_min,lat_min,lon_max,lat_max" (bat buoc)
+            zoom: Muc zoom ban do (tuy chon)
+            loai: Id loai cua hang (tuy chon)
+    
+    TRA VE:
+        JsonResponse FeatureCollection (co them 'truncated', 'zoom_too_low')
+        
+    VI DU:
+        >>> GET /api/cua-hang/?bbox=108.15,16.00,108.30,16.10&zoom=13
+    """
+    try:
+        khung = tao_khung_nhin(request.GET.get('bbox'))
+        zoom = request.GET.get('zoom')
+        zoom = int(zoom) if zoom else None
+        loai_id = request.GET.get('loai')
+        loai_id = int(loai_id) if loai_id else None
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    qua_xa = zoom is not None and zoom < ZOOM_TOI_THIEU_CUA_HANG
+    bbox = ','.join(f'{gia_tri:.6f}' for gia_tri in khung.extent)
+    khoa = f'gis:khung_nhin:{lay_phien_ban_du_lieu()}:{bbox}:{int(qua_xa)}:{loai_id}'
+    bo_nho_dem_khung_nhin = caches['khung_nhin']
+    noi_dung = bo_nho_dem_khung_nhin.get(khoa)
+    if noi_dung is None:
+        if qua_xa:
+            danh_sach, bi_cat = [], False
+        else:
+            danh_sach, bi_cat = tim_cua_hang_trong_khung_nhin(khung, SO_CUA_HANG_KHUNG_NHIN_TOI_DA, loai_id)
+        
+        noi_dung = json.dumps({
+            'type': 'FeatureCollection',
+            'truncated': bi_cat,
+            'zoom_too_low': qua_xa,
+            'features': [{
+                'type': 'Feature',
+                'id': r['id'],
+                'geometry': {
+                    'type': 'Point',
+                    'coordinates': [round(r['kinh_do'], 6), round(r['vi_do'], 6)]
+                },
+                'properties': {
+                    'ten': r['ten_cua_hang'],
+                    'dia_chi': r['dia_chi'],
+                    'loai_id': r['loai_id'],
+                    'loai': r['ten_loai'],
+                    'su_kien': r['su_kien']
+                }
+            } for r in danh_sach]
+        }, separators=(',', ':'))
+        bo_nho_dem_khung_nhin.set(khoa, noi_dung, THOI_GIAN_GIU_KHUNG_NHIN)
+    
+    phan_hoi = HttpResponse(noi_dung, content_type='application/json')
+    # Luon hoi lai server (kem If-None-Match) thay vi dung ban luu cu
+    phan_hoi['Cache-Control'] = 'no-cache'
+    return phan_hoi
+
+
+@condition(etag_func=_etag_cua_hang_khung_nhin)
+def api_cum_cua_hang(request):
+    """
+    API GeoJSON cac cum cua hang trong khung nhin o mot muc zoom
+    
+    GIAI THICH:
+    - Doc chi muc gom cum trong bo nho cua worker (store_clusters.py), khong
+      truy van database
+    - Moi o 64px cua muc zoom la mot feature: cum (cluster = true, so cua
+      hang point_count, tam la trung binh toa do) hoac mot cua hang le
+    - So feature chi phu thuoc kich thuoc khung nhin (vai tram cho mot man
+      hinh), khong phu thuoc tong so cua hang
+    - GET co dieu kien bang ETag nhu /api/cua-hang/
+    
+    THAM SO:
+        request: Django HttpRequest object
+            bbox: "lon_min,lat_min,lon_max,lat_max" (bat buoc)
+            zoom: Muc zoom ban do 0-18 (bat buoc)
+    
+    TRA VE:
+        JsonResponse FeatureCollection
+        
+    VI DU:
+        >>> GET /api/cua-hang/cum/?bbox=102,8,110,23&zoom=6
+    """
+    try:
+        kinh_do_min, vi_do_min, kinh_do_max, vi_do_max = tao_khung_nhin(request.GET.get('bbox')).extent
+        if not request.GET.get('zoom'):
+            raise ValueError('Thiếu tham số zoom')
+        zoom = int(request.GET['zoom'])
+        cac_cum = lay_chi_muc_cum().tim_cum(vi_do_min, kinh_do_min, vi_do_max, kinh_do_max, zoom)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    cac_dac_trung = []
+    for cum in cac_cum:
+        if cum['id'] is not None:
+            thuoc_tinh = {'cluster': False, 'store_id': cum['id']}
+        else:
+            thuoc_tinh = {
+                'cluster': True,
+                'cluster_id': '/'.join(map(str, cum['o'])),
+                'point_count': cum['so_luong']
+            }
+        cac_dac_trung.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [round(cum['kinh_do'], 6), round(cum['vi_do'], 6)]
+            },
+            'properties': thuoc_tinh
+        })
+    
+    phan_hoi = JsonResponse({
+        'type': 'FeatureCollection',
+        'features': cac_dac_trung
+    })
+    phan_hoi['Cache-Control'] = 'no-cache'
+    return phan_hoi
+
+
+@condition(etag_func=_etag_cua_hang_khung_nhin)
+def tile_cua_hang(request, z, x, y):
+    """
+    Vector tile (Mapbox Vector Tile) cac cua hang
+    
+    GIAI THICH:
+    - Lop 'stores': moi cua hang mot diem voi id, ten, loai_id, co_su_kien
+    - Tile tao bang ST_AsMVT trong PostGIS va luu tren dia
+      (settings.STORE_TILE_CACHE_DIR, theo phien ban noi dung); lan sau
+      doc thang file, khong truy van database
+    - Khi cua hang thay doi chi cac tile chua vi tri cu/moi bi xoa
+      (store_changes.py); tao truoc bang: python manage.py tao_truoc_tile
+    
+    THAM SO:
+        request: Django HttpRequest object
+        z, x, y: Toa do tile (XYZ, 0 <= z <= 18)
+    
+    TRA VE:
+        HttpResponse application/vnd.mapbox-vector-tile (404 neu tile khong hop le)
+        
+    VI DU:
+        >>> GET /tiles/stores/14/13087/7556.pbf
+    """
+    if not tile_hop_le(z, x, y):
+        raise Http404('Tile không hợp lệ')
+    
+    phan_hoi = HttpResponse(lay_tile(z, x, y), content_type='application/vnd.mapbox-vector-tile')
+    phan_hoi['Cache-Control'] = 'no-cache'
+    return phan_hoi
+
+
+def api_mat_do(request, z, x, y):
+    """
+    Luoi mat do cua hang va diem danh gia trung binh trong mot tile ban do
+    
+    GIAI THICH:
+    - So cua hang, so danh gia va tong diem moi o luoi duoc tinh san o
+      nhieu muc (bang OMatDo, store_density.py) va cap nhat tang dan khi
+      cua hang/danh gia thay doi: moi request chi doc toi da 256 dong
+    - Dang gon: moi o la mot mang [cot, hang, so_cua_hang, diem_tb] trong
+      tile (size x size o), khong phai GeoJSON
+    - Du lieu doi ca khi co danh gia moi (khong doi phien ban du lieu cua
+      hang) nen ETag tinh tu noi dung; If-None-Match trung thi tra 304
+    
+    THAM SO:
+        request: Django HttpRequest object
+        z, x, y: Toa do tile (XYZ, 0 <= z <= 16)
+    
+    TRA VE:
+        JsonResponse {'success', 'z', 'x', 'y', 'level', 'size', 'cells'}
+        (404 neu tile khong hop le)
+        
+    VI DU:
+        >>> GET /api/mat-do/10/815/485/
+        {"success": true, "z": 10, "x": 815, "y": 485, "level": 14, "size": 16,
+         "cells": [[3, 7, 12, 4.25], [4, 7, 3, null]]}
+    """
+    if not tile_hop_le(z, x, y) or z > MUC_TOI_DA:
+        raise Http404('Tile không hợp lệ')
+    
+    phan_hoi = JsonResponse({'success': True, 'z': z, 'x': x, 'y': y, **lay_o_mat_do(z, x, y)})
+    phan_hoi['Cache-Control'] = 'no-cache'
+    set_response_etag(phan_hoi)
+    return get_conditional_response(request, etag=phan_hoi['ETag'], response=phan_hoi)
+
 
 # ====== XAC THUC ADMIN ======
 
@@ -440,7 +1037,9 @@ def admin_loai_update(request, id):
     if request.method == 'POST':
         muc.ten_loai = request.POST.get('ten_loai')
         muc.mo_ta = request.POST.get('mo_ta', '')
-        muc.save()
+        with transaction.atomic():
+            muc.save()
+            thong_tin_cua_hang_da_thay_doi(cac_cua_hang=CuaHang.objects.filter(loai=muc).values('id'))
         messages.success(request, 'Cập nhật thành công!')
         return redirect('admin_loai_list')
     
@@ -470,35 +1069,89 @@ def admin_loai_delete(request, id):
         Xoa va chuyen ve danh sach
     """
     muc = get_object_or_404(LoaiCuaHang, id=id)
-    muc.delete()
+    with transaction.atomic():
+        muc.delete()
+        # Cascade da xoa ca cac cua hang thuoc loai nay => tinh lai toan bo
+        cua_hang_da_thay_doi()
     messages.success(request, 'Xóa thành công!')
     return redirect('admin_loai_list')
 
 
 # ====== ADMIN CRUD: CUA HANG ======
 
+def _doc_id(gia_tri, ten):
+    """Chuoi so nguyen duong (id, diem) thanh int (None neu rong); nem ValueError neu sai"""
+    if not gia_tri:
+        return None
+    if not gia_tri.isdigit():
+        raise ValueError(f'{ten} phải là số nguyên dương')
+    return int(gia_tri)
+
+
+def _trang_danh_sach(request, truy_van, cac_cach_sap_xep):
+    """
+    Mot trang cua danh sach quan tri theo tham so sap_xep va cursor
+    
+    TRA VE:
+        Dict ngu canh cho template: items, sap_xep, cac_cach_sap_xep,
+        trang_sau / trang_truoc (chuoi query hoac None), trang_dau;
+        nem ValueError neu sap_xep hoac cursor khong hop le
+    """
+    sap_xep = request.GET.get('sap_xep') or next(iter(cac_cach_sap_xep))
+    if sap_xep not in cac_cach_sap_xep:
+        raise ValueError(f'Cách sắp xếp không hỗ trợ: {sap_xep}')
+    
+    danh_sach, con_tro_sau, con_tro_truoc = phan_trang_keyset(
+        truy_van, cac_cach_sap_xep[sap_xep][1], request.GET.get('cursor') or None
+    )
+    return {
+        'items': danh_sach,
+        'sap_xep': sap_xep,
+        'cac_cach_sap_xep': [(ma, nhan) for ma, (nhan, _) in cac_cach_sap_xep.items()],
+        'trang_sau': lien_ket_trang(request.GET, con_tro_sau) if con_tro_sau else None,
+        'trang_truoc': lien_ket_trang(request.GET, con_tro_truoc) if con_tro_truoc else None,
+        'trang_dau': lien_ket_trang(request.GET, None),
+    }
+
+
 @admin_required
 def admin_cuahang_list(request):
     """
-    Hien thi danh sach tat ca cua hang
+    Hien thi danh sach cua hang theo trang
     
     GIAI THICH:
-    - Lay tat ca cua hang tu database
+    - Phan trang keyset (admin_paging.py): moi trang SO_DONG_MOI_TRANG dong,
+      lien ket trang sau/truoc mang con tro, khong dung OFFSET nen trang
+      thu N nhanh nhu trang dau
+    - Loc theo loai cua hang, sap xep theo id hoac ten (index (loai, id),
+      (loai, ten_cua_hang) va ten_cua_hang)
     - Su dung select_related de toi uu query voi loai cua hang
-    - Hien thi duoi dang bang danh sach
     
     THAM SO:
         request: Django HttpRequest object
+            loai: Id loai cua hang (tuy chon)
+            sap_xep: moi (mac dinh) hoac ten
+            cursor: Con tro trang (tu lien ket trang sau/truoc)
     
     TRA VE:
         HttpResponse voi template cuahang_list.html
         
     VI DU:
-        GET /admin/cuahang/
-        Hien thi danh sach tat ca cua hang
+        GET /quan-ly/cuahang/?loai=2&sap_xep=ten
+        Hien thi 50 cua hang dau tien cua loai 2 theo ten
     """
-    danh_sach_muc = CuaHang.objects.select_related('loai').all()
-    return render(request, 'admin/cuahang_list.html', {'items': danh_sach_muc})
+    try:
+        truy_van = CuaHang.objects.select_related('loai')
+        loai_id = _doc_id(request.GET.get('loai'), 'loai')
+        if loai_id is not None:
+            truy_van = truy_van.filter(loai_id=loai_id)
+        ngu_canh = _trang_danh_sach(request, truy_van, SAP_XEP_CUA_HANG)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('admin_cuahang_list')
+    
+    ngu_canh['cac_loai'] = LoaiCuaHang.objects.all()
+    return render(request, 'admin/cuahang_list.html', ngu_canh)
 
 
 @admin_required
@@ -536,12 +1189,14 @@ def admin_cuahang_create(request):
         if vi_do and kinh_do:
             geom = Point(float(kinh_do), float(vi_do), srid=4326)
         
-        CuaHang.objects.create(
-            ten_cua_hang=ten_cua_hang,
-            dia_chi=dia_chi,
-            loai=loai,
-            geom=geom
-        )
+        with transaction.atomic():
+            cua_hang = CuaHang.objects.create(
+                ten_cua_hang=ten_cua_hang,
+                dia_chi=dia_chi,
+                loai=loai,
+                geom=geom
+            )
+            cua_hang_da_thay_doi(sau=trang_thai_cua_hang(cua_hang), cua_hang_id=cua_hang.id)
         messages.success(request, 'Thêm cửa hàng thành công!')
         return redirect('admin_cuahang_list')
     
@@ -584,7 +1239,11 @@ def admin_cuahang_update(request, id):
         if vi_do and kinh_do:
             muc.geom = Point(float(kinh_do), float(vi_do), srid=4326)
         
-        muc.save()
+        with transaction.atomic():
+            # Khoa dong de trang thai truoc khi sua dung voi database
+            truoc = trang_thai_cua_hang(CuaHang.objects.select_for_update().get(id=muc.id))
+            muc.save()
+            cua_hang_da_thay_doi(truoc, trang_thai_cua_hang(muc), tong_danh_gia_cua_hang(muc.id), muc.id)
         messages.success(request, 'Cập nhật thành công!')
         return redirect('admin_cuahang_list')
     
@@ -616,36 +1275,188 @@ def admin_cuahang_delete(request, id):
         GET/POST /admin/cuahang/delete/1/
         Xoa va chuyen ve danh sach
     """
-    muc = get_object_or_404(CuaHang, id=id)
-    muc.delete()
+    with transaction.atomic():
+        muc = get_object_or_404(CuaHang.objects.select_for_update(), id=id)
+        truoc = trang_thai_cua_hang(muc)
+        # Lay truoc khi xoa: cascade xoa luon danh gia cua cua hang
+        danh_gia = tong_danh_gia_cua_hang(muc.id)
+        muc.delete()
+        cua_hang_da_thay_doi(truoc=truoc, danh_gia=danh_gia)
     messages.success(request, 'Xóa thành công!')
     return redirect('admin_cuahang_list')
 
 
+@admin_required
+def admin_cuahang_import(request):
+    """
+    Nhap cua hang hang loat tu tep tai len
+    
+    GIAI THICH:
+    - Tep CSV (cot ten_cua_hang, dia_chi, loai, vi_do, kinh_do), GeoJSON
+      FeatureCollection hoac NDJSON (moi dong mot Feature Point)
+    - Doc tep theo luong (store_import.nhap_cua_hang): kiem tra toa do, tra
+      ten loai trong bo nho, ghi theo lo bang COPY, upsert theo ten cua hang
+    - Tep rat lon (hang trieu dong) nen dung lenh: python manage.py nhap_cua_hang
+    
+    THAM SO:
+        request: Django HttpRequest object
+            tep: Tep tai len (POST, multipart)
+            tao_loai: Co thi tao loai cua hang chua co
+    
+    TRA VE:
+        HttpResponse - Form neu GET, redirect ve danh sach kem thong bao ket qua neu POST
+        
+    VI DU:
+        POST /quan-ly/cuahang/import/ (tep=cua_hang.csv, tao_loai=on)
+    """
+    if request.method == 'POST':
+        tep = request.FILES.get('tep')
+        if tep is None:
+            messages.error(request, 'Chưa chọn tệp')
+            return redirect('admin_cuahang_import')
+        
+        try:
+            dinh_dang = request.POST.get('dinh_dang') or doan_dinh_dang(tep.name)
+            ket_qua = nhap_cua_hang(
+                io.TextIOWrapper(tep.file, encoding='utf-8-sig', newline=''),
+                dinh_dang,
+                tao_loai=bool(request.POST.get('tao_loai'))
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            messages.error(request, f'Nhập thất bại: {e}')
+            return redirect('admin_cuahang_import')
+        
+        messages.success(request, (
+            f"Đã nhập {ket_qua['so_dong']} dòng: {ket_qua['so_them']} thêm mới, "
+            f"{ket_qua['so_cap_nhat']} cập nhật, {ket_qua['so_loi']} lỗi"
+        ))
+        for loi in ket_qua['cac_loi']:
+            messages.warning(request, loi)
+        return redirect('admin_cuahang_list')
+    
+    return render(request, 'admin/cuahang_import.html', {'dinh_dangs': CAC_DINH_DANG})
+
+
+def _doc_ngay(gia_tri, ten):
+    """Chuoi YYYY-MM-DD thanh date (None neu rong); nem ValueError neu sai"""
+    if not gia_tri:
+        return None
+    try:
+        ngay = parse_date(gia_tri)
+    except ValueError:
+        ngay = None
+    if ngay is None:
+        raise ValueError(f'{ten} phải có dạng YYYY-MM-DD')
+    return ngay
+
+
+@admin_required
+def admin_export(request, loai_du_lieu):
+    """
+    Xuat cua hang, danh gia hoac su kien theo luong
+    
+    GIAI THICH:
+    - StreamingHttpResponse tu store_export.tao_luong_xuat: doc database
+      bang server-side cursor va gui tung khoi, bo nho worker khong doi
+      du bang lon den dau, byte dau tien gui di ngay
+    - Dinh dang geojson (FeatureCollection), ndjson (moi dong mot Feature)
+      hoac csv; loc theo loai, bbox (vi tri cua hang) va khoang ngay
+    
+    THAM SO:
+        request: Django HttpRequest object
+            format: geojson (mac dinh), ndjson, csv
+            loai: Id loai cua hang (tuy chon)
+            bbox: "lon_min,lat_min,lon_max,lat_max" (tuy chon)
+            tu_ngay, den_ngay: YYYY-MM-DD (danh-gia: ngay danh gia,
+                su-kien: su kien dien ra trong khoang)
+        loai_du_lieu: 'cua-hang', 'danh-gia' hoac 'su-kien'
+    
+    TRA VE:
+        StreamingHttpResponse (tep dinh kem), JsonResponse 400 neu tham so sai
+        
+    VI DU:
+        GET /quan-ly/export/danh-gia/?format=csv&tu_ngay=2025-01-01
+        GET /quan-ly/export/cua-hang/?format=ndjson&loai=2&bbox=108.1,15.9,108.4,16.2
+    """
+    dinh_dang = request.GET.get('format', 'geojson')
+    try:
+        bbox = request.GET.get('bbox')
+        luong = tao_luong_xuat(
+            loai_du_lieu,
+            dinh_dang,
+            loai_id=_doc_id(request.GET.get('loai'), 'loai'),
+            khung=tao_khung_nhin(bbox) if bbox else None,
+            tu_ngay=_doc_ngay(request.GET.get('tu_ngay'), 'tu_ngay'),
+            den_ngay=_doc_ngay(request.GET.get('den_ngay'), 'den_ngay'),
+        )
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    kieu_noi_dung, duoi_tep = CAC_DINH_DANG_XUAT[dinh_dang]
+    phan_hoi = StreamingHttpResponse(luong, content_type=kieu_noi_dung)
+    phan_hoi['Content-Disposition'] = f'attachment; filename="{loai_du_lieu}.{duoi_tep}"'
+    return phan_hoi
+
+
 # ====== ADMIN CRUD: DANH GIA ======
 
 @admin_required
 def admin_danhgia_list(request):
     """
-    Hien thi danh sach tat ca danh gia
+    Hien thi danh sach danh gia theo trang
     
     GIAI THICH:
-    - Lay tat ca danh gia tu database
+    - Phan trang keyset nhu admin_cuahang_list: bang danh gia lon van chi
+      doc SO_DONG_MOI_TRANG + 1 dong moi trang
+    - Loc theo cua hang, loai cua hang, diem va khoang ngay danh gia; sap
+      xep theo ngay hoac diem. Index (ngay_danh_gia, id),
+      (cua_hang, ngay_danh_gia, id) va (diem, ngay_danh_gia, id) phuc vu
+      cac cach loc/sap xep nay
     - Su dung select_related de toi uu query voi cua hang
-    - Hien thi duoi dang bang danh sach
     
     THAM SO:
         request: Django HttpRequest object
+            cua_hang: Id cua hang (tuy chon)
+            loai: Id loai cua hang (tuy chon)
+            diem: 1-5 (tuy chon)
+            tu_ngay, den_ngay: YYYY-MM-DD (tuy chon)
+            sap_xep: moi (mac dinh), cu, diem_cao, diem_thap
+            cursor: Con tro trang (tu lien ket trang sau/truoc)
     
     TRA VE:
         HttpResponse voi template danhgia_list.html
         
     VI DU:
-        GET /admin/danhgia/
-        Hien thi danh sach tat ca danh gia
+        GET /quan-ly/danhgia/?diem=1&tu_ngay=2025-01-01
+        Hien thi cac danh gia 1 sao tu dau nam 2025, moi nhat truoc
     """
-    danh_sach_muc = DanhGia.objects.select_related('cua_hang').all()
-    return render(request, 'admin/danhgia_list.html', {'items': danh_sach_muc})
+    try:
+        truy_van = DanhGia.objects.select_related('cua_hang')
+        cua_hang_id = _doc_id(request.GET.get('cua_hang'), 'cua_hang')
+        loai_id = _doc_id(request.GET.get('loai'), 'loai')
+        diem = _doc_id(request.GET.get('diem'), 'diem')
+        tu_ngay = _doc_ngay(request.GET.get('tu_ngay'), 'tu_ngay')
+        den_ngay = _doc_ngay(request.GET.get('den_ngay'), 'den_ngay')
+        if cua_hang_id is not None:
+            truy_van = truy_van.filter(cua_hang_id=cua_hang_id)
+        if loai_id is not None:
+            truy_van = truy_van.filter(cua_hang__loai_id=loai_id)
+        if diem is not None:
+            truy_van = truy_van.filter(diem=diem)
+        if tu_ngay:
+            truy_van = truy_van.filter(ngay_danh_gia__gte=tu_ngay)
+        if den_ngay:
+            truy_van = truy_van.filter(ngay_danh_gia__lte=den_ngay)
+        ngu_canh = _trang_danh_sach(request, truy_van, SAP_XEP_DANH_GIA)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('admin_danhgia_list')
+    
+    ngu_canh['cac_loai'] = LoaiCuaHang.objects.all()
+    return render(request, 'admin/danhgia_list.html', ngu_canh)
 
 
 @admin_required
@@ -676,12 +1487,14 @@ def admin_danhgia_create(request):
         
         cua_hang = get_object_or_404(CuaHang, id=cua_hang_id)
         
-        DanhGia.objects.create(
-            cua_hang=cua_hang,
-            diem=int(diem),
-            nhan_xet=nhan_xet,
-            ngay_danh_gia=ngay_danh_gia
-        )
+        with transaction.atomic():
+            danh_gia = DanhGia.objects.create(
+                cua_hang=cua_hang,
+                diem=int(diem),
+                nhan_xet=nhan_xet,
+                ngay_danh_gia=ngay_danh_gia
+            )
+            danh_gia_da_thay_doi(sau=trang_thai_danh_gia(danh_gia))
         messages.success(request, 'Thêm đánh giá thành công!')
         return redirect('admin_danhgia_list')
     
@@ -717,7 +1530,14 @@ def admin_danhgia_update(request, id):
         muc.diem = int(request.POST.get('diem'))
         muc.nhan_xet = request.POST.get('nhan_xet', '')
         muc.ngay_danh_gia = request.POST.get('ngay_danh_gia')
-        muc.save()
+        
+        with transaction.atomic():
+            # Khoa dong de trang thai truoc khi sua dung voi database
+            truoc = trang_thai_danh_gia(
+                DanhGia.objects.select_for_update().select_related('cua_hang').get(id=muc.id)
+            )
+            muc.save()
+            danh_gia_da_thay_doi(truoc, trang_thai_danh_gia(muc))
         messages.success(request, 'Cập nhật thành công!')
         return redirect('admin_danhgia_list')
     
@@ -749,8 +1569,11 @@ def admin_danhgia_delete(request, id):
         GET/POST /admin/danhgia/delete/1/
         Xoa va chuyen ve danh sach
     """
-    muc = get_object_or_404(DanhGia, id=id)
-    muc.delete()
+    with transaction.atomic():
+        muc = get_object_or_404(DanhGia.objects.select_for_update().select_related('cua_hang'), id=id)
+        truoc = trang_thai_danh_gia(muc)
+        muc.delete()
+        danh_gia_da_thay_doi(truoc=truoc)
     messages.success(request, 'Xóa thành công!')
     return redirect('admin_danhgia_list')
 
@@ -760,24 +1583,39 @@ def admin_danhgia_delete(request, id):
 @admin_required
 def admin_sukien_list(request):
     """
-    Hien thi danh sach tat ca su kien
+    Hien thi danh sach su kien theo trang
     
     GIAI THICH:
-    - Lay tat ca su kien tu database
-    - Hien thi duoi dang bang danh sach
+    - Phan trang keyset theo (ngay_bat_dau, id) - co index tuong ung
+    - Loc khoang ngay: su kien dien ra giao voi [tu_ngay, den_ngay]
     
     THAM SO:
         request: Django HttpRequest object
+            tu_ngay, den_ngay: YYYY-MM-DD (tuy chon)
+            sap_xep: moi (mac dinh) hoac cu
+            cursor: Con tro trang (tu lien ket trang sau/truoc)
     
     TRA VE:
         HttpResponse voi template sukien_list.html
         
     VI DU:
-        GET /admin/sukien/
-        Hien thi danh sach tat ca su kien
+        GET /quan-ly/sukien/?tu_ngay=2025-06-01&den_ngay=2025-06-30
+        Hien thi cac su kien dien ra trong thang 6/2025
     """
-    danh_sach_muc = SuKien.objects.all()
-    return render(request, 'admin/sukien_list.html', {'items': danh_sach_muc})
+    try:
+        truy_van = SuKien.objects.all()
+        tu_ngay = _doc_ngay(request.GET.get('tu_ngay'), 'tu_ngay')
+        den_ngay = _doc_ngay(request.GET.get('den_ngay'), 'den_ngay')
+        if tu_ngay:
+            truy_van = truy_van.filter(ngay_ket_thuc__gte=tu_ngay)
+        if den_ngay:
+            truy_van = truy_van.filter(ngay_bat_dau__lte=den_ngay)
+        ngu_canh = _trang_danh_sach(request, truy_van, SAP_XEP_SU_KIEN)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('admin_sukien_list')
+    
+    return render(request, 'admin/sukien_list.html', ngu_canh)
 
 
 @admin_required
@@ -846,7 +1684,11 @@ def admin_sukien_update(request, id):
         muc.mo_ta = request.POST.get('mo_ta', '')
         muc.ngay_bat_dau = request.POST.get('ngay_bat_dau')
         muc.ngay_ket_thuc = request.POST.get('ngay_ket_thuc')
-        muc.save()
+        with transaction.atomic():
+            muc.save()
+            thong_tin_cua_hang_da_thay_doi(
+                cac_cua_hang=CuaHang.objects.filter(su_kiens__su_kien=muc).values('id')
+            )
         messages.success(request, 'Cập nhật thành công!')
         return redirect('admin_sukien_list')
     
@@ -875,7 +1717,13 @@ def admin_sukien_delete(request, id):
         Xoa va chuyen ve danh sach
     """
     muc = get_object_or_404(SuKien, id=id)
-    muc.delete()
+    with transaction.atomic():
+        # Cac cua hang co the mat co su kien => xoa vector tile quanh chung
+        # va dung lai dong bang doc (lay id truoc khi cascade xoa lien ket)
+        cac_dong = list(CuaHang.objects.filter(su_kiens__su_kien=muc).values_list('id', 'geom'))
+        muc.delete()
+        thong_tin_cua_hang_da_thay_doi([(geom.y, geom.x) for _, geom in cac_dong],
+                                       [id_cua_hang for id_cua_hang, _ in cac_dong])
     messages.success(request, 'Xóa thành công!')
     return redirect('admin_sukien_list')
 
@@ -885,25 +1733,40 @@ def admin_sukien_delete(request, id):
 @admin_required
 def admin_cuahang_sukien_list(request):
     """
-    Hien thi danh sach tat ca quan he cua hang - su kien
+    Hien thi danh sach quan he cua hang - su kien theo trang
     
     GIAI THICH:
-    - Lay tat ca quan he many-to-many giua cua hang va su kien
+    - Phan trang keyset theo id, loc theo cua hang hoac su kien (index
+      (cua_hang, su_kien) va (su_kien, id))
     - Su dung select_related de toi uu query
-    - Hien thi duoi dang bang danh sach
     
     THAM SO:
         request: Django HttpRequest object
+            cua_hang: Id cua hang (tuy chon)
+            su_kien: Id su kien (tuy chon)
+            cursor: Con tro trang (tu lien ket trang sau/truoc)
     
     TRA VE:
         HttpResponse voi template cuahang_sukien_list.html
         
     VI DU:
-        GET /admin/cuahang-sukien/
-        Hien thi danh sach lien ket cua hang va su kien
+        GET /quan-ly/cuahang-sukien/?su_kien=3
+        Hien thi cac cua hang tham gia su kien 3
     """
-    danh_sach_muc = CuaHangSuKien.objects.select_related('cua_hang', 'su_kien').all()
-    return render(request, 'admin/cuahang_sukien_list.html', {'items': danh_sach_muc})
+    try:
+        truy_van = CuaHangSuKien.objects.select_related('cua_hang', 'su_kien')
+        cua_hang_id = _doc_id(request.GET.get('cua_hang'), 'cua_hang')
+        su_kien_id = _doc_id(request.GET.get('su_kien'), 'su_kien')
+        if cua_hang_id is not None:
+            truy_van = truy_van.filter(cua_hang_id=cua_hang_id)
+        if su_kien_id is not None:
+            truy_van = truy_van.filter(su_kien_id=su_kien_id)
+        ngu_canh = _trang_danh_sach(request, truy_van, SAP_XEP_CUA_HANG_SU_KIEN)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('admin_cuahang_sukien_list')
+    
+    return render(request, 'admin/cuahang_sukien_list.html', ngu_canh)
 
 
 @admin_required
@@ -936,10 +1799,12 @@ def admin_cuahang_sukien_create(request):
         
         # Kiem tra xem quan he da ton tai chua
         if not CuaHangSuKien.objects.filter(cua_hang=cua_hang, su_kien=su_kien).exists():
-            CuaHangSuKien.objects.create(
-                cua_hang=cua_hang,
-                su_kien=su_kien
-            )
+            with transaction.atomic():
+                CuaHangSuKien.objects.create(
+                    cua_hang=cua_hang,
+                    su_kien=su_kien
+                )
+                thong_tin_cua_hang_da_thay_doi([(cua_hang.geom.y, cua_hang.geom.x)], [cua_hang.id])
             messages.success(request, 'Thêm thành công!')
         else:
             messages.warning(request, 'Quan hệ này đã tồn tại!')
@@ -975,7 +1840,9 @@ def admin_cuahang_sukien_delete(request, id):
         GET/POST /admin/cuahang-sukien/delete/1/
         Xoa lien ket va chuyen ve danh sach
     """
-    muc = get_object_or_404(CuaHangSuKien, id=id)
-    muc.delete()
+    muc = get_object_or_404(CuaHangSuKien.objects.select_related('cua_hang'), id=id)
+    with transaction.atomic():
+        muc.delete()
+        thong_tin_cua_hang_da_thay_doi([(muc.cua_hang.geom.y, muc.cua_hang.geom.x)], [muc.cua_hang_id])
     messages.success(request, 'Xóa thành công!')
     return redirect('admin_cuahang_sukien_list')